@@ -0,0 +1,379 @@
+import asyncio
+import os
+import threading
+import uuid
+from dotenv import load_dotenv
+from translator_client import (CONNECT_TIMEOUT, READ_TIMEOUT, RETRYABLE_STATUS, TranslatorError, billed_chars,
+                               parse_translations)
+from translation_cache import get_translation_cache
+from governor import get_governor
+from endpoint_selector import get_endpoint_selector
+from phrasebook import get_phrasebook
+from single_flight import get_single_flight
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# 同时发出的翻译请求上限
+DEFAULT_MAX_CONCURRENCY = 16
+
+
+class TranslatorStatusError(Exception):
+    """翻译服务返回了错误的HTTP状态码"""
+
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"翻译服务返回错误: HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _parse_retry_after(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_async_error(error):
+    """判断异步翻译请求的错误是否可以重试，返回值与 translator_client.classify_error 相同"""
+    if isinstance(error, TranslatorStatusError):
+        if error.status not in RETRYABLE_STATUS:
+            return False, None, False
+        return True, error.retry_after, error.status == 429
+    if isinstance(error, asyncio.TimeoutError):
+        return True, None, False
+    if aiohttp is not None and isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)):
+        return True, None, False
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        return True, None, False
+    return False, None, False
+
+
+class AsyncTranslatorClient:
+    """asyncio 版本的Azure翻译服务客户端（使用 aiohttp，没有安装时使用 httpx）
+
+    所有请求共用一个HTTP会话复用连接，同时进行的请求数不超过 max_concurrency，
+    多出的请求在信号量上等待。translate() 等协程可以像普通任务一样取消；submit()
+    按 key 跟踪请求，同一个 key 的新请求会取消还没有完成的旧请求（例如被新的中间
+    结果取代的翻译）。cache、governor、selector、phrasebook 和 single_flight 的用法与 TranslatorClient 相同，
+    对冲时先返回的结果到达后，另一个请求会被取消。缓存的读写（加锁和SQLite）在线程池中进行，不阻塞事件循环。
+    """
+
+    def __init__(self, translator_key, translator_endpoint, region, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, cache=None, governor=None, selector=None,
+                 phrasebook=None, single_flight=None, backend=None):
+        if backend is None:
+            backend = "aiohttp" if aiohttp is not None else "httpx" if httpx is not None else None
+        if backend is None or (backend == "aiohttp" and aiohttp is None) or (backend == "httpx" and httpx is None):
+            raise ImportError("异步翻译客户端需要安装 aiohttp 或 httpx（pip install aiohttp）")
+        self.backend = backend
+        self.url = translator_endpoint.rstrip('/') + '/translate'
+        self.headers = {
+            'Ocp-Apim-Subscription-Key': translator_key,
+            'Ocp-Apim-Subscription-Region': region,
+            'Content-type': 'application/json',
+        }
+        self.max_concurrency = max_concurrency
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.cache = cache
+        self.governor = governor
+        self.selector = selector
+        self.phrasebook = phrasebook
+        self.single_flight = single_flight
+        # HTTP会话和信号量要在事件循环中创建，第一次请求时创建
+        self.session = None
+        self.semaphore = None
+        self.tasks = {}
+
+        # 统计信息
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.cancelled = 0
+
+    def _ensure_session(self):
+        if self.session is not None:
+            return
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self.backend == "aiohttp":
+            self.session = aiohttp.ClientSession(
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout),
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+            )
+        else:
+            self.session = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency),
+            )
+
+    async def _send(self, params, body, url=None):
+        url = url or self.url
+        headers = {'X-ClientTraceId': str(uuid.uuid4())}
+        async with self.semaphore:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                if self.backend == "aiohttp":
+                    async with self.session.post(url, params=params, headers=headers, json=body) as response:
+                        if response.status >= 400:
+                            raise TranslatorStatusError(response.status,
+                                                        _parse_retry_after(response.headers.get('Retry-After')))
+                        return await response.json(content_type=None)
+                response = await self.session.post(url, params=params, headers=headers, json=body)
+                if response.status_code >= 400:
+                    raise TranslatorStatusError(response.status_code,
+                                                _parse_retry_after(response.headers.get('Retry-After')))
+                return response.json()
+            finally:
+                self.in_flight -= 1
+
+    async def _post(self, texts, source_language, target_languages):
+        """发送一个翻译请求，返回与 texts 一一对应的 {目标语言: 译文} 列表"""
+        self._ensure_session()
+        # 多个目标语言编码成重复的 to 参数
+        params = [('api-version', '3.0'), ('from', source_language)] + [('to', language) for language in target_languages]
+        body = [{'text': text} for text in texts]
+        attempt = lambda: self._send(params, body)
+        if self.selector is not None:
+            attempt = lambda: self.selector.call_async(
+                lambda endpoint: self._send(params, body, endpoint.address + '/translate'), classify_async_error)
+        if self.governor is not None:
+            result = await self.governor.call_async(attempt, billed_chars(texts, target_languages), classify_async_error)
+        else:
+            result = await attempt()
+        return parse_translations(result, len(texts), target_languages)
+
+    async def translate(self, text, source_language="zh-Hans", target_language="en"):
+        """翻译一段文本，失败时抛出异常"""
+        return (await self.translate_multi(text, source_language, [target_language]))[target_language]
+
+    async def translate_multi(self, text, source_language="zh-Hans", target_languages=("en",), store=True):
+        """在一个请求中把一段文本翻译成多种目标语言，返回 {目标语言: 译文}；store 为 False 时译文不写入缓存"""
+        if self.single_flight is None:
+            translations, fetched = await self._translate_multi(text, source_language, target_languages)
+        else:
+            # 取消一个调用者不会影响同时等待这段译文的其他调用者
+            translations, fetched = await self.single_flight.do_async(
+                (text, source_language, tuple(target_languages)),
+                lambda: self._translate_multi(text, source_language, target_languages))
+        if store and fetched and self.cache is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._cache_put, text, source_language, {language: translations[language] for language in fetched})
+        return dict(translations)
+
+    async def _translate_multi(self, text, source_language, target_languages):
+        """返回 ({目标语言: 译文}, 由翻译服务翻译的目标语言列表)"""
+        if self.phrasebook is not None:
+            local = self.phrasebook.lookup(text, source_language, target_languages)
+            if local is not None:
+                return local, []
+
+        translations = {}
+        if self.cache is not None:
+            translations = await asyncio.get_running_loop().run_in_executor(
+                None, self._cache_get, text, source_language, target_languages)
+        missing = [language for language in target_languages if language not in translations]
+
+        # 术语标记后文本相同的目标语言放在同一个请求中
+        groups = {}
+        for language in missing:
+            request_text = self.phrasebook.protect(text, source_language, language) \
+                if self.phrasebook is not None else text
+            groups.setdefault(request_text, []).append(language)
+        for request_text, languages in groups.items():
+            result = (await self._post([request_text], source_language, languages))[0]
+            for language in languages:
+                translations[language] = result[language]
+        return {language: translations[language] for language in target_languages}, missing
+
+    def _cache_get(self, text, source_language, target_languages):
+        # 在线程池中运行
+        translations = {}
+        for language in target_languages:
+            cached = self.cache.get(text, source_language, language)
+            if cached is not None:
+                translations[language] = cached
+        return translations
+
+    def _cache_put(self, text, source_language, translations):
+        # 在线程池中运行
+        for language, translated_text in translations.items():
+            self.cache.put(text, source_language, language, translated_text)
+
+    def submit(self, text, source_language="zh-Hans", target_language="en", key=None):
+        """创建翻译任务并返回 asyncio.Task（在事件循环中调用）
+
+        传入 key 时，同一个 key 还没有完成的旧任务会被取消。
+        """
+        return self._track(key, self.translate(text, source_language, target_language))
+
+    def submit_multi(self, text, source_language="zh-Hans", target_languages=("en",), key=None, store=True):
+        """submit() 的多目标语言版本，任务的结果为 {目标语言: 译文}"""
+        return self._track(key, self.translate_multi(text, source_language, target_languages, store))
+
+    def _track(self, key, coroutine):
+        if key is not None:
+            self.cancel(key)
+        task = asyncio.ensure_future(coroutine)
+        if key is not None:
+            self.tasks[key] = task
+            task.add_done_callback(lambda done: self.tasks.pop(key, None) if self.tasks.get(key) is done else None)
+        return task
+
+    def cancel(self, key):
+        """取消 key 对应的还没有完成的翻译任务，返回是否取消了任务"""
+        task = self.tasks.pop(key, None)
+        if task is not None and not task.done():
+            task.cancel()
+            self.cancelled += 1
+            return True
+        return False
+
+    async def close(self):
+        for key in list(self.tasks):
+            self.cancel(key)
+        if self.session is not None:
+            if self.backend == "aiohttp":
+                await self.session.close()
+            else:
+                await self.session.aclose()
+            self.session = None
+
+    def report(self):
+        return (
+            f"异步翻译({self.backend}): {self.requests} 个请求  最多同时 {self.max_in_flight} 个"
+            f"（上限 {self.max_concurrency}）  取消 {self.cancelled} 个"
+        )
+
+
+class _EventLoopThread:
+    """在后台线程中运行的事件循环，让同步代码也可以使用异步客户端"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="async-translator", daemon=True)
+        self.thread.start()
+
+    def submit(self, coroutine):
+        """返回 concurrent.futures.Future，调用它的 cancel() 会取消协程"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+
+_client = None
+_loop = None
+_client_lock = threading.Lock()
+
+
+def get_async_translator_client():
+    """返回进程内共享的异步翻译客户端和运行它的事件循环线程；配置缺失或没有安装 aiohttp/httpx 时返回 (None, None)"""
+    global _client, _loop
+    with _client_lock:
+        if _client is None:
+            load_dotenv()
+            translator_key = os.environ.get('AZURE_TRANSLATOR_KEY')
+            translator_endpoint = os.environ.get('AZURE_TRANSLATOR_ENDPOINT')
+            if not translator_key or not translator_endpoint:
+                return None, None
+            try:
+                _client = AsyncTranslatorClient(
+                    translator_key, translator_endpoint, os.environ.get('AZURE_SPEECH_REGION', 'eastus'),
+                    max_concurrency=int(os.environ.get('TRANSLATOR_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY)),
+                    cache=get_translation_cache(),
+                    governor=get_governor("translator"),
+                    selector=get_endpoint_selector("translator"),
+                    phrasebook=get_phrasebook(),
+                    single_flight=get_single_flight("translate"),
+                )
+            except ImportError as e:
+                print(e)
+                return None, None
+            _loop = _EventLoopThread()
+        return _client, _loop
+
+
+def close_async_translator():
+    """关闭共享的异步客户端（程序退出前调用）"""
+    global _client, _loop
+    with _client_lock:
+        if _client is not None:
+            _loop.submit(_client.close()).result()
+            _loop.loop.call_soon_threadsafe(_loop.loop.stop)
+            _client = None
+            _loop = None
+
+
+def submit_translation(text, source_language="zh-Hans", target_language="en", key=None):
+    """在后台事件循环中开始翻译，返回 concurrent.futures.Future；同一个 key 的旧请求会被取消"""
+    client, loop = get_async_translator_client()
+    if client is None:
+        raise TranslatorError("异步翻译客户端不可用")
+
+    async def run():
+        return await client.submit(text, source_language, target_language, key)
+
+    return loop.submit(run())
+
+
+def submit_translation_multi(text, source_language="zh-Hans", target_languages=("en",), key=None, store=True):
+    """submit_translation 的多目标语言版本，Future 的结果为 {目标语言: 译文}；store 为 False 时译文不写入缓存"""
+    client, loop = get_async_translator_client()
+    if client is None:
+        raise TranslatorError("异步翻译客户端不可用")
+
+    async def run():
+        return await client.submit_multi(text, source_language, target_languages, key, store)
+
+    return loop.submit(run())
+
+
+def cancel_translation(key):
+    """取消 submit_translation / submit_translation_multi 中 key 对应的还没有完成的翻译"""
+    client, loop = get_async_translator_client()
+    if client is not None:
+        loop.loop.call_soon_threadsafe(client.cancel, key)
+
+
+def translate_text(text, source_language="zh-Hans", target_language="en"):
+    """与 translator_client.translate_text 相同：翻译一段文本，失败时返回None"""
+    client, loop = get_async_translator_client()
+    if client is None:
+        print("错误：请在.env文件中设置AZURE_TRANSLATOR_KEY和AZURE_TRANSLATOR_ENDPOINT，并安装 aiohttp 或 httpx")
+        return None
+
+    try:
+        return loop.submit(client.translate(text, source_language, target_language)).result()
+    except TranslatorError as e:
+        print(e)
+        return None
+    except Exception as e:
+        print(f"翻译过程中发生错误: {e}")
+        return None
+
+
+def translate_text_multi(text, source_language="zh-Hans", target_languages=("en",)):
+    """与 translator_client.translate_text_multi 相同：返回 {目标语言: 译文}，失败时返回None"""
+    client, loop = get_async_translator_client()
+    if client is None:
+        print("错误：请在.env文件中设置AZURE_TRANSLATOR_KEY和AZURE_TRANSLATOR_ENDPOINT，并安装 aiohttp 或 httpx")
+        return None
+
+    try:
+        return loop.submit(client.translate_multi(text, source_language, target_languages)).result()
+    except TranslatorError as e:
+        print(e)
+        return None
+    except Exception as e:
+        print(f"翻译过程中发生错误: {e}")
+        return None
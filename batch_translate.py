@@ -0,0 +1,293 @@
+import argparse
+import json
+import os
+import threading
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import azure.cognitiveservices.speech as speechsdk
+from dotenv import load_dotenv
+from translator_client import get_target_languages, get_translator_client, language_display_name
+from translation_cache import get_translation_cache
+from endpoint_selector import select_speech_region
+from srt import format_srt_time
+
+# 识别结果中的 offset / duration 以100纳秒为单位
+TICKS_PER_SECOND = 10_000_000
+# 一个翻译请求中最多的文本段数和字符数（翻译服务的限制）
+TRANSLATE_MAX_ITEMS = 100
+TRANSLATE_MAX_CHARS = 10000
+# 识别时每隔多久检查一次是否按了Ctrl+C（秒）
+STOP_POLL_INTERVAL = 0.5
+
+# 按Ctrl+C后设置，线程池中正在识别的文件尽快结束
+stop_event = threading.Event()
+
+
+def collect_wav_files(paths):
+    """展开命令行参数中的文件和目录（递归查找目录下的.wav文件），去掉重复的文件"""
+    return [path for path, _ in collect_wav_outputs(paths)]
+
+
+def collect_wav_outputs(paths):
+    """同 collect_wav_files，同时给出每个文件的输出文件名（不含扩展名），返回 [(文件, 输出名), ...]
+
+    目录中的文件在输出目录中保留相对于这个目录的子目录（a/x.wav 和 b/x.wav 不会互相覆盖），
+    单独给出的文件只用文件名；仍然重名时在后面加上 _2、_3。
+    """
+    files = []
+    seen = set()
+    names = set()
+    for path in paths:
+        if os.path.isdir(path):
+            found = []
+            for root, _, filenames in os.walk(path):
+                found.extend(os.path.join(root, name) for name in filenames if name.lower().endswith(".wav"))
+            candidates = [(candidate, os.path.relpath(candidate, path)) for candidate in sorted(found)]
+        else:
+            candidates = [(path, os.path.basename(path))]
+        for candidate, relative in candidates:
+            key = os.path.abspath(candidate)
+            if key in seen:
+                continue
+            seen.add(key)
+            base = os.path.splitext(relative)[0]
+            name = base
+            suffix = 1
+            # Windows 上的文件名不区分大小写
+            while name.lower() in names:
+                suffix += 1
+                name = f"{base}_{suffix}"
+            names.add(name.lower())
+            files.append((candidate, name))
+    return files
+
+
+def wav_duration(path):
+    """WAV文件的时长（秒），无法读取时返回None"""
+    try:
+        with wave.open(path, "rb") as wav:
+            return wav.getnframes() / wav.getframerate()
+    except (OSError, wave.Error, ZeroDivisionError):
+        return None
+
+
+def transcribe_file(path, speech_key, speech_region, language="zh-CN"):
+    """用连续识别转写一个音频文件，返回 [{offset, duration, text}, ...]（时间以秒为单位）"""
+    speech_key, speech_region = select_speech_region(speech_key, speech_region)
+    speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_region)
+    speech_config.speech_recognition_language = language
+    audio_config = speechsdk.audio.AudioConfig(filename=path)
+    speech_recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
+
+    segments = []
+    errors = []
+    done = threading.Event()
+
+    def on_recognized(evt):
+        if evt.result.reason == speechsdk.ResultReason.RecognizedSpeech and evt.result.text:
+            segments.append({
+                'offset': evt.result.offset / TICKS_PER_SECOND,
+                'duration': evt.result.duration / TICKS_PER_SECOND,
+                'text': evt.result.text,
+            })
+
+    def on_canceled(evt):
+        # 文件读完时也会触发 canceled（原因为 EndOfStream），只有 Error 才是真正的错误
+        details = evt.cancellation_details
+        if details.reason == speechsdk.CancellationReason.Error:
+            errors.append(details.error_details)
+        done.set()
+
+    speech_recognizer.recognized.connect(on_recognized)
+    speech_recognizer.canceled.connect(on_canceled)
+    speech_recognizer.session_stopped.connect(lambda evt: done.set())
+
+    speech_recognizer.start_continuous_recognition_async().get()
+    while not done.wait(STOP_POLL_INTERVAL):
+        if stop_event.is_set():
+            break
+    speech_recognizer.stop_continuous_recognition_async().get()
+
+    if not done.is_set():
+        raise RuntimeError("已停止")
+    if errors:
+        raise RuntimeError(f"识别失败: {errors[0]}")
+    segments.sort(key=lambda segment: segment['offset'])
+    return segments
+
+
+def translate_segments(texts, source_language, target_languages):
+    """把所有文本段翻译成各目标语言（多段文本合并成数组请求），返回与 texts 对应的 {目标语言: 译文} 列表"""
+    client = get_translator_client()
+    if client is None:
+        raise RuntimeError("请在.env文件中设置AZURE_TRANSLATOR_KEY和AZURE_TRANSLATOR_ENDPOINT")
+
+    translations = [{} for _ in texts]
+    for language in target_languages:
+        start = 0
+        while start < len(texts):
+            end = start
+            chars = 0
+            while end < len(texts) and end - start < TRANSLATE_MAX_ITEMS and (end == start or chars + len(texts[end]) <= TRANSLATE_MAX_CHARS):
+                chars += len(texts[end])
+                end += 1
+            for index, translated_text in enumerate(client.translate_batch(texts[start:end], source_language, language), start):
+                translations[index][language] = translated_text
+            start = end
+    return translations
+
+
+def write_jsonl(path, source_file, segments):
+    with open(path, "w", encoding="utf-8") as f:
+        for index, segment in enumerate(segments, 1):
+            record = {'file': source_file, 'index': index}
+            record.update(segment)
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def write_srt(path, segments):
+    """写SRT字幕：每条字幕先是中文，后面每种目标语言的译文各占一行"""
+    with open(path, "w", encoding="utf-8") as f:
+        for index, segment in enumerate(segments, 1):
+            start = segment['offset']
+            end = start + segment['duration']
+            f.write(f"{index}\n{format_srt_time(start)} --> {format_srt_time(end)}\n")
+            f.write(segment['text'] + "\n")
+            for translated_text in segment.get('translations', {}).values():
+                f.write(translated_text + "\n")
+            f.write("\n")
+
+
+def process_file(path, output_dir, language="zh-CN", target_languages=None, output_name=None):
+    """转写并翻译一个文件，在输出目录中写出 output_name（默认为同名）的 .jsonl 和 .srt，返回这个文件的统计信息
+
+    在线程池和进程池中都可以运行（参数和返回值都可以pickle），配置从.env读取。
+    """
+    load_dotenv()
+    speech_key = os.environ.get('AZURE_SPEECH_KEY')
+    speech_region = os.environ.get('AZURE_SPEECH_REGION')
+    summary = {'file': path, 'audio_seconds': wav_duration(path), 'segments': 0, 'error': None}
+    started = time.perf_counter()
+    try:
+        segments = transcribe_file(path, speech_key, speech_region, language)
+        if segments and summary['audio_seconds'] is None:
+            summary['audio_seconds'] = segments[-1]['offset'] + segments[-1]['duration']
+
+        if target_languages:
+            try:
+                texts = [segment['text'] for segment in segments]
+                for segment, translations in zip(segments, translate_segments(texts, "zh-Hans", target_languages)):
+                    segment['translations'] = translations
+            except Exception as e:
+                # 翻译失败时仍然输出识别结果
+                summary['error'] = f"翻译失败: {e}"
+
+        base = os.path.join(output_dir, output_name or os.path.splitext(os.path.basename(path))[0])
+        os.makedirs(os.path.dirname(base) or ".", exist_ok=True)
+        write_jsonl(base + ".jsonl", path, segments)
+        write_srt(base + ".srt", segments)
+        summary['segments'] = len(segments)
+    except Exception as e:
+        summary['error'] = str(e)
+    summary['seconds'] = time.perf_counter() - started
+    return summary
+
+
+def format_summary(results, wall_seconds, concurrency):
+    """整批任务的汇总：文件数、音频总时长和吞吐量（每小时处理的音频小时数）"""
+    failed = [result for result in results if result['error']]
+    audio_seconds = sum(result['audio_seconds'] or 0.0 for result in results)
+    segments = sum(result['segments'] for result in results)
+    throughput = audio_seconds / wall_seconds if wall_seconds > 0 else 0.0
+    lines = [
+        f"文件: {len(results)} 个  失败: {len(failed)} 个  并发: {concurrency}",
+        f"音频总时长: {audio_seconds / 3600:.2f} 小时  用时: {wall_seconds:.1f} s  识别句子: {segments}",
+        f"吞吐量: {throughput:.1f} 音频小时/小时",
+    ]
+    for result in failed:
+        lines.append(f"  {result['file']}: {result['error']}")
+    return "\n".join(lines)
+
+
+def stop_executor(executor):
+    """Ctrl+C 时调用：取消还没开始的文件，线程池中正在识别的文件尽快停止，进程池直接结束工作进程"""
+    stop_event.set()
+    # shutdown 之后进程池不再保留工作进程的列表，先取出来
+    processes = list((getattr(executor, '_processes', None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+
+def main():
+    # 加载环境变量
+    load_dotenv()
+    
+    parser = argparse.ArgumentParser(description="批量转写并翻译WAV录音文件")
+    parser.add_argument("paths", nargs="+", help="WAV文件或包含WAV文件的目录")
+    parser.add_argument("-o", "--output-dir", default="transcripts", help="输出目录（默认 transcripts）")
+    parser.add_argument("-j", "--concurrency", type=int, default=int(os.environ.get('BATCH_CONCURRENCY', 0)) or os.cpu_count(),
+                        help="同时处理的文件数（默认 BATCH_CONCURRENCY 或CPU核数）")
+    parser.add_argument("--processes", action="store_true", help="使用进程池代替线程池")
+    parser.add_argument("--language", default="zh-CN", help="识别语言（默认 zh-CN）")
+    parser.add_argument("--no-translate", action="store_true", help="只转写，不翻译")
+    args = parser.parse_args()
+
+    speech_key = os.environ.get('AZURE_SPEECH_KEY')
+    speech_region = os.environ.get('AZURE_SPEECH_REGION')
+    if not speech_key or not speech_region:
+        print("错误：请在.env文件中设置AZURE_SPEECH_KEY和AZURE_SPEECH_REGION")
+        return
+
+    files = collect_wav_outputs(args.paths)
+    if not files:
+        print("没有找到WAV文件")
+        return
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    target_languages = None if args.no_translate else get_target_languages()
+    concurrency = max(1, args.concurrency)
+    print("====== 批量转写和翻译 ======")
+    print(f"文件: {len(files)} 个  并发: {concurrency} ({'进程' if args.processes else '线程'})")
+    if target_languages:
+        print(f"目标语言: {'、'.join(language_display_name(language) for language in target_languages)}")
+
+    executor_class = ProcessPoolExecutor if args.processes else ThreadPoolExecutor
+    results = []
+    started = time.perf_counter()
+    interrupted = False
+    try:
+        with executor_class(max_workers=concurrency) as executor:
+            futures = [executor.submit(process_file, path, args.output_dir, args.language, target_languages, name)
+                       for path, name in files]
+            try:
+                for future in as_completed(futures):
+                    result = future.result()
+                    results.append(result)
+                    status = f"失败 ({result['error']})" if result['error'] else f"{result['segments']} 句"
+                    print(f"[{len(results)}/{len(files)}] {result['file']}: {status}  用时 {result['seconds']:.1f} s")
+            except KeyboardInterrupt:
+                # 在 with 块里处理，否则退出 with 时会等所有文件处理完
+                interrupted = True
+                print("\n停止批量转写...")
+                stop_executor(executor)
+    except KeyboardInterrupt:
+        interrupted = True
+        print("\n停止批量转写...")
+    finally:
+        wall_seconds = time.perf_counter() - started
+        summary = format_summary(results, wall_seconds, concurrency)
+        if interrupted:
+            summary += f"\n已中断：{len(files) - len(results)} 个文件没有处理完"
+        print(summary)
+        with open(os.path.join(args.output_dir, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump({'wall_seconds': wall_seconds, 'concurrency': concurrency, 'interrupted': interrupted,
+                       'files': results}, f, ensure_ascii=False, indent=2)
+        # 进程池模式下每个进程有自己的缓存统计，这里只能打印线程池模式的
+        translation_cache = get_translation_cache()
+        if translation_cache and not args.processes:
+            print(translation_cache.report())
+
+if __name__ == "__main__":
+    main()
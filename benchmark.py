@@ -0,0 +1,260 @@
+import argparse
+import json
+import os
+import queue
+import time
+from datetime import datetime
+import azure.cognitiveservices.speech as speechsdk
+from dotenv import load_dotenv
+from fake_speech import FakeRecognizer, FakeSynthesizerPool, create_push_stream_recognizer, load_fixtures
+from fake_translator_server import FakeTranslatorServer, LatencyModel
+from recognition import ContinuousRecognition, recognize_once
+from translator_client import get_target_languages, get_translator_client, translate_text_multi
+from tts_pool import DEFAULT_VOICE, get_synthesizer_pool
+from tts_streaming import StreamingSpeaker
+
+# 各阶段在报告中的顺序
+STAGES = ["识别", "翻译", "朗读(首段音频)", "朗读(完成)", "端到端"]
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, p):
+    """最近秩法计算百分位数，sorted_values 必须已经排序"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(samples):
+    """把每个阶段的耗时（秒）汇总成毫秒为单位的 p50/p95/p99"""
+    summary = {}
+    for stage in STAGES:
+        values = sorted(samples.get(stage, []))
+        if not values:
+            continue
+        entry = {'count': len(values), 'mean_ms': sum(values) / len(values) * 1000, 'max_ms': values[-1] * 1000}
+        for p in PERCENTILES:
+            entry[f'p{p}_ms'] = percentile(values, p) * 1000
+        summary[stage] = entry
+    return summary
+
+
+def format_summary(summary):
+    lines = [f"{'阶段':<14}{'次数':>6}{'p50':>10}{'p95':>10}{'p99':>10}{'最长':>10}  (ms)"]
+    for stage, entry in summary.items():
+        lines.append(
+            f"{stage:<14}{entry['count']:>6}{entry['p50_ms']:>10.1f}{entry['p95_ms']:>10.1f}"
+            f"{entry['p99_ms']:>10.1f}{entry['max_ms']:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def compare(summary, baseline, threshold):
+    """与之前保存的结果比较，返回报告文本和是否有阶段的 p95 变慢超过 threshold（比例）"""
+    lines = ["与基准结果比较 (p50 / p95，ms):"]
+    regressed = False
+    for stage, entry in summary.items():
+        old = baseline.get('stages', {}).get(stage)
+        if not old:
+            continue
+        change = (entry['p95_ms'] - old['p95_ms']) / old['p95_ms'] if old['p95_ms'] > 0 else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  <-- 变慢"
+            regressed = True
+        lines.append(
+            f"  {stage}: {old['p50_ms']:.1f} -> {entry['p50_ms']:.1f}  /  "
+            f"{old['p95_ms']:.1f} -> {entry['p95_ms']:.1f} ({change * 100:+.1f}%){flag}"
+        )
+    return "\n".join(lines), regressed
+
+
+class Benchmark:
+    """依次运行 识别 -> 翻译 -> 朗读，记录每个阶段和端到端（说完话到听到第一段译文语音）的耗时"""
+
+    def __init__(self, recognizer_factory, speaker, target_languages, voice_name):
+        self.recognizer_factory = recognizer_factory
+        self.speaker = speaker
+        self.target_languages = target_languages
+        self.voice_name = voice_name
+        self.samples = {stage: [] for stage in STAGES}
+        self.failures = {}
+
+    def _fail(self, stage):
+        self.failures[stage] = self.failures.get(stage, 0) + 1
+
+    def _process(self, text, speech_ended, recognized_at, record):
+        started = time.perf_counter()
+        translations = translate_text_multi(text, target_languages=self.target_languages)
+        translated_at = time.perf_counter()
+        if not translations:
+            self._fail("翻译")
+            return
+        outcome = self.speaker.speak(translations[self.target_languages[0]], self.voice_name)
+        spoken_at = time.perf_counter()
+        if not outcome.success or outcome.time_to_first_audio is None:
+            self._fail("朗读")
+            return
+        if record:
+            self.samples["识别"].append(recognized_at - speech_ended)
+            self.samples["翻译"].append(translated_at - started)
+            self.samples["朗读(首段音频)"].append(outcome.time_to_first_audio)
+            self.samples["朗读(完成)"].append(spoken_at - translated_at)
+            self.samples["端到端"].append(translated_at + outcome.time_to_first_audio - speech_ended)
+
+    def run_once_mode(self, iterations, warmup):
+        """单次识别轮询（与 recognition_loop 相同的调用路径）"""
+        for iteration in range(warmup + iterations):
+            speech_recognizer, speech_ended = self.recognizer_factory()
+            result = recognize_once(speech_recognizer)
+            recognized_at = time.perf_counter()
+            if result.reason != speechsdk.ResultReason.RecognizedSpeech:
+                self._fail("识别")
+                continue
+            self._process(result.text, min(speech_ended(), recognized_at), recognized_at, iteration >= warmup)
+
+    def run_continuous_mode(self, iterations, warmup):
+        """连续识别：识别结果经过队列交给处理线程，排队等待的时间计入端到端延迟"""
+        speech_recognizer, speech_ended = self.recognizer_factory()
+        recognized_queue = queue.Queue()
+
+        def on_recognized(text):
+            now = time.perf_counter()
+            recognized_queue.put((text, min(speech_ended(), now), now))
+
+        def on_canceled(cancellation):
+            self._fail("识别")
+
+        recognition = ContinuousRecognition(speech_recognizer, on_recognized, on_canceled=on_canceled)
+        recognition.start()
+        try:
+            for iteration in range(warmup + iterations):
+                text, ended, recognized_at = recognized_queue.get()
+                self._process(text, ended, recognized_at, iteration >= warmup)
+        finally:
+            recognition.stop()
+
+
+def main():
+    # 加载环境变量
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="识别、翻译、朗读的端到端延迟基准测试")
+    parser.add_argument("-n", "--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3, help="预热次数，不计入结果")
+    parser.add_argument("--mode", choices=["once", "continuous"], default="once", help="识别模式")
+    parser.add_argument("--speech", choices=["fake", "azure"], default="fake",
+                        help="fake: 确定性的假识别器和合成器；azure: 通过push stream把录音喂给Azure语音服务")
+    parser.add_argument("--translator", choices=["fake", "azure"], default="fake",
+                        help="fake: 启动本地假翻译服务；azure: 使用.env中配置的翻译服务")
+    parser.add_argument("--fixtures", help="录音样本目录（.wav 和同名的 .txt 参考文本）")
+    parser.add_argument("--time-scale", type=float, default=0.0,
+                        help="假识别器按录音时长的多少倍模拟说话时间（连续识别模式下默认1）")
+    parser.add_argument("--asr-latency-ms", type=float, default=300, help="假识别器说完到出结果的延迟中位数")
+    parser.add_argument("--tts-latency-ms", type=float, default=150, help="假合成器的首段音频延迟中位数")
+    parser.add_argument("--translator-latency-ms", type=float, default=80, help="假翻译服务的延迟中位数")
+    parser.add_argument("--translator-sigma", type=float, default=0.4, help="假翻译服务延迟分布的sigma（长尾）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="假翻译服务返回500的比例")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="假翻译服务返回429的比例")
+    parser.add_argument("--cache", action="store_true", help="保留翻译缓存（默认关闭，避免缓存命中掩盖延迟）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="结果JSON文件（默认 benchmark_results/<时间>.json）")
+    parser.add_argument("--compare", help="与之前保存的结果JSON比较")
+    parser.add_argument("--threshold", type=float, default=0.1, help="p95变慢超过这个比例时视为回归（默认0.1）")
+    args = parser.parse_args()
+
+    config = vars(args).copy()
+    server = None
+    if args.translator == "fake":
+        server = FakeTranslatorServer(
+            latency=LatencyModel(args.translator_latency_ms / 1000, args.translator_sigma, seed=args.seed),
+            error_rate=args.error_rate,
+            throttle_rate=args.throttle_rate,
+            seed=args.seed,
+        ).start()
+        # 让 translate_text 走本地假服务（.env中的值不会覆盖已经设置的环境变量）
+        os.environ['AZURE_TRANSLATOR_KEY'] = "benchmark"
+        os.environ['AZURE_TRANSLATOR_ENDPOINT'] = server.url
+    if not args.cache:
+        os.environ['TRANSLATION_CACHE'] = "off"
+
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else None
+    if args.speech == "fake":
+        time_scale = args.time_scale or (1.0 if args.mode == "continuous" else 0.0)
+        asr_latency = LatencyModel(args.asr_latency_ms / 1000, 0.2, seed=args.seed)
+        shared = FakeRecognizer(fixtures, asr_latency, time_scale)
+
+        def recognizer_factory():
+            return shared, lambda: shared.speech_ended
+
+        speaker = StreamingSpeaker(FakeSynthesizerPool(LatencyModel(args.tts_latency_ms / 1000, 0.3, seed=args.seed)))
+    else:
+        speech_key = os.environ.get('AZURE_SPEECH_KEY')
+        speech_region = os.environ.get('AZURE_SPEECH_REGION')
+        if not speech_key or not speech_region or not fixtures:
+            print("错误：--speech azure 需要在.env中设置AZURE_SPEECH_KEY和AZURE_SPEECH_REGION，并用 --fixtures 指定录音样本")
+            return
+        if args.mode == "continuous":
+            print("错误：--speech azure 只支持 --mode once（每个样本使用单独的push stream）")
+            return
+        speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_region)
+        speech_config.speech_recognition_language = "zh-CN"
+        counter = [0]
+
+        def recognizer_factory():
+            fixture = fixtures[counter[0] % len(fixtures)]
+            counter[0] += 1
+            speech_recognizer, finished, feed = create_push_stream_recognizer(speech_config, fixture.path)
+            feed()
+            return speech_recognizer, lambda: finished.time or time.perf_counter()
+
+        speaker = StreamingSpeaker(get_synthesizer_pool())
+
+    target_languages = get_target_languages()
+    benchmark = Benchmark(recognizer_factory, speaker, target_languages, DEFAULT_VOICE)
+    print(f"====== 延迟基准测试 ({args.mode}, 识别/朗读: {args.speech}, 翻译: {args.translator}) ======")
+    started = time.perf_counter()
+    try:
+        if args.mode == "continuous":
+            benchmark.run_continuous_mode(args.iterations, args.warmup)
+        else:
+            benchmark.run_once_mode(args.iterations, args.warmup)
+    except KeyboardInterrupt:
+        print("\n提前停止基准测试...")
+    finally:
+        client = get_translator_client()
+        if client is not None:
+            client.close()
+
+    summary = summarize(benchmark.samples)
+    print(format_summary(summary))
+    if benchmark.failures:
+        print("失败次数: " + "  ".join(f"{stage}: {count}" for stage, count in benchmark.failures.items()))
+    results = {
+        'created': datetime.now().isoformat(timespec="seconds"),
+        'wall_seconds': time.perf_counter() - started,
+        'config': config,
+        'stages': summary,
+        'failures': benchmark.failures,
+    }
+    if server is not None:
+        results['translator_server'] = server.stats()
+        server.stop()
+
+    output = args.output or os.path.join("benchmark_results", datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            report, regressed = compare(summary, json.load(f), args.threshold)
+        print(report)
+        if regressed:
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
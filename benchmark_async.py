@@ -0,0 +1,101 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from async_translator import AsyncTranslatorClient
+from benchmark import percentile
+from fake_translator_server import FakeTranslatorServer, LatencyModel
+from translator_client import TranslatorClient
+
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'seconds': elapsed,
+        'throughput': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def run_threads(url, streams, requests_per_stream):
+    """原来的做法：每路一个线程，用同步客户端逐句翻译"""
+    client = TranslatorClient("benchmark", url, "local", pool_size=streams)
+    latencies = []
+
+    def stream(index):
+        for number in range(requests_per_stream):
+            started = time.perf_counter()
+            client.translate(f"第 {index} 路第 {number} 句测试文本", "zh-Hans", "en")
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=streams) as executor:
+        list(executor.map(stream, range(streams)))
+    elapsed = time.perf_counter() - started
+    client.close()
+    return summarize(latencies, elapsed)
+
+
+async def run_async(url, streams, requests_per_stream, max_concurrency, backend):
+    """每路一个协程，共用一个异步客户端"""
+    client = AsyncTranslatorClient("benchmark", url, "local", max_concurrency=max_concurrency, backend=backend)
+    latencies = []
+
+    async def stream(index):
+        for number in range(requests_per_stream):
+            started = time.perf_counter()
+            await client.translate(f"第 {index} 路第 {number} 句测试文本", "zh-Hans", "en")
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(stream(index) for index in range(streams)))
+    elapsed = time.perf_counter() - started
+    await client.close()
+    return summarize(latencies, elapsed), client.max_in_flight
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较同步（每路一个线程）和异步翻译客户端在多路并发时的吞吐量")
+    parser.add_argument("--streams", default="1,8,64", help="并发路数，逗号分隔")
+    parser.add_argument("-n", "--requests", type=int, default=20, help="每路翻译的句数")
+    parser.add_argument("--max-concurrency", type=int, default=64, help="异步客户端同时进行的请求上限")
+    parser.add_argument("--backend", choices=["aiohttp", "httpx"], help="异步客户端使用的HTTP库（默认自动选择）")
+    parser.add_argument("--latency-ms", type=float, default=80, help="假翻译服务的延迟中位数")
+    parser.add_argument("--sigma", type=float, default=0.4, help="假翻译服务延迟的长尾程度")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-o", "--output", help="结果JSON文件（默认 benchmark_results/async-<时间>.json）")
+    args = parser.parse_args()
+
+    server = FakeTranslatorServer(latency=LatencyModel(args.latency_ms / 1000, args.sigma, seed=args.seed), seed=args.seed)
+    server.start()
+    results = []
+    try:
+        print(f"{'路数':<6}{'客户端':<10}{'吞吐量(句/秒)':>14}{'p50':>10}{'p95':>10}{'p99':>10}  (ms)")
+        for streams in [int(value) for value in args.streams.split(",") if value.strip()]:
+            thread_result = run_threads(server.url, streams, args.requests)
+            async_result, max_in_flight = asyncio.run(
+                run_async(server.url, streams, args.requests, args.max_concurrency, args.backend))
+            for name, result in (("threads", thread_result), ("asyncio", async_result)):
+                print(f"{streams:<6}{name:<10}{result['throughput']:>14.1f}{result['p50_ms']:>10.1f}"
+                      f"{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}")
+            results.append({'streams': streams, 'threads': thread_result, 'asyncio': async_result,
+                            'asyncio_max_in_flight': max_in_flight})
+    finally:
+        server.stop()
+
+    output = args.output or os.path.join("benchmark_results", "async-" + datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({'created': datetime.now().isoformat(timespec="seconds"), 'config': vars(args), 'results': results},
+                  f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from benchmark import percentile
+from endpoint_selector import Endpoint, EndpointSelector, probe_translator
+from fake_translator_server import FakeTranslatorServer, LatencyModel
+from translator_client import TranslatorClient
+
+
+def run_phase(client, streams, requests_per_stream, during=None):
+    """streams 路同时翻译，每路 requests_per_stream 句；during(已完成的比例) 在每句之后调用"""
+    latencies = []
+    total = streams * requests_per_stream
+
+    def stream(index):
+        for number in range(requests_per_stream):
+            started = time.perf_counter()
+            client.translate(f"第 {index} 路第 {number} 句", "zh-Hans", "en")
+            latencies.append(time.perf_counter() - started)
+            if during is not None:
+                during(len(latencies) / total)
+
+    with ThreadPoolExecutor(max_workers=streams) as executor:
+        list(executor.map(stream, range(streams)))
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': latencies[-1] * 1000 if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用本地的假翻译服务比较单一端点、按延迟选择+对冲、主端点变慢时的延迟")
+    parser.add_argument("--latencies", default="40,70", help="每个假端点的延迟中位数（毫秒），逗号分隔，第一个为主端点")
+    parser.add_argument("--sigmas", default="0.7,0.2", help="每个假端点延迟的长尾程度")
+    parser.add_argument("--degraded-ms", type=float, default=400, help="故障切换测试中主端点变慢后的延迟中位数")
+    parser.add_argument("--streams", type=int, default=4, help="同时翻译的路数")
+    parser.add_argument("-n", "--requests", type=int, default=100, help="每个阶段每路翻译的句数")
+    parser.add_argument("--budget", type=float, default=0.1, help="对冲请求最多占全部请求的比例")
+    parser.add_argument("--probe-seconds", type=float, default=1, help="探测间隔")
+    parser.add_argument("-o", "--output", help="结果JSON文件（默认 benchmark_results/hedging-<时间>.json）")
+    args = parser.parse_args()
+
+    medians = [float(value) / 1000 for value in args.latencies.split(",")]
+    sigmas = [float(value) for value in args.sigmas.split(",")]
+    servers = [FakeTranslatorServer(latency=LatencyModel(median, sigmas[index % len(sigmas)], seed=index)).start()
+               for index, median in enumerate(medians)]
+    results = {}
+    try:
+        def selector_client():
+            selector = EndpointSelector("translator", [Endpoint(server.url) for server in servers], probe_translator,
+                                        probe_interval=args.probe_seconds, hedge=True, hedge_budget=args.budget)
+            selector.wait_probed(5)
+            return TranslatorClient("benchmark", servers[0].url, "local", pool_size=args.streams * 2,
+                                    selector=selector), selector
+
+        print(f"{'阶段':<16}{'p50':>8}{'p95':>8}{'p99':>8}{'最长':>8}  (ms)")
+
+        def show(name, result, selector=None):
+            line = (f"{name:<16}{result['p50_ms']:>8.0f}{result['p95_ms']:>8.0f}{result['p99_ms']:>8.0f}"
+                    f"{result['max_ms']:>8.0f}")
+            if selector is not None:
+                s = selector.stats()
+                result.update(hedges=s['hedges'], hedge_wins=s['hedge_wins'], failovers=s['failovers'],
+                              switches=s['switches'], endpoints=s['endpoints'])
+                line += f"  对冲 {s['hedges']} 次（先返回 {s['hedge_wins']}）  更换首选 {s['switches']} 次"
+            print(line)
+            results[name] = result
+
+        client = TranslatorClient("benchmark", servers[0].url, "local", pool_size=args.streams * 2)
+        show("单一端点", run_phase(client, args.streams, args.requests))
+        client.close()
+
+        client, selector = selector_client()
+        show("按延迟选择+对冲", run_phase(client, args.streams, args.requests), selector)
+        selector.stop()
+        client.close()
+
+        # 跑到一半时主端点变慢，探测发现后切换到其他端点
+        client, selector = selector_client()
+        primary = servers[0]
+        normal_latency = primary.latency
+
+        def degrade(progress):
+            if progress >= 0.5 and primary.latency is normal_latency:
+                primary.latency = LatencyModel(args.degraded_ms / 1000, 0.3)
+
+        show("主端点变慢", run_phase(client, args.streams, args.requests, degrade), selector)
+        selector.stop()
+        client.close()
+        primary.latency = normal_latency
+    finally:
+        for server in servers:
+            server.stop()
+
+    output = args.output or os.path.join("benchmark_results", "hedging-" + datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({'created': datetime.now().isoformat(timespec="seconds"), 'config': vars(args), 'results': results},
+                  f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {output}")
+
+if __name__ == "__main__":
+    main()
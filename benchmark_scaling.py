@@ -0,0 +1,156 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from benchmark import percentile
+from fake_translator_server import FakeTranslatorServer, LatencyModel
+from load_generator import Recording, request_stats, run_client
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+# 等待所有工作进程就绪的最长时间（秒）
+STARTUP_TIMEOUT = 60
+
+
+def run_clients(url, clients, seconds, speed, timeout):
+    """在一个进程中同时运行多个客户端，避免压测端自己受GIL限制"""
+    recording = Recording("silence", 16000, bytes(int(16000 * seconds) * 2))
+
+    async def run():
+        return await asyncio.gather(*(run_client(url, recording, speed, ["en"], False, timeout) for _ in range(clients)))
+
+    return asyncio.run(run())
+
+
+def wait_ready(stats_url, workers):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            stats = asyncio.run(request_stats(stats_url))
+            if stats['healthy'] == workers:
+                return True
+        except (OSError, websockets.WebSocketException, ValueError, KeyError):
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def run_scale(workers, args, env, cache_dir, pool):
+    """启动 workers 个工作进程的 supervisor.py，用 workers * sessions_per_worker 个客户端压测"""
+    stats_url = f"ws://127.0.0.1:{args.port + 1}"
+    # 每次从空的翻译缓存开始
+    env = dict(env, TRANSLATION_CACHE_PATH=os.path.join(cache_dir, f"cache-{workers}.db"))
+    process = subprocess.Popen(
+        [sys.executable, "supervisor.py", "--workers", str(workers), "--port", str(args.port), "--speech", "fake",
+         "--max-sessions", str(args.sessions_per_worker * 2)] + (["--balancer", args.balancer] if args.balancer else []),
+        env=env, stdout=subprocess.DEVNULL)
+    try:
+        if not wait_ready(stats_url, workers):
+            raise RuntimeError(f"{workers} 个工作进程没有在 {STARTUP_TIMEOUT} 秒内就绪")
+        clients = workers * args.sessions_per_worker
+        # 把客户端平均分给压测进程
+        shares = [clients // args.client_processes + (index < clients % args.client_processes)
+                  for index in range(args.client_processes)]
+        url = f"ws://127.0.0.1:{args.port}"
+        before = asyncio.run(request_stats(stats_url))
+        started = time.perf_counter()
+        results = [result for group in pool.starmap(
+            run_clients, [(url, share, args.seconds, args.speed, args.timeout) for share in shares if share])
+            for result in group]
+        elapsed = time.perf_counter() - started
+        after = asyncio.run(request_stats(stats_url))
+    finally:
+        process.terminate()
+        process.wait()
+
+    completed = [result for result in results if not result['rejected'] and not result['error']]
+    latencies = sorted(latency for result in results for latency in result['latencies'])
+    cpu = after['cpu_seconds'] - before['cpu_seconds']
+    wall = after['wall_seconds'] - before['wall_seconds']
+    cache_lookups = sum(after['cache'][key] - before['cache'][key] for key in ('memory_hits', 'disk_hits', 'misses'))
+    return {
+        'workers': workers,
+        'clients': clients,
+        'completed': len(completed),
+        'rejected': sum(1 for result in results if result['rejected']),
+        'failed': sum(1 for result in results if result['error'] and not result['rejected']),
+        'seconds': elapsed,
+        # 每秒处理的音频秒数，即这台机器可以同时支持的实时会话数
+        'realtime_sessions': len(completed) * args.seconds / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'server_cpu_cores': cpu / wall if wall > 0 else 0.0,
+        # 磁盘层命中说明译文来自其他工作进程（或本进程内存层已淘汰的条目）
+        'cache_disk_hits': after['cache']['disk_hits'] - before['cache']['disk_hits'],
+        'cache_hit_ratio': 1 - (after['cache']['misses'] - before['cache']['misses']) / cache_lookups
+        if cache_lookups else 0.0,
+        'restarts': after['restarts'],
+    }
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="测试翻译服务的会话数随工作进程数增加的扩展性（supervisor.py + 假识别器）")
+    parser.add_argument("--workers", default=",".join(str(n) for n in sorted({1, max(1, cores // 2), cores})),
+                        help="工作进程数，逗号分隔（默认 1、核数的一半、核数）")
+    parser.add_argument("--sessions-per-worker", type=int, default=8, help="每个工作进程分到的客户端数")
+    parser.add_argument("--seconds", type=float, default=20, help="每个客户端发送的音频长度（秒）")
+    parser.add_argument("--speed", type=float, default=10, help="回放速度，越快越接近服务端的处理上限")
+    parser.add_argument("--client-processes", type=int, default=cores, help="运行客户端的进程数")
+    parser.add_argument("--balancer", choices=["reuseport", "proxy"])
+    parser.add_argument("--port", type=int, default=8865)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--latency-ms", type=float, default=80, help="假翻译服务的延迟中位数")
+    parser.add_argument("-o", "--output", help="结果JSON文件（默认 benchmark_results/scaling-<时间>.json）")
+    args = parser.parse_args()
+
+    if websockets is None:
+        print("错误：扩展性测试需要安装 websockets（pip install websockets）")
+        return
+
+    translator = FakeTranslatorServer(latency=LatencyModel(args.latency_ms / 1000, 0.4))
+    translator.start()
+    env = dict(os.environ, AZURE_TRANSLATOR_KEY="benchmark", AZURE_TRANSLATOR_ENDPOINT=translator.url,
+               AZURE_SPEECH_REGION="local", TRANSLATOR_CHARS_PER_MINUTE="0", TRANSLATOR_REQUESTS_PER_SECOND="0",
+               TTS_CACHE="off", SESSION_LOG="off")
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                multiprocessing.get_context("spawn").Pool(args.client_processes) as pool:
+            print(f"{'进程数':<8}{'会话':>6}{'完成':>6}{'实时会话':>10}{'扩展效率':>10}{'CPU核':>8}"
+                  f"{'p50':>8}{'p95':>8}{'p99':>8}  (ms)  跨进程缓存命中")
+            for workers in [int(value) for value in args.workers.split(",") if value.strip()]:
+                result = run_scale(workers, args, env, cache_dir, pool)
+                base = results[0] if results else result
+                # 相对于第一组的每进程吞吐量，1.0 表示线性扩展
+                result['scaling_efficiency'] = (result['realtime_sessions'] / workers) / \
+                    (base['realtime_sessions'] / base['workers']) if base['realtime_sessions'] else 0.0
+                results.append(result)
+                print(f"{workers:<8}{result['clients']:>6}{result['completed']:>6}{result['realtime_sessions']:>10.1f}"
+                      f"{result['scaling_efficiency']:>10.2f}{result['server_cpu_cores']:>8.2f}{result['p50_ms']:>8.0f}"
+                      f"{result['p95_ms']:>8.0f}{result['p99_ms']:>8.0f}  {result['cache_disk_hits']}")
+    finally:
+        translator.stop()
+    if cores < max(result['workers'] for result in results):
+        print(f"注意：这台机器只有 {cores} 个CPU核，工作进程数超过核数时不会继续扩展")
+
+    output = args.output or os.path.join("benchmark_results", "scaling-" + datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({'created': datetime.now().isoformat(timespec="seconds"), 'config': vars(args), 'cpu_count': cores,
+                   'results': results}, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import threading
+import time
+import tkinter as tk
+from datetime import datetime
+from tkinter import scrolledtext
+from benchmark import percentile
+from ui_dispatcher import DEFAULT_FPS, DEFAULT_MAX_LINES, TranscriptBuffer, UIDispatcher
+
+# 主线程心跳的间隔（秒），用实际间隔与预期的差衡量界面是否卡顿
+HEARTBEAT_INTERVAL = 0.05
+
+
+def rss_bytes():
+    """当前进程占用的物理内存（字节），包括Tk的内存"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        return 0
+
+
+def summarize(values):
+    values = sorted(values)
+    summary = {'count': len(values)}
+    for p in (50, 95, 99):
+        summary[f'p{p}_ms'] = percentile(values, p) * 1000
+    return summary
+
+
+def run(mode, rate, duration, threads, fps, max_lines):
+    """用 threads 个线程每秒共发出 rate 个界面更新（一行文本加一次状态更新），持续 duration 秒"""
+    root = tk.Tk()
+    root.title(f"界面压力测试 ({mode})")
+    status_label = tk.Label(root, text="")
+    status_label.pack()
+    text_area = scrolledtext.ScrolledText(root, wrap=tk.WORD, width=80, height=20)
+    text_area.pack(fill=tk.BOTH, expand=True)
+
+    lock = threading.Lock()
+    latencies = []
+    windows = {}
+    lags = []
+    memory = []
+    started = time.perf_counter()
+    stop = threading.Event()
+
+    def record(sent):
+        now = time.perf_counter()
+        with lock:
+            latencies.append(now - sent)
+            windows.setdefault(int(now - started), []).append(now - sent)
+
+    if mode == "dispatcher":
+        ui = UIDispatcher(root, fps)
+        transcript = TranscriptBuffer(text_area, max_lines)
+        ui.register(transcript)
+        ui.start()
+
+        def apply_line(line, sent):
+            transcript.append(line)
+            record(sent)
+
+        def emit(index):
+            sent = time.perf_counter()
+            ui.call(apply_line, f"第 {index} 句识别结果 " + "测试文本" * 8, sent)
+            ui.call_latest("status", status_label.config, text=f"已处理 {index} 句")
+    else:
+        # 原来的做法：每个事件一个 after(0) 回调，文本区域不限制行数
+        def apply_line(line, sent):
+            text_area.insert(tk.END, line + "\n")
+            text_area.see(tk.END)
+            record(sent)
+
+        def emit(index):
+            sent = time.perf_counter()
+            root.after(0, apply_line, f"第 {index} 句识别结果 " + "测试文本" * 8, sent)
+            root.after(0, lambda: status_label.config(text=f"已处理 {index} 句"))
+
+    def worker(offset):
+        interval = threads / rate
+        index = offset
+        next_time = time.perf_counter()
+        while not stop.is_set():
+            emit(index)
+            index += threads
+            next_time += interval
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    expected = [time.perf_counter() + HEARTBEAT_INTERVAL]
+
+    def heartbeat():
+        now = time.perf_counter()
+        lags.append(max(0.0, now - expected[0]))
+        expected[0] = now + HEARTBEAT_INTERVAL
+        if not stop.is_set():
+            root.after(int(HEARTBEAT_INTERVAL * 1000), heartbeat)
+
+    def sample_memory():
+        memory.append((round(time.perf_counter() - started, 1), rss_bytes()))
+        if not stop.is_set():
+            root.after(1000, sample_memory)
+
+    def finish():
+        stop.set()
+        root.after(500, root.quit)
+
+    for offset in range(threads):
+        threading.Thread(target=worker, args=(offset,), daemon=True).start()
+    root.after(int(HEARTBEAT_INTERVAL * 1000), heartbeat)
+    sample_memory()
+    root.after(int(duration * 1000), finish)
+    root.mainloop()
+    root.destroy()
+
+    window_p95 = {second: percentile(sorted(values), 95) * 1000 for second, values in sorted(windows.items())}
+    return {
+        'mode': mode,
+        'events': len(latencies),
+        'latency': summarize(latencies),
+        'latency_p95_ms_per_second': window_p95,
+        'heartbeat_lag': summarize(lags),
+        'memory_mb': [(second, value / 1024 / 1024) for second, value in memory],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="界面更新压力测试：比较每个事件一个 after(0) 与按帧批量更新")
+    parser.add_argument("--mode", choices=["direct", "dispatcher", "both"], default="both")
+    parser.add_argument("--rate", type=int, default=2000, help="每秒发出的界面更新数")
+    parser.add_argument("--duration", type=float, default=30, help="持续时间（秒）")
+    parser.add_argument("--threads", type=int, default=4, help="发出更新的后台线程数")
+    parser.add_argument("--fps", type=float, default=DEFAULT_FPS)
+    parser.add_argument("--max-lines", type=int, default=DEFAULT_MAX_LINES)
+    parser.add_argument("-o", "--output", help="结果JSON文件（默认 benchmark_results/ui-<时间>.json）")
+    args = parser.parse_args()
+
+    modes = ["direct", "dispatcher"] if args.mode == "both" else [args.mode]
+    results = []
+    for mode in modes:
+        print(f"====== {mode}: 每秒 {args.rate} 个更新，持续 {args.duration:.0f} 秒 ======")
+        result = run(mode, args.rate, args.duration, args.threads, args.fps, args.max_lines)
+        results.append(result)
+        memory = result['memory_mb']
+        p95 = list(result['latency_p95_ms_per_second'].values())
+        print(f"更新延迟: p50 {result['latency']['p50_ms']:.1f} ms  p95 {result['latency']['p95_ms']:.1f} ms  "
+              f"p99 {result['latency']['p99_ms']:.1f} ms  (共 {result['events']} 个)")
+        if p95:
+            print(f"每秒p95: 开始 {p95[0]:.1f} ms  结束 {p95[-1]:.1f} ms")
+        print(f"主线程心跳延迟: p95 {result['heartbeat_lag']['p95_ms']:.1f} ms  p99 {result['heartbeat_lag']['p99_ms']:.1f} ms")
+        if memory:
+            print(f"内存: 开始 {memory[0][1]:.1f} MB  结束 {memory[-1][1]:.1f} MB  最大 {max(value for _, value in memory):.1f} MB")
+
+    output = args.output or os.path.join("benchmark_results", "ui-" + datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({'created': datetime.now().isoformat(timespec="seconds"), 'config': vars(args), 'results': results},
+                  f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+# half：朗读期间（以及结束后的 tail 秒内）不上传音频、丢弃识别结果；
+# barge_in：听到本地说话时立即停止朗读（需要耳机或回声消除，否则朗读的声音会打断自己）；off：不做处理
+DUPLEX_OFF = "off"
+DUPLEX_HALF = "half"
+DUPLEX_BARGE_IN = "barge_in"
+# 朗读结束后继续视为回声的时间：覆盖房间的混响和识别服务判断一句话结束所需的静音
+DEFAULT_TAIL_MS = 800
+
+
+class DuplexController:
+    """协调扬声器朗读和麦克风识别
+
+    用开放式扬声器时，麦克风会听到程序自己朗读的英文，识别出来再翻译一次既浪费调用也会
+    形成循环。朗读代码用 playback() 包住每次朗读，识别代码在得到结果后调用 discard(text)：
+    half 模式下朗读期间和结束后 tail 秒内的结果被丢弃，GatedMicrophone 在这段时间内也不上传
+    音频，单次识别模式会等到这段时间结束再开始下一次识别。barge_in 模式下不丢弃结果，
+    local_speech()（识别器的中间结果或语音活动检测）在朗读期间被调用时用 stop_playback 停止朗读。
+    """
+
+    def __init__(self, mode=DUPLEX_HALF, tail=DEFAULT_TAIL_MS / 1000, stop_playback=None):
+        self.mode = mode
+        self.tail = tail
+        self.stop_playback = stop_playback
+        self.condition = threading.Condition()
+        self.playing = 0
+        self.playback_ended = None
+
+        # 统计信息
+        self.playbacks = 0
+        self.discarded = 0
+        self.discarded_chars = 0
+        self.muted_seconds = 0.0
+        self.paused_seconds = 0.0
+        self.barge_ins = 0
+
+    @contextmanager
+    def playback(self):
+        """包住一次朗读（朗读开始和结束的事件）"""
+        with self.condition:
+            self.playing += 1
+            self.playbacks += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.playing -= 1
+                self.playback_ended = time.perf_counter()
+                self.condition.notify_all()
+
+    def _echo_window(self):
+        if self.playing:
+            return True
+        return self.playback_ended is not None and time.perf_counter() - self.playback_ended < self.tail
+
+    def suppressing(self):
+        """现在听到的声音是否可能是自己朗读的回声（只在 half 模式下为 True）"""
+        if self.mode != DUPLEX_HALF:
+            return False
+        with self.condition:
+            return self._echo_window()
+
+    def discard(self, text):
+        """识别结果是否应该丢弃（是的话计入省去的翻译和朗读）"""
+        if not self.suppressing():
+            return False
+        with self.condition:
+            self.discarded += 1
+            self.discarded_chars += len(text)
+        return True
+
+    def mute(self, seconds):
+        """采集到的 seconds 秒音频是否不上传（GatedMicrophone 调用）"""
+        if not self.suppressing():
+            return False
+        with self.condition:
+            self.muted_seconds += seconds
+        return True
+
+    def wait_quiet(self, timeout):
+        """等到不再可能听到回声，最多等 timeout 秒；返回是否可以开始识别"""
+        if self.mode != DUPLEX_HALF:
+            return True
+        started = time.perf_counter()
+        deadline = started + timeout
+        with self.condition:
+            while self._echo_window():
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                wait = deadline - now
+                if not self.playing:
+                    wait = min(wait, self.playback_ended + self.tail - now)
+                self.condition.wait(max(wait, 0.001))
+            quiet = not self._echo_window()
+            self.paused_seconds += time.perf_counter() - started
+        return quiet
+
+    def local_speech(self, evt=None):
+        """听到了本地说话（可以直接连接到识别器的 recognizing 事件）"""
+        if self.mode != DUPLEX_BARGE_IN or self.stop_playback is None:
+            return
+        with self.condition:
+            if not self.playing:
+                return
+            self.barge_ins += 1
+        self.stop_playback()
+
+    def stats(self):
+        with self.condition:
+            return {
+                'mode': self.mode,
+                'playbacks': self.playbacks,
+                'discarded': self.discarded,
+                'discarded_chars': self.discarded_chars,
+                'muted_seconds': self.muted_seconds,
+                'paused_seconds': self.paused_seconds,
+                'barge_ins': self.barge_ins,
+            }
+
+    def report(self):
+        s = self.stats()
+        if s['mode'] == DUPLEX_BARGE_IN:
+            return f"双工控制(barge_in): 朗读 {s['playbacks']} 次  说话打断朗读 {s['barge_ins']} 次"
+        return (
+            f"双工控制({s['mode']}): 朗读 {s['playbacks']} 次  丢弃朗读期间的识别结果 {s['discarded']} 句"
+            f"（省去翻译 {s['discarded']} 次/{s['discarded_chars']} 字，朗读 {s['discarded']} 次）  "
+            f"暂停识别 {s['paused_seconds']:.1f} s  不上传音频 {s['muted_seconds']:.1f} s"
+        )
+
+
+def create_duplex_controller(stop_playback=None):
+    """根据.env中的 DUPLEX_MODE 和 DUPLEX_TAIL_MS 创建双工控制"""
+    load_dotenv()
+    mode = os.environ.get('DUPLEX_MODE', DUPLEX_HALF).strip().lower().replace("-", "_")
+    if mode in ('0', 'false', 'no'):
+        mode = DUPLEX_OFF
+    if mode not in (DUPLEX_OFF, DUPLEX_HALF, DUPLEX_BARGE_IN):
+        print(f"未知的双工模式 {mode}，使用 {DUPLEX_HALF}")
+        mode = DUPLEX_HALF
+    tail = float(os.environ.get('DUPLEX_TAIL_MS', DEFAULT_TAIL_MS)) / 1000
+    return DuplexController(mode, tail, stop_playback)
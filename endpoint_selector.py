@@ -0,0 +1,414 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import requests
+from dotenv import load_dotenv
+
+DEFAULT_PROBE_INTERVAL = 10    # 探测间隔（秒）
+PROBE_TIMEOUT = 3              # 一次探测最多等待的时间（秒）
+EWMA_ALPHA = 0.3               # 往返时间移动平均中新样本的权重
+FAILURE_THRESHOLD = 3          # 请求连续失败多少次后暂时不再优先使用这个端点
+LATENCY_WINDOW = 200           # 计算p95时使用的最近请求数
+MIN_HEDGE_SAMPLES = 20         # 至少有多少个请求延迟样本后才开始对冲
+MIN_HEDGE_DELAY = 0.05         # 对冲等待时间的下限（秒）
+DEFAULT_HEDGE_BUDGET = 0.1     # 对冲请求最多占全部请求的比例
+MAX_CONCURRENT_REQUESTS = 16   # 同步 call() 同时进行的请求上限
+
+
+class Endpoint:
+    """一个候选端点：翻译服务的URL或语音服务的区域名"""
+
+    def __init__(self, address, key=None, name=None):
+        self.address = address
+        self.key = key
+        self.name = name or address
+        self.rtt = None          # 探测往返时间的移动平均（秒），还没有探测过时为None
+        self.healthy = True
+        self.failures = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.etag = None
+
+        # 统计信息
+        self.requests = 0
+        self.errors = 0
+        self.probe_failures = 0
+        self.wins = 0
+
+
+def _p95(values):
+    values = sorted(values)
+    return values[max(0, -(-len(values) * 95 // 100) - 1)] if values else 0.0
+
+
+class EndpointSelector:
+    """在多个候选端点（区域）之间按延迟选择，变慢或出错时自动切换
+
+    后台线程每隔 probe_interval 秒用 probe(endpoint) 并行探测所有端点，按往返时间的
+    移动平均排序。探测失败或请求连续失败 FAILURE_THRESHOLD 次的端点标记为不健康，
+    排到最后，直到探测重新成功。
+
+    call() / call_async() 把请求发给当前最快的端点：可以重试的错误（连接失败、5xx）
+    立即改发给下一个端点；hedge 为 True 时，请求超过这个端点最近延迟的p95还没有返回，
+    就向下一个端点再发一份，使用先返回的结果。对冲请求最多占全部请求的 hedge_budget，
+    避免服务整体变慢时把请求量翻倍。
+    """
+
+    def __init__(self, name, endpoints, probe=None, probe_interval=DEFAULT_PROBE_INTERVAL, hedge=False,
+                 hedge_budget=DEFAULT_HEDGE_BUDGET):
+        self.name = name
+        self.endpoints = list(endpoints)
+        self.probe = probe
+        self.probe_interval = probe_interval
+        self.hedge = hedge
+        self.hedge_budget = hedge_budget
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopped = threading.Event()
+        self.probed = threading.Event()
+        self.executor = None
+        self.current = None
+
+        # 统计信息
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self.switches = 0
+
+    def start(self):
+        """启动后台探测线程（重复调用没有影响）"""
+        with self.lock:
+            if self.thread is not None or self.probe is None:
+                return
+            self.thread = threading.Thread(target=self._probe_loop, name=f"{self.name}-probe", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    def wait_probed(self, timeout):
+        """等待第一轮探测完成，返回是否已经完成"""
+        self.start()
+        return self.probed.wait(timeout)
+
+    def _probe_loop(self):
+        while not self.stopped.is_set():
+            self.probe_all()
+            self.stopped.wait(self.probe_interval)
+
+    def probe_all(self):
+        # 并行探测，一个端点超时不会拖慢其他端点
+        with ThreadPoolExecutor(max_workers=len(self.endpoints)) as executor:
+            list(executor.map(self._probe_one, self.endpoints))
+        self.probed.set()
+
+    def _probe_one(self, endpoint):
+        started = time.perf_counter()
+        try:
+            self.probe(endpoint)
+        except Exception:
+            with self.lock:
+                endpoint.healthy = False
+                endpoint.probe_failures += 1
+            return
+        rtt = time.perf_counter() - started
+        with self.lock:
+            endpoint.rtt = rtt if endpoint.rtt is None else EWMA_ALPHA * rtt + (1 - EWMA_ALPHA) * endpoint.rtt
+            endpoint.healthy = True
+            endpoint.failures = 0
+
+    def ranked(self):
+        """按（是否健康，往返时间，配置顺序）排序的端点列表"""
+        with self.lock:
+            order = {id(endpoint): index for index, endpoint in enumerate(self.endpoints)}
+            ranked = sorted(self.endpoints, key=lambda endpoint: (
+                not endpoint.healthy, endpoint.rtt if endpoint.rtt is not None else float('inf'), order[id(endpoint)]))
+            if ranked[0] is not self.current:
+                if self.current is not None:
+                    self.switches += 1
+                    print(f"{self.name}: 切换到 {ranked[0].name}")
+                self.current = ranked[0]
+            return ranked
+
+    def best(self):
+        self.start()
+        return self.ranked()[0]
+
+    def _hedge_delay(self, endpoint):
+        if not self.hedge or len(self.endpoints) < 2:
+            return None
+        with self.lock:
+            if len(endpoint.latencies) < MIN_HEDGE_SAMPLES:
+                return None
+            return max(MIN_HEDGE_DELAY, _p95(endpoint.latencies))
+
+    def _take_hedge(self):
+        with self.lock:
+            if self.hedges >= self.hedge_budget * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+    def _finish(self, endpoint, started, error, classify, cancelled=False):
+        """记录一个请求的结果；被取消的请求没有完整的延迟，不计入p95（否则对冲等待时间会越来越短）"""
+        if cancelled:
+            return
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            endpoint.requests += 1
+            if error is None:
+                endpoint.latencies.append(elapsed)
+                endpoint.failures = 0
+                return
+            endpoint.errors += 1
+            retryable, _, throttled = classify(error) if classify is not None else (True, None, False)
+            # 限流是整个账号的配额问题，换端点也没有用
+            if retryable and not throttled:
+                endpoint.failures += 1
+                if endpoint.failures >= FAILURE_THRESHOLD:
+                    endpoint.healthy = False
+
+    def _should_fail_over(self, error, classify):
+        retryable, _, throttled = classify(error) if classify is not None else (True, None, False)
+        return retryable and not throttled
+
+    def _record_win(self, endpoint, candidates, hedged):
+        with self.lock:
+            endpoint.wins += 1
+            if hedged and endpoint is not candidates[0]:
+                self.hedge_wins += 1
+
+    def call(self, send, classify=None):
+        """调用 send(endpoint) 并返回先成功的结果；classify 与 Governor.call 的相同"""
+        self.start()
+        candidates = self.ranked()
+        with self.lock:
+            self.calls += 1
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS,
+                                                   thread_name_prefix=f"{self.name}-request")
+        next_index = 0
+        hedged = False
+
+        def launch():
+            nonlocal next_index
+            endpoint = candidates[next_index]
+            next_index += 1
+            started = time.perf_counter()
+            future = self.executor.submit(send, endpoint)
+            future.add_done_callback(lambda done: self._finish(endpoint, started, done.exception(), classify))
+            futures[future] = endpoint
+            return future
+
+        futures = {}
+        pending = {launch()}
+        hedge_delay = self._hedge_delay(candidates[0])
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=hedge_delay, return_when=FIRST_COMPLETED)
+            if not done:
+                # 超过p95还没有返回，向下一个端点发送对冲请求
+                hedge_delay = None
+                if next_index < len(candidates) and self._take_hedge():
+                    hedged = True
+                    pending.add(launch())
+                continue
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if not self._should_fail_over(e, classify):
+                        raise
+                    error = e
+                    if not pending and next_index < len(candidates):
+                        with self.lock:
+                            self.failovers += 1
+                        pending.add(launch())
+                    continue
+                self._record_win(futures[future], candidates, hedged)
+                return result
+        raise error
+
+    async def call_async(self, send, classify=None):
+        """call() 的 asyncio 版本，send(endpoint) 返回协程；先返回的结果到达后取消其他请求"""
+        self.start()
+        candidates = self.ranked()
+        with self.lock:
+            self.calls += 1
+        next_index = 0
+        hedged = False
+
+        def launch():
+            nonlocal next_index
+            endpoint = candidates[next_index]
+            next_index += 1
+            started = time.perf_counter()
+            task = asyncio.ensure_future(send(endpoint))
+            task.add_done_callback(lambda done: self._finish(
+                endpoint, started, None if done.cancelled() else done.exception(), classify, done.cancelled()))
+            tasks[task] = endpoint
+            return task
+
+        tasks = {}
+        pending = {launch()}
+        hedge_delay = self._hedge_delay(candidates[0])
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedge_delay = None
+                    if next_index < len(candidates) and self._take_hedge():
+                        hedged = True
+                        pending.add(launch())
+                    continue
+                for task in done:
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        if not self._should_fail_over(e, classify):
+                            raise
+                        error = e
+                        if not pending and next_index < len(candidates):
+                            with self.lock:
+                                self.failovers += 1
+                            pending.add(launch())
+                        continue
+                    self._record_win(tasks[task], candidates, hedged)
+                    return result
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'calls': self.calls,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'failovers': self.failovers,
+                'switches': self.switches,
+                'current': self.current.name if self.current is not None else None,
+                'endpoints': [{
+                    'name': endpoint.name,
+                    'healthy': endpoint.healthy,
+                    'rtt_ms': endpoint.rtt * 1000 if endpoint.rtt is not None else None,
+                    'p95_ms': _p95(endpoint.latencies) * 1000,
+                    'requests': endpoint.requests,
+                    'errors': endpoint.errors,
+                    'wins': endpoint.wins,
+                } for endpoint in self.endpoints],
+            }
+
+    def render_prometheus(self):
+        """Prometheus 文本格式的计数和每个端点的往返时间（不含 HELP/TYPE 行，由 metrics.render_families 按指标族补上）"""
+        s = self.stats()
+        labels = f'service="{self.name}"'
+        lines = [
+            f'voice_translator_hedged_requests_total{{{labels}}} {s["hedges"]}',
+            f'voice_translator_failovers_total{{{labels}}} {s["failovers"]}',
+        ]
+        for endpoint in s['endpoints']:
+            endpoint_labels = f'{labels},endpoint="{endpoint["name"]}"'
+            if endpoint['rtt_ms'] is not None:
+                lines.append(f'voice_translator_endpoint_rtt_seconds{{{endpoint_labels}}} {endpoint["rtt_ms"] / 1000}')
+            lines.append(f'voice_translator_endpoint_healthy{{{endpoint_labels}}} {1 if endpoint["healthy"] else 0}')
+        return lines
+
+    def report(self):
+        s = self.stats()
+        lines = [f"端点选择({self.name}): 当前 {s['current']}  请求 {s['calls']} 次  对冲 {s['hedges']} 次"
+                 f"（先返回 {s['hedge_wins']} 次）  故障切换 {s['failovers']} 次  更换首选 {s['switches']} 次"]
+        for endpoint in s['endpoints']:
+            rtt = f"{endpoint['rtt_ms']:.0f} ms" if endpoint['rtt_ms'] is not None else "未知"
+            lines.append(f"  {endpoint['name']}: {'正常' if endpoint['healthy'] else '不可用'}  探测 {rtt}  "
+                         f"请求p95 {endpoint['p95_ms']:.0f} ms  请求 {endpoint['requests']}  失败 {endpoint['errors']}  "
+                         f"采用 {endpoint['wins']}")
+        return "\n".join(lines)
+
+
+def probe_translator(endpoint, session=None):
+    """请求不计费的语言列表接口测量往返时间；带上 ETag，内容没有变化时服务端只返回304"""
+    headers = {'If-None-Match': endpoint.etag} if endpoint.etag else {}
+    response = (session or requests).get(endpoint.address.rstrip('/') + '/languages',
+                                         params={'api-version': '3.0', 'scope': 'translation'},
+                                         headers=headers, timeout=PROBE_TIMEOUT)
+    if response.status_code != 304:
+        response.raise_for_status()
+        endpoint.etag = response.headers.get('ETag')
+
+
+def probe_speech_region(endpoint):
+    """测量到区域语音服务的TCP连接时间"""
+    socket.create_connection((f"{endpoint.address}.stt.speech.microsoft.com", 443), timeout=PROBE_TIMEOUT).close()
+
+
+def _split(value):
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+_selectors = {}
+_selectors_lock = threading.Lock()
+
+
+def get_endpoint_selector(name):
+    """返回进程内共享的端点选择器（name 为 translator 或 speech），只有一个候选端点时返回None
+
+    候选端点为 AZURE_TRANSLATOR_ENDPOINT 加上 AZURE_TRANSLATOR_ENDPOINTS（逗号分隔），
+    或 AZURE_SPEECH_REGION 加上 AZURE_SPEECH_REGIONS；其他区域的密钥从
+    AZURE_SPEECH_KEY_<区域> 读取，没有时使用 AZURE_SPEECH_KEY。
+    """
+    with _selectors_lock:
+        if name in _selectors:
+            return _selectors[name]
+        load_dotenv()
+        if name == "translator":
+            addresses = _split(os.environ.get('AZURE_TRANSLATOR_ENDPOINT')) + _split(
+                os.environ.get('AZURE_TRANSLATOR_ENDPOINTS'))
+            endpoints = [Endpoint(address.rstrip('/')) for address in dict.fromkeys(addresses)]
+            session = requests.Session()
+            probe = lambda endpoint: probe_translator(endpoint, session)
+            hedge = os.environ.get('TRANSLATOR_HEDGE', 'on').strip().lower() not in ('off', '0', 'false', 'no')
+        else:
+            regions = _split(os.environ.get('AZURE_SPEECH_REGION')) + _split(os.environ.get('AZURE_SPEECH_REGIONS'))
+            endpoints = [Endpoint(region, os.environ.get('AZURE_SPEECH_KEY_' + region.upper().replace('-', '_'))
+                                  or os.environ.get('AZURE_SPEECH_KEY'))
+                         for region in dict.fromkeys(regions)]
+            probe = probe_speech_region
+            # 识别和合成是长连接，不做对冲
+            hedge = False
+        selector = None
+        if len(endpoints) > 1:
+            selector = EndpointSelector(
+                name, endpoints, probe,
+                probe_interval=float(os.environ.get('ENDPOINT_PROBE_SECONDS', DEFAULT_PROBE_INTERVAL)),
+                hedge=hedge,
+                hedge_budget=float(os.environ.get('TRANSLATOR_HEDGE_BUDGET', DEFAULT_HEDGE_BUDGET)),
+            )
+        _selectors[name] = selector
+        return selector
+
+
+def all_selectors():
+    with _selectors_lock:
+        return [selector for selector in _selectors.values() if selector is not None]
+
+
+def select_speech_region(speech_key, speech_region):
+    """配置了多个语音区域时返回当前最快的 (密钥, 区域)，否则原样返回
+
+    第一次调用时等待第一轮探测完成（最多 PROBE_TIMEOUT 秒）。
+    """
+    selector = get_endpoint_selector("speech")
+    if selector is None:
+        return speech_key, speech_region
+    selector.wait_probed(PROBE_TIMEOUT + 1)
+    endpoint = selector.best()
+    return endpoint.key or speech_key, endpoint.address
@@ -0,0 +1,386 @@
+import os
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import azure.cognitiveservices.speech as speechsdk
+from fake_translator_server import LatencyModel
+from tts_pool import DEFAULT_SYNTHESIZERS_PER_VOICE
+
+
+class EventSignal:
+    """与SDK的 EventSignal 用法相同：connect() 注册回调，fire() 依次调用"""
+
+    def __init__(self):
+        self.handlers = []
+
+    def connect(self, handler):
+        self.handlers.append(handler)
+
+    def disconnect_all(self):
+        self.handlers = []
+
+    def fire(self, evt):
+        for handler in list(self.handlers):
+            handler(evt)
+
+
+class _Done:
+    """代替SDK异步调用返回的 ResultFuture"""
+
+    def __init__(self, value=None):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class _Pending:
+    """包装在后台线程中执行的调用，get() 等待结果"""
+
+    def __init__(self, future):
+        self.future = future
+
+    def get(self):
+        return self.future.result()
+
+
+class FakeResult:
+    def __init__(self, reason, text="", offset=0.0, duration=0.0, audio_data=b""):
+        self.reason = reason
+        self.text = text
+        # 与SDK相同，以100纳秒为单位
+        self.offset = int(offset * 10_000_000)
+        self.duration = int(duration * 10_000_000)
+        self.audio_data = audio_data
+
+
+class FakeEvent:
+    def __init__(self, result=None, cancellation_details=None):
+        self.result = result
+        self.cancellation_details = cancellation_details
+
+
+class Fixture:
+    """一段录音样本：WAV文件的时长和它的参考文本"""
+
+    def __init__(self, text, duration, path=None):
+        self.text = text
+        self.duration = duration
+        self.path = path
+
+
+def load_fixtures(directory):
+    """读取目录下的 .wav 文件，参考文本来自同名的 .txt 文件（没有时用文件名）"""
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(".wav"):
+            continue
+        path = os.path.join(directory, name)
+        with wave.open(path, "rb") as wav:
+            duration = wav.getnframes() / wav.getframerate()
+        text_path = os.path.splitext(path)[0] + ".txt"
+        if os.path.exists(text_path):
+            with open(text_path, encoding="utf-8") as f:
+                text = f.read().strip()
+        else:
+            text = os.path.splitext(name)[0]
+        fixtures.append(Fixture(text, duration, path))
+    return fixtures
+
+
+DEFAULT_FIXTURES = [
+    Fixture("你好，很高兴认识你。", 1.6),
+    Fixture("今天下午三点我们在会议室讨论新产品的发布计划。", 3.4),
+    Fixture("请把上个季度的销售数据发给我。", 2.2),
+    Fixture("这个问题我们明天再确认一下。", 2.0),
+]
+
+
+class FakeRecognizer:
+    """确定性的假语音识别器，接口与 SpeechRecognizer 中本项目用到的部分相同
+
+    依次返回 fixtures 中的文本。每句话先"说话" duration * time_scale 秒，
+    说完后再经过 latency（LatencyModel）才得到识别结果。time_scale=0 时不等待说话时间。
+    支持 recognize_once() 和 start/stop_continuous_recognition_async()。
+    """
+
+    def __init__(self, fixtures=None, latency=None, time_scale=0.0):
+        self.fixtures = list(fixtures or DEFAULT_FIXTURES)
+        self.latency = latency or LatencyModel(median=0.3, sigma=0.2, seed=0)
+        self.time_scale = time_scale
+        self.index = 0
+        self.offset = 0.0
+        self.lock = threading.Lock()
+        # 最近一句话说完的时间（perf_counter），用于计算识别延迟
+        self.speech_ended = None
+
+        self.recognizing = EventSignal()
+        self.recognized = EventSignal()
+        self.canceled = EventSignal()
+        self.session_started = EventSignal()
+        self.session_stopped = EventSignal()
+        self.running = threading.Event()
+        self.thread = None
+
+    def _next(self):
+        with self.lock:
+            fixture = self.fixtures[self.index % len(self.fixtures)]
+            self.index += 1
+            offset = self.offset
+            self.offset += fixture.duration
+        return fixture, offset
+
+    def _speak(self, fixture, offset):
+        """模拟说话和识别，返回识别结果；说话过程中发出 recognizing 事件"""
+        steps = max(1, len(fixture.text) // 4)
+        for step in range(1, steps + 1):
+            time.sleep(fixture.duration * self.time_scale / steps)
+            partial = fixture.text[:len(fixture.text) * step // steps]
+            self.recognizing.fire(FakeEvent(FakeResult(speechsdk.ResultReason.RecognizingSpeech, partial, offset)))
+        self.speech_ended = time.perf_counter()
+        time.sleep(self.latency.sample())
+        return FakeResult(speechsdk.ResultReason.RecognizedSpeech, fixture.text, offset, fixture.duration)
+
+    def recognize_once(self):
+        return self._speak(*self._next())
+
+    def recognize_once_async(self):
+        return _Done(self.recognize_once())
+
+    def _run(self):
+        while self.running.is_set():
+            result = self._speak(*self._next())
+            if self.running.is_set():
+                self.recognized.fire(FakeEvent(result))
+
+    def start_continuous_recognition_async(self):
+        if not self.running.is_set():
+            self.running.set()
+            self.session_started.fire(FakeEvent())
+            self.thread = threading.Thread(target=self._run, name="fake-recognizer", daemon=True)
+            self.thread.start()
+        return _Done()
+
+    def stop_continuous_recognition_async(self):
+        if self.running.is_set():
+            self.running.clear()
+            self.thread.join()
+            self.session_stopped.fire(FakeEvent())
+        return _Done()
+
+
+class FakeStreamRecognizer:
+    """接收推送音频的假识别器，同时充当 PushAudioInputStream（write / close）
+
+    每收到相当于下一个 fixture 时长的音频，就在 latency 之后发出这句话的 recognized 事件；
+    音频中途也会发出 recognizing 事件。close() 后把剩余的音频作为最后一句，然后发出 session_stopped。
+    用于在没有Azure账号时对 translation_server.py 做压力测试。
+    """
+
+    def __init__(self, sample_rate=16000, fixtures=None, latency=None, bytes_per_sample=2):
+        self.fixtures = list(fixtures or DEFAULT_FIXTURES)
+        self.latency = latency or LatencyModel(median=0.3, sigma=0.2)
+        self.bytes_per_second = sample_rate * bytes_per_sample
+        self.lock = threading.Lock()
+        self.index = 0
+        self.received = 0
+        self.utterance_start = 0
+        self.running = False
+        self.pending = []
+
+        self.recognizing = EventSignal()
+        self.recognized = EventSignal()
+        self.canceled = EventSignal()
+        self.session_started = EventSignal()
+        self.session_stopped = EventSignal()
+
+    def _fixture(self):
+        return self.fixtures[self.index % len(self.fixtures)]
+
+    def _emit(self, text, start, end):
+        result = FakeResult(speechsdk.ResultReason.RecognizedSpeech, text,
+                            start / self.bytes_per_second, (end - start) / self.bytes_per_second)
+        timer = threading.Timer(self.latency.sample(), self._fire, args=(result,))
+        timer.daemon = True
+        with self.lock:
+            self.pending.append(timer)
+        timer.start()
+
+    def _fire(self, result):
+        if self.running:
+            self.recognized.fire(FakeEvent(result))
+
+    def write(self, data):
+        with self.lock:
+            self.received += len(data)
+            fixture = self._fixture()
+            boundary = self.utterance_start + int(fixture.duration * self.bytes_per_second)
+            if self.received < boundary:
+                spoken = (self.received - self.utterance_start) / (boundary - self.utterance_start)
+                partial = fixture.text[:max(1, int(len(fixture.text) * spoken))]
+                finished = None
+            else:
+                finished = (fixture.text, self.utterance_start, boundary)
+                self.utterance_start = boundary
+                self.index += 1
+        if finished:
+            self._emit(*finished)
+        elif self.running:
+            self.recognizing.fire(FakeEvent(FakeResult(speechsdk.ResultReason.RecognizingSpeech, partial,
+                                                       self.utterance_start / self.bytes_per_second)))
+
+    def close(self):
+        """音频结束：剩余的音频作为最后一句，全部结果发出后结束会话"""
+        with self.lock:
+            remaining = self.received - self.utterance_start
+            fixture = self._fixture()
+            if remaining > self.bytes_per_second * 0.3:
+                text = fixture.text[:max(1, int(len(fixture.text) * remaining / (fixture.duration * self.bytes_per_second)))]
+                finished = (text, self.utterance_start, self.received)
+                self.utterance_start = self.received
+            else:
+                finished = None
+        if finished:
+            self._emit(*finished)
+
+        def wait_and_stop():
+            with self.lock:
+                timers = list(self.pending)
+            for timer in timers:
+                timer.join()
+            if self.running:
+                self.session_stopped.fire(FakeEvent())
+
+        threading.Thread(target=wait_and_stop, name="fake-stream-close", daemon=True).start()
+
+    def start_continuous_recognition_async(self):
+        self.running = True
+        self.session_started.fire(FakeEvent())
+        return _Done()
+
+    def stop_continuous_recognition_async(self):
+        self.running = False
+        return _Done()
+
+
+def create_push_stream_recognizer(speech_config, wav_path, realtime=True, chunk_seconds=0.1):
+    """用 PushAudioInputStream 把WAV录音喂给真实的 SpeechRecognizer（需要Azure语音服务）
+
+    返回 (识别器, 说完的事件, feed)。调用 feed() 在后台线程中按实时速度写入音频，
+    写完后说完的事件被设置，事件的 time 属性是写完的时间（perf_counter）。
+    """
+    with wave.open(wav_path, "rb") as wav:
+        stream_format = speechsdk.audio.AudioStreamFormat(
+            samples_per_second=wav.getframerate(),
+            bits_per_sample=wav.getsampwidth() * 8,
+            channels=wav.getnchannels(),
+        )
+        frame_rate = wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+        frame_bytes = wav.getsampwidth() * wav.getnchannels()
+
+    push_stream = speechsdk.audio.PushAudioInputStream(stream_format)
+    audio_config = speechsdk.audio.AudioConfig(stream=push_stream)
+    speech_recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
+    finished = threading.Event()
+    finished.time = None
+
+    def write():
+        chunk = int(frame_rate * chunk_seconds) * frame_bytes
+        for start in range(0, len(frames), chunk):
+            push_stream.write(frames[start:start + chunk])
+            if realtime:
+                time.sleep(chunk_seconds)
+        finished.time = time.perf_counter()
+        finished.set()
+        push_stream.close()
+
+    def feed():
+        threading.Thread(target=write, name="push-stream", daemon=True).start()
+
+    return speech_recognizer, finished, feed
+
+
+class FakeSynthesizer:
+    """假语音合成器，接口与 SpeechSynthesizer 中本项目用到的部分相同
+
+    speak_text_async 的请求按顺序排队处理：每段先经过 latency 得到第一段音频
+    （发出 synthesizing 事件），再按每个字符 per_char 秒"播放"完。
+    """
+
+    def __init__(self, latency=None, per_char=0.0):
+        self.latency = latency or LatencyModel(median=0.15, sigma=0.3, seed=0)
+        self.per_char = per_char
+        self.synthesizing = EventSignal()
+        self.synthesis_started = EventSignal()
+        self.synthesis_completed = EventSignal()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fake-synthesizer")
+        self.stopped = False
+
+    def _synthesize(self, text):
+        if self.stopped:
+            return FakeResult(speechsdk.ResultReason.Canceled)
+        time.sleep(self.latency.sample())
+        audio = FakeResult(speechsdk.ResultReason.SynthesizingAudio, audio_data=b"\0" * 32)
+        self.synthesizing.fire(FakeEvent(audio))
+        time.sleep(len(text) * self.per_char)
+        return FakeResult(speechsdk.ResultReason.SynthesizingAudioCompleted, audio_data=b"")
+
+    def speak_text_async(self, text):
+        self.stopped = False
+        return _Pending(self.executor.submit(self._synthesize, text))
+
+    def speak_text(self, text):
+        return self.speak_text_async(text).get()
+
+    def stop_speaking_async(self):
+        self.stopped = True
+        return _Done()
+
+
+class FakeSynthesizerPool:
+    """代替 SynthesizerPool，每种语音一个 FakeSynthesizer；lease() 每种语音最多借出 per_voice 个"""
+
+    def __init__(self, latency=None, per_char=0.0, per_voice=DEFAULT_SYNTHESIZERS_PER_VOICE):
+        self.latency = latency
+        self.per_char = per_char
+        self.per_voice = per_voice
+        self.lock = threading.Lock()
+        self.synthesizers = {}
+        self.idle = {}
+        self.slots = {}
+
+    def get(self, voice_name=None, to_speaker=True):
+        with self.lock:
+            key = (voice_name, to_speaker)
+            if key not in self.synthesizers:
+                self.synthesizers[key] = FakeSynthesizer(self.latency, self.per_char)
+            return self.synthesizers[key]
+
+    @contextmanager
+    def lease(self, voice_name=None):
+        with self.lock:
+            slots = self.slots.setdefault(voice_name, threading.BoundedSemaphore(self.per_voice))
+        slots.acquire()
+        try:
+            with self.lock:
+                idle = self.idle.setdefault(voice_name, [])
+                synthesizer = idle.pop() if idle else FakeSynthesizer(self.latency, self.per_char)
+            try:
+                yield synthesizer
+            finally:
+                with self.lock:
+                    self.idle.setdefault(voice_name, []).append(synthesizer)
+        finally:
+            slots.release()
+
+    def warm_up(self, voice_names):
+        for voice_name in voice_names:
+            self.get(voice_name)
+
+    def close(self):
+        with self.lock:
+            self.synthesizers.clear()
+            self.idle.clear()
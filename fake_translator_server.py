@@ -0,0 +1,202 @@
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+# 动态词典标记：真实的翻译服务直接使用标记中的译文
+DICTIONARY_MARKUP = re.compile(r'<mstrans:dictionary translation="([^"]*)">.*?</mstrans:dictionary>')
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # 默认的监听队列只有5个，多路并发测试时新连接会被重置
+    request_queue_size = 256
+
+    def handle_error(self, request, client_address):
+        # 客户端取消请求时连接被断开，不打印堆栈
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+# 语言列表的版本标识
+LANGUAGES_ETAG = '"fake-languages-1"'
+
+
+class LatencyModel:
+    """模拟服务端延迟：对数正态分布，中位数为 median 秒，sigma 越大长尾越明显"""
+
+    def __init__(self, median=0.08, sigma=0.4, minimum=0.0, seed=None):
+        self.median = median
+        self.sigma = sigma
+        self.minimum = minimum
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def sample(self):
+        if self.median <= 0:
+            return self.minimum
+        with self.lock:
+            return max(self.minimum, self.random.lognormvariate(0, self.sigma) * self.median)
+
+
+class FakeTranslatorServer:
+    """本地的假翻译服务，接口与 Azure Translator v3 的 /translate 相同
+
+    译文为 "[目标语言] 原文"，GET /languages 返回一个很短的语言列表（用于探测往返时间）。可以设置延迟分布、返回500错误的比例和返回429
+    （带 Retry-After 头）的比例，用于在没有Azure账号的情况下做基准测试。
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=None, error_rate=0.0, throttle_rate=0.0,
+                 retry_after=1, seed=None):
+        self.latency = latency or LatencyModel(seed=seed)
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.texts = 0
+        self.probes = 0
+        self.server = _Server((host, port), self._handler_class())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status, body, headers=None):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                # 语言列表接口，用于测量往返时间（支持 If-None-Match）
+                url = urlparse(self.path)
+                if url.path.rstrip("/") != "/languages":
+                    self._reply(404, {"error": {"code": 404000, "message": "not found"}})
+                    return
+                time.sleep(fake.latency.sample())
+                with fake.lock:
+                    fake.probes += 1
+                if self.headers.get("If-None-Match") == LANGUAGES_ETAG:
+                    self.send_response(304)
+                    self.send_header("ETag", LANGUAGES_ETAG)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self._reply(200, {"translation": {"en": {"name": "English"}, "zh-Hans": {"name": "Chinese Simplified"}}},
+                            {"ETag": LANGUAGES_ETAG})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"[]")
+                url = urlparse(self.path)
+                if url.path.rstrip("/") != "/translate":
+                    self._reply(404, {"error": {"code": 404000, "message": "not found"}})
+                    return
+                outcome = fake._outcome(len(body))
+                time.sleep(fake.latency.sample())
+                if outcome == 429:
+                    self._reply(429, {"error": {"code": 429001, "message": "too many requests"}},
+                                {"Retry-After": str(fake.retry_after)})
+                    return
+                if outcome == 500:
+                    self._reply(500, {"error": {"code": 500000, "message": "internal error"}})
+                    return
+                targets = parse_qs(url.query).get("to", ["en"])
+                texts = [DICTIONARY_MARKUP.sub(r"\1", item.get('text', '')) for item in body]
+                result = [
+                    {"translations": [{"text": f"[{target}] {text}", "to": target} for target in targets]}
+                    for text in texts
+                ]
+                self._reply(200, result)
+
+        return Handler
+
+    def _outcome(self, texts):
+        with self.lock:
+            self.requests += 1
+            roll = self.random.random()
+            if roll < self.throttle_rate:
+                self.throttled += 1
+                return 429
+            if roll < self.throttle_rate + self.error_rate:
+                self.errors += 1
+                return 500
+            self.texts += texts
+            return 200
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-translator", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'texts': self.texts,
+                'errors': self.errors,
+                'throttled': self.throttled,
+                'probes': self.probes,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地假翻译服务（用于基准测试和离线调试）")
+    parser.add_argument("--port", type=int, default=5005)
+    parser.add_argument("--latency-ms", type=float, default=80, help="延迟中位数（毫秒）")
+    parser.add_argument("--sigma", type=float, default=0.4, help="对数正态分布的sigma，越大长尾越明显")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500的比例")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="返回429的比例")
+    parser.add_argument("--retry-after", type=int, default=1, help="429响应中 Retry-After 的秒数")
+    args = parser.parse_args()
+
+    server = FakeTranslatorServer(
+        port=args.port,
+        latency=LatencyModel(args.latency_ms / 1000, args.sigma),
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+    ).start()
+    print(f"假翻译服务已启动: {server.url}")
+    print(f"在.env中设置 AZURE_TRANSLATOR_ENDPOINT={server.url} 即可使用，按Ctrl+C退出")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(server.stats())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from dotenv import load_dotenv
+
+# 失败重试：最多重试几次，第一次重试前的基础等待时间和最长等待时间（秒）
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 30.0
+# 熔断：连续失败多少次后暂停请求，暂停多久后放行一个试探请求（秒）
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """服务连续失败，熔断期间直接拒绝请求"""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"{name} 服务暂时不可用（连续失败），{retry_in:.0f} 秒后重试")
+        self.retry_in = retry_in
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多存 capacity 个"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        """取出 amount 个令牌并返回0；令牌不够时不扣除，返回还需要等待的秒数
+
+        超过容量的请求在桶满时放行（令牌变为负数），不会永远等待。
+        """
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        if self.tokens >= needed:
+            self.tokens -= amount
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+
+class CircuitBreaker:
+    """连续失败 failure_threshold 次后打开，reset_timeout 秒后半开放行一个试探请求"""
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_running = False
+        self.opened = 0
+
+    def retry_in(self, now):
+        """还要等多久才能发送请求（0 表示可以发送）"""
+        if self.state == CIRCUIT_CLOSED:
+            return 0.0
+        if self.state == CIRCUIT_OPEN:
+            remaining = self.opened_at + self.reset_timeout - now
+            if remaining > 0:
+                return remaining
+            self.state = CIRCUIT_HALF_OPEN
+        # 半开状态只放行一个试探请求，其他请求继续等待结果
+        return self.reset_timeout if self.trial_running else 0.0
+
+    def before_call(self):
+        if self.state == CIRCUIT_HALF_OPEN:
+            self.trial_running = True
+
+    def success(self):
+        self.failures = 0
+        self.trial_running = False
+        self.state = CIRCUIT_CLOSED
+
+    def failure(self, now):
+        self.failures += 1
+        self.trial_running = False
+        if self.state == CIRCUIT_HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != CIRCUIT_OPEN:
+                self.opened += 1
+            self.state = CIRCUIT_OPEN
+            self.opened_at = now
+
+
+class Governor:
+    """按配额控制对一个服务的调用：令牌桶限速、失败后指数退避重试、连续失败时熔断
+
+    requests_per_second 和 chars_per_minute 为0时不限制。所有调用线程共享同一个
+    Governor：服务返回 429 和 Retry-After 时，所有线程都等到指定时间之后再发送；
+    连续失败时熔断，熔断期间 acquire() 直接抛出 CircuitOpenError，不再等待超时。
+    """
+
+    def __init__(self, name, requests_per_second=0, chars_per_minute=0, max_retries=DEFAULT_MAX_RETRIES,
+                 base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.name = name
+        self.lock = threading.Lock()
+        self.request_bucket = TokenBucket(requests_per_second) if requests_per_second > 0 else None
+        # 字符配额按分钟计算，允许一次用掉一分钟的量
+        self.char_bucket = TokenBucket(chars_per_minute / 60, chars_per_minute) if chars_per_minute > 0 else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        # 退避或 Retry-After 要求等到的时间
+        self.retry_at = 0.0
+        self.consecutive_failures = 0
+
+        # 统计信息
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+        self.rejected = 0
+        self.queued = 0
+        self.queued_seconds = 0.0
+        self.max_queued = 0.0
+
+    def _try_acquire(self, chars, wait_open, started):
+        """尝试取得发送请求的许可：成功时返回 (0, 等待的秒数)，否则返回 (还需要等待的秒数, None)"""
+        with self.lock:
+            now = time.monotonic()
+            delay = self.breaker.retry_in(now)
+            if delay > 0 and not wait_open:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, delay)
+            if delay <= 0:
+                delay = self.retry_at - now
+            if delay <= 0 and self.request_bucket is not None:
+                delay = self.request_bucket.reserve(1, now)
+            if delay <= 0 and self.char_bucket is not None and chars:
+                delay = self.char_bucket.reserve(chars, now)
+                if delay > 0 and self.request_bucket is not None:
+                    # 字符配额不够，把已经取出的请求令牌还回去
+                    self.request_bucket.tokens += 1
+            if delay > 0:
+                return delay, None
+            self.breaker.before_call()
+            waited = now - started
+            self.requests += 1
+            if waited > 0.001:
+                self.queued += 1
+                self.queued_seconds += waited
+                self.max_queued = max(self.max_queued, waited)
+            return 0.0, waited
+
+    def acquire(self, chars=0, wait_open=False):
+        """发送请求前调用，按需要等待令牌和退避时间，返回等待的秒数
+
+        熔断打开时抛出 CircuitOpenError；wait_open=True 时改为等到可以试探为止（用于识别循环）。
+        """
+        started = time.monotonic()
+        while True:
+            delay, waited = self._try_acquire(chars, wait_open, started)
+            if waited is not None:
+                return waited
+            time.sleep(min(delay, 1.0))
+
+    async def acquire_async(self, chars=0):
+        """acquire() 的 asyncio 版本，等待时不阻塞事件循环"""
+        started = time.monotonic()
+        while True:
+            delay, waited = self._try_acquire(chars, False, started)
+            if waited is not None:
+                return waited
+            await asyncio.sleep(min(delay, 1.0))
+
+    def record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+            self.breaker.success()
+
+    def record_failure(self, retry_after=None, throttled=False):
+        """记录一次失败，返回下次请求前应等待的秒数
+
+        throttled 表示被限流（429），服务本身是正常的，不计入熔断；
+        retry_after 为服务要求的等待时间，否则按指数退避加随机抖动计算。
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.consecutive_failures += 1
+            if throttled:
+                self.throttled += 1
+            else:
+                self.failures += 1
+                self.breaker.failure(now)
+            if retry_after is not None:
+                delay = min(retry_after, self.max_delay)
+            else:
+                # 完全随机抖动，避免多个线程同时重试
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (self.consecutive_failures - 1)))
+            self.retry_at = max(self.retry_at, now + delay)
+            return max(delay, self.breaker.retry_in(now))
+
+    def _retry_after_error(self, error, attempt, classify):
+        """记录一次失败；可以重试时返回 True，否则返回 False（调用者重新抛出异常）"""
+        retryable, retry_after, throttled = classify(error) if classify else (True, None, False)
+        if not retryable:
+            # 请求本身有问题（例如参数错误），服务是正常的
+            self.record_success()
+            return False
+        self.record_failure(retry_after, throttled)
+        if attempt >= self.max_retries:
+            return False
+        with self.lock:
+            self.retries += 1
+        return True
+
+    def call(self, func, chars=0, classify=None):
+        """调用 func()，可以重试的错误按退避时间重试，最多 max_retries 次
+
+        classify(exception) 返回 (是否可以重试, Retry-After秒数或None, 是否被限流)，
+        不能重试的错误直接抛出。
+        """
+        attempt = 0
+        while True:
+            self.acquire(chars)
+            try:
+                result = func()
+            except Exception as e:
+                if not self._retry_after_error(e, attempt, classify):
+                    raise
+                attempt += 1
+                continue
+            self.record_success()
+            return result
+
+    async def call_async(self, func, chars=0, classify=None):
+        """call() 的 asyncio 版本，func() 返回一个协程；任务被取消时不计为失败"""
+        attempt = 0
+        while True:
+            await self.acquire_async(chars)
+            try:
+                result = await func()
+            except asyncio.CancelledError:
+                with self.lock:
+                    self.breaker.trial_running = False
+                raise
+            except Exception as e:
+                if not self._retry_after_error(e, attempt, classify):
+                    raise
+                attempt += 1
+                continue
+            self.record_success()
+            return result
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'throttled': self.throttled,
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'circuit_opened': self.breaker.opened,
+                'circuit_state': self.breaker.state,
+                'queued': self.queued,
+                'queued_seconds': self.queued_seconds,
+                'max_queued_seconds': self.max_queued,
+            }
+
+    def render_prometheus(self):
+        """Prometheus 文本格式的样本行（HELP/TYPE 由 metrics.render_families 按指标族写出）"""
+        s = self.stats()
+        labels = f'service="{self.name}"'
+        return [
+            f'voice_translator_requests_total{{{labels}}} {s["requests"]}',
+            f'voice_translator_retries_total{{{labels}}} {s["retries"]}',
+            f'voice_translator_throttled_total{{{labels}}} {s["throttled"]}',
+            f'voice_translator_failures_total{{{labels}}} {s["failures"]}',
+            f'voice_translator_circuit_rejected_total{{{labels}}} {s["rejected"]}',
+            f'voice_translator_circuit_open{{{labels}}} {1 if s["circuit_state"] == CIRCUIT_OPEN else 0}',
+            f'voice_translator_queued_seconds_total{{{labels}}} {s["queued_seconds"]}',
+        ]
+
+    def report(self):
+        s = self.stats()
+        average = s['queued_seconds'] / s['queued'] * 1000 if s['queued'] else 0.0
+        return (
+            f"{self.name} 调用: {s['requests']} 次  重试 {s['retries']} 次  限流(429) {s['throttled']} 次  "
+            f"失败 {s['failures']} 次  熔断 {s['circuit_opened']} 次/拒绝 {s['rejected']} 次\n"
+            f"{self.name} 配额排队: {s['queued']} 次  平均 {average:.0f} ms  最长 {s['max_queued_seconds'] * 1000:.0f} ms"
+        )
+
+
+_governors = {}
+_governors_lock = threading.Lock()
+
+
+def get_governor(name):
+    """返回进程内共享的调用控制（name 为 translator 或 speech）
+
+    配额从.env读取，例如 TRANSLATOR_REQUESTS_PER_SECOND、TRANSLATOR_CHARS_PER_MINUTE、
+    SPEECH_REQUESTS_PER_SECOND，重试和熔断参数为 <NAME>_MAX_RETRIES、<NAME>_FAILURE_THRESHOLD、
+    <NAME>_RESET_SECONDS。
+    """
+    with _governors_lock:
+        governor = _governors.get(name)
+        if governor is None:
+            load_dotenv()
+            prefix = name.upper() + "_"
+            governor = Governor(
+                name,
+                requests_per_second=float(os.environ.get(prefix + 'REQUESTS_PER_SECOND', 0) or 0),
+                chars_per_minute=float(os.environ.get(prefix + 'CHARS_PER_MINUTE', 0) or 0),
+                max_retries=int(os.environ.get(prefix + 'MAX_RETRIES', DEFAULT_MAX_RETRIES)),
+                failure_threshold=int(os.environ.get(prefix + 'FAILURE_THRESHOLD', DEFAULT_FAILURE_THRESHOLD)),
+                reset_timeout=float(os.environ.get(prefix + 'RESET_SECONDS', DEFAULT_RESET_TIMEOUT)),
+            )
+            _governors[name] = governor
+        return governor
+
+
+def all_governors():
+    with _governors_lock:
+        return list(_governors.values())
@@ -0,0 +1,201 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+import wave
+from datetime import datetime
+from batch_translate import collect_wav_files
+from benchmark import percentile
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+DEFAULT_URL = "ws://127.0.0.1:8765"
+# 每条消息的音频长度（秒）
+CHUNK_SECONDS = 0.1
+# 没有指定录音时使用的静音长度（秒），配合服务端的 --speech fake 使用
+DEFAULT_SILENCE_SECONDS = 10.0
+
+
+class Recording:
+    """一段要回放的16位单声道PCM录音"""
+
+    def __init__(self, name, sample_rate, frames):
+        self.name = name
+        self.sample_rate = sample_rate
+        self.frames = frames
+
+    @property
+    def duration(self):
+        return len(self.frames) / 2 / self.sample_rate
+
+
+def load_recordings(paths):
+    recordings = []
+    for path in collect_wav_files(paths):
+        with wave.open(path, "rb") as wav:
+            if wav.getsampwidth() != 2 or wav.getnchannels() != 1:
+                print(f"跳过 {path}：只支持16位单声道PCM")
+                continue
+            recordings.append(Recording(os.path.basename(path), wav.getframerate(), wav.readframes(wav.getnframes())))
+    return recordings
+
+
+async def request_stats(url):
+    async with websockets.connect(url) as websocket:
+        await websocket.send(json.dumps({'type': "stats"}))
+        return json.loads(await websocket.recv())
+
+
+async def run_client(url, recording, speed, targets, tts, timeout):
+    """按实时速度（speed 倍）发送一段录音，收集每句话的延迟
+
+    延迟 = 收到译文的时间 - 这句话在录音中结束的位置被发送出去的时间。
+    """
+    result = {'recording': recording.name, 'rejected': False, 'error': None, 'latencies': [], 'utterances': 0,
+              'audio_bytes': 0}
+    try:
+        async with websockets.connect(url, max_size=2 ** 24) as websocket:
+            await websocket.send(json.dumps({'type': "start", 'sample_rate': recording.sample_rate,
+                                             'targets': targets, 'tts': tts}))
+            ready = json.loads(await websocket.recv())
+            if ready.get('type') != "ready":
+                result['rejected'] = True
+                return result
+
+            chunk = int(recording.sample_rate * CHUNK_SECONDS) * 2
+            started = time.perf_counter()
+            speech_end = {}
+
+            async def send_audio():
+                for index, start in enumerate(range(0, len(recording.frames), chunk)):
+                    # 按录音的时间位置发送，不因为前面的发送变慢而累积误差
+                    delay = started + index * CHUNK_SECONDS / speed - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    await websocket.send(recording.frames[start:start + chunk])
+                await websocket.send(json.dumps({'type': "end"}))
+
+            sender = asyncio.create_task(send_audio())
+            try:
+                while True:
+                    message = await asyncio.wait_for(websocket.recv(), timeout)
+                    received = time.perf_counter()
+                    if isinstance(message, bytes):
+                        result['audio_bytes'] += len(message)
+                        continue
+                    event = json.loads(message)
+                    if event['type'] == "recognized":
+                        result['utterances'] += 1
+                        # 这句话结束的位置在录音中的时间，换算成它被发送出去的时间
+                        speech_end[event['id']] = started + (event['offset'] + event['duration']) / speed
+                    elif event['type'] == "translated" and event['id'] in speech_end:
+                        result['latencies'].append(received - speech_end.pop(event['id']))
+                    elif event['type'] == "error":
+                        result['error'] = event.get('message')
+                    elif event['type'] == "session_end":
+                        break
+            finally:
+                sender.cancel()
+    except websockets.InvalidStatus as e:
+        result['rejected'] = True
+        result['error'] = str(e)
+    except websockets.ConnectionClosed as e:
+        if e.rcvd is not None and e.rcvd.code == 1013:
+            result['rejected'] = True
+        else:
+            result['error'] = f"连接断开: {e}"
+    except (OSError, asyncio.TimeoutError) as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+
+async def run(url, recordings, clients, speed, targets, tts, ramp, timeout, stats_url=None):
+    before = await request_stats(stats_url or url)
+    started = time.perf_counter()
+
+    async def delayed(index):
+        await asyncio.sleep(ramp * index / max(1, clients))
+        return await run_client(url, recordings[index % len(recordings)], speed, targets, tts, timeout)
+
+    results = await asyncio.gather(*(delayed(index) for index in range(clients)))
+    elapsed = time.perf_counter() - started
+    after = await request_stats(stats_url or url)
+    return results, elapsed, before, after
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟多个客户端同时向翻译服务（translation_server.py）回放录音")
+    parser.add_argument("recordings", nargs="*", help="WAV文件或目录（16位单声道PCM）；不指定时发送静音，配合 --speech fake")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--stats-url", help="查询服务端统计的地址（默认与 --url 相同；supervisor.py 的汇总统计在 port+1）")
+    parser.add_argument("-c", "--clients", type=int, default=8, help="同时连接的客户端数")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放速度（1为实时）")
+    parser.add_argument("--ramp", type=float, default=1.0, help="在多少秒内陆续建立所有连接")
+    parser.add_argument("--targets", default="en", help="目标语言，逗号分隔")
+    parser.add_argument("--tts", action="store_true", help="同时请求朗读的音频")
+    parser.add_argument("--timeout", type=float, default=30, help="多久没有收到消息就放弃这个会话（秒）")
+    parser.add_argument("-o", "--output", help="结果JSON文件（默认 benchmark_results/load-<时间>.json）")
+    args = parser.parse_args()
+
+    if websockets is None:
+        print("错误：压力测试需要安装 websockets（pip install websockets）")
+        return
+
+    recordings = load_recordings(args.recordings) if args.recordings else []
+    if not recordings:
+        if args.recordings:
+            print("没有可以回放的录音")
+            return
+        recordings = [Recording("silence", 16000, bytes(int(16000 * DEFAULT_SILENCE_SECONDS) * 2))]
+    targets = [language.strip() for language in args.targets.split(",") if language.strip()]
+
+    print(f"====== {args.clients} 个客户端，{len(recordings)} 段录音，{args.speed:g} 倍速 ======")
+    results, elapsed, before, after = asyncio.run(
+        run(args.url, recordings, args.clients, args.speed, targets, args.tts, args.ramp, args.timeout, args.stats_url))
+
+    completed = [result for result in results if not result['rejected'] and not result['error']]
+    rejected = sum(1 for result in results if result['rejected'])
+    failed = [result for result in results if result['error'] and not result['rejected']]
+    latencies = sorted(latency for result in results for latency in result['latencies'])
+    cpu = after['cpu_seconds'] - before['cpu_seconds']
+    wall = after['wall_seconds'] - before['wall_seconds']
+    cores = cpu / wall if wall > 0 else 0.0
+    summary = {
+        'clients': args.clients,
+        'completed': len(completed),
+        'rejected': rejected,
+        'failed': len(failed),
+        'seconds': elapsed,
+        'utterances': sum(result['utterances'] for result in results),
+        'translations': len(latencies),
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'server_cpu_cores': cores,
+        # 服务端每占用一个CPU核可以支持的同时会话数
+        'sessions_per_core': (args.clients - rejected) / cores if cores > 0 else None,
+    }
+
+    print(f"完成 {summary['completed']} 个会话  拒绝 {rejected} 个  失败 {len(failed)} 个  用时 {elapsed:.1f} s")
+    print(f"识别 {summary['utterances']} 句  翻译 {summary['translations']} 句")
+    print(f"说完到收到译文: p50 {summary['p50_ms']:.0f} ms  p95 {summary['p95_ms']:.0f} ms  p99 {summary['p99_ms']:.0f} ms")
+    if summary['sessions_per_core'] is not None:
+        print(f"服务端CPU占用 {cores:.2f} 核，每核 {summary['sessions_per_core']:.1f} 个会话")
+    for result in failed[:5]:
+        print(f"  {result['recording']}: {result['error']}")
+
+    output = args.output or os.path.join("benchmark_results", "load-" + datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({'created': datetime.now().isoformat(timespec="seconds"), 'config': vars(args), 'summary': summary,
+                   'results': [{key: value for key, value in result.items() if key != 'latencies'} for result in results]},
+                  f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {output}")
+
+if __name__ == "__main__":
+    main()
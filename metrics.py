@@ -0,0 +1,326 @@
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+from governor import all_governors
+from endpoint_selector import all_selectors
+from phrasebook import get_phrasebook
+from single_flight import all_single_flights
+
+# 每句话记录的时间点，按发生顺序排列
+MARKS = ("speech_end", "recognized", "translation_sent", "translation_received", "tts_first_audio", "playback_done")
+# 由时间点计算出的各阶段耗时：阶段名 -> (开始的时间点, 结束的时间点)
+STAGES = {
+    'recognition': ("speech_end", "recognized"),
+    'queue': ("recognized", "translation_sent"),
+    'translation': ("translation_sent", "translation_received"),
+    'tts_first_audio': ("translation_received", "tts_first_audio"),
+    'playback': ("tts_first_audio", "playback_done"),
+}
+STAGE_NAMES = {
+    'recognition': "识别",
+    'queue': "排队",
+    'translation': "翻译",
+    'tts_first_audio': "首段音频",
+    'playback': "播放",
+    'end_to_end': "端到端",
+}
+# 直方图的桶（秒）
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0)
+DEFAULT_LOG_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_LOG_BACKUPS = 5
+TICKS_PER_SECOND = 10_000_000
+
+
+class UtteranceTiming:
+    """一句话从说完到朗读结束的各个时间点（time.perf_counter）"""
+
+    def __init__(self, text):
+        self.text = text
+        self.created = time.time()
+        # 这句话结束的位置相对于音频开始的偏移和这句话的时长（秒），来自识别结果的 offset 和 duration
+        self.speech_end_offset = None
+        self.speech_duration = None
+        self.marks = {}
+
+    def mark(self, name, when=None):
+        self.marks[name] = time.perf_counter() if when is None else when
+
+    def mark_speech(self, started, speak_result):
+        """根据 StreamingSpeaker.speak 的结果记录首段音频和播放完成的时间"""
+        if speak_result.time_to_first_audio is not None:
+            self.mark("tts_first_audio", started + speak_result.time_to_first_audio)
+        self.mark("playback_done")
+
+    def stages(self):
+        """返回已经记录到的各阶段耗时（秒）"""
+        durations = {}
+        for stage, (start, end) in STAGES.items():
+            if start in self.marks and end in self.marks:
+                durations[stage] = max(0.0, self.marks[end] - self.marks[start])
+        # 端到端：从说完到听到第一段语音（没有朗读时到译文返回）
+        begin = self.marks.get("speech_end", self.marks.get("recognized"))
+        end = self.marks.get("tts_first_audio", self.marks.get("translation_received"))
+        if begin is not None and end is not None:
+            durations['end_to_end'] = max(0.0, end - begin)
+        return durations
+
+    def to_dict(self):
+        origin = self.marks.get("speech_end", self.marks.get("recognized"))
+        return {
+            'time': self.created,
+            'text': self.text,
+            'speech_end_offset': self.speech_end_offset,
+            # 各时间点相对于说完的时间（毫秒）
+            'marks_ms': {name: round((self.marks[name] - origin) * 1000, 1) for name in MARKS if name in self.marks},
+            'stages_ms': {stage: round(value * 1000, 1) for stage, value in self.stages().items()},
+        }
+
+
+class Histogram:
+    """累积直方图（Prometheus 的 histogram 格式）"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """按桶估计分位数（返回所在桶的上界）"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        for bound, count in zip(self.buckets, self.counts):
+            if count >= target:
+                return bound
+        return self.max
+
+
+# 各模块的 render_prometheus() 只返回样本行，由 render_families 按指标族分组，每族只写一次 HELP/TYPE
+PROMETHEUS_FAMILIES = [
+    ("voice_translator_requests_total", "counter", "Calls to each service."),
+    ("voice_translator_retries_total", "counter", "Retries of failed or throttled calls to each service."),
+    ("voice_translator_throttled_total", "counter", "Calls throttled (HTTP 429) by each service."),
+    ("voice_translator_failures_total", "counter", "Calls to each service that failed after all retries."),
+    ("voice_translator_circuit_rejected_total", "counter", "Calls rejected while the circuit breaker was open."),
+    ("voice_translator_circuit_open", "gauge", "Whether the circuit breaker of each service is open (1) or not (0)."),
+    ("voice_translator_queued_seconds_total", "counter", "Time spent waiting for the rate limit quota of each service."),
+    ("voice_translator_hedged_requests_total", "counter", "Hedged requests sent to a second endpoint."),
+    ("voice_translator_failovers_total", "counter", "Requests resent to the next endpoint after a retryable error."),
+    ("voice_translator_endpoint_rtt_seconds", "gauge", "Probed round-trip time of each candidate endpoint."),
+    ("voice_translator_endpoint_healthy", "gauge", "Whether each candidate endpoint is healthy (1) or not (0)."),
+    ("voice_translator_coalesced_calls_total", "counter", "Calls that waited for an identical call already in flight."),
+    ("voice_translator_phrasebook_total", "counter", "Utterances answered, dropped or protected by the local phrasebook."),
+]
+
+
+def render_families(samples):
+    """把样本行按指标族分组（多个服务的同一指标放在一起），每族前面写一次 HELP/TYPE"""
+    groups = {}
+    for line in samples:
+        groups.setdefault(line.split("{", 1)[0].split(" ", 1)[0], []).append(line)
+    lines = []
+    for name, kind, help_text in PROMETHEUS_FAMILIES:
+        family = groups.pop(name, None)
+        if family:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(family)
+    # 没有登记的指标族不写 TYPE（untyped），但仍然放在一起
+    for family in groups.values():
+        lines.extend(family)
+    return lines
+
+
+class UtteranceMetrics:
+    """收集每句话的阶段耗时，汇总成直方图，可选写入滚动的JSONL文件和提供Prometheus文本格式的HTTP接口
+
+    识别模块收到结果时调用 recognized()，应用代码取到识别文本后用 begin() 拿到
+    这句话的 UtteranceTiming，翻译和朗读时 mark() 各时间点，处理完调用 finish()。
+    """
+
+    def __init__(self, log_path=None, log_max_bytes=DEFAULT_LOG_MAX_BYTES, log_backups=DEFAULT_LOG_BACKUPS,
+                 buckets=DEFAULT_BUCKETS):
+        self.lock = threading.Lock()
+        self.histograms = {stage: Histogram(buckets) for stage in STAGE_NAMES}
+        self.utterances = 0
+        # 已经识别、还没有被 begin() 取走的记录
+        self.pending = deque(maxlen=64)
+        self.server = None
+
+        self.log = None
+        if log_path:
+            self.log = logging.getLogger(f"utterance-metrics.{id(self)}")
+            self.log.propagate = False
+            self.log.setLevel(logging.INFO)
+            handler = logging.handlers.RotatingFileHandler(log_path, maxBytes=log_max_bytes, backupCount=log_backups,
+                                                           encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.log.addHandler(handler)
+
+    def recognized(self, result, audio_clock):
+        """收到一条识别结果时调用（在SDK回调线程中）
+
+        audio_clock(offset) 把识别结果中的音频偏移（秒）换算成说话时的 perf_counter 时间，
+        由麦克风输入的 clock() 在开始识别时得到（语音活动检测丢掉的静音不在 offset 中）。
+        """
+        timing = UtteranceTiming(result.text)
+        timing.mark("recognized")
+        if result.offset is not None and result.duration is not None:
+            timing.speech_end_offset = (result.offset + result.duration) / TICKS_PER_SECOND
+            timing.speech_duration = result.duration / TICKS_PER_SECOND
+            speech_end = audio_clock(timing.speech_end_offset) if audio_clock is not None else None
+            if speech_end is not None:
+                timing.mark("speech_end", min(speech_end, timing.marks["recognized"]))
+        with self.lock:
+            self.pending.append(timing)
+        return timing
+
+    def begin(self, text):
+        """取出这段识别文本的计时记录；识别模块没有记录时从现在开始计时"""
+        with self.lock:
+            for timing in self.pending:
+                if timing.text == text:
+                    self.pending.remove(timing)
+                    return timing
+        timing = UtteranceTiming(text)
+        timing.mark("recognized")
+        return timing
+
+    def finish(self, timing):
+        """一句话处理完毕，把各阶段耗时计入直方图并写入日志"""
+        stages = timing.stages()
+        with self.lock:
+            self.utterances += 1
+            for stage, value in stages.items():
+                self.histograms[stage].observe(value)
+        if self.log is not None:
+            self.log.info(json.dumps(timing.to_dict(), ensure_ascii=False))
+
+    def render_prometheus(self):
+        """Prometheus 文本格式的指标"""
+        lines = [
+            "# HELP voice_translator_stage_seconds Per-utterance latency of each stage.",
+            "# TYPE voice_translator_stage_seconds histogram",
+        ]
+        with self.lock:
+            for stage, histogram in self.histograms.items():
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'voice_translator_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'voice_translator_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'voice_translator_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'voice_translator_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+            lines.append("# HELP voice_translator_utterances_total Utterances processed.")
+            lines.append("# TYPE voice_translator_utterances_total counter")
+            lines.append(f"voice_translator_utterances_total {self.utterances}")
+        # 翻译和语音服务的调用、限流、熔断和配额排队，多个区域/端点时的对冲、故障切换和探测延迟，
+        # 与进行中的相同调用合并的次数，本地短语表省去的翻译请求
+        samples = []
+        for governor in all_governors():
+            samples.extend(governor.render_prometheus())
+        for selector in all_selectors():
+            samples.extend(selector.render_prometheus())
+        for flight in all_single_flights():
+            samples.extend(flight.render_prometheus())
+        phrasebook = get_phrasebook()
+        if phrasebook is not None:
+            samples.extend(phrasebook.render_prometheus())
+        lines.extend(render_families(samples))
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """在后台线程中提供 http://host:port/metrics"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                data = metrics.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+
+    def report(self):
+        with self.lock:
+            lines = [f"阶段耗时: {self.utterances} 句"]
+            for stage, histogram in self.histograms.items():
+                if not histogram.count:
+                    continue
+                lines.append(
+                    f"  {STAGE_NAMES[stage]}: 平均 {histogram.sum / histogram.count * 1000:.0f} ms  "
+                    f"p95 ≤ {histogram.quantile(0.95) * 1000:.0f} ms  最长 {histogram.max * 1000:.0f} ms"
+                )
+        for governor in all_governors():
+            lines.append(governor.report())
+        for selector in all_selectors():
+            lines.append(selector.report())
+        for flight in all_single_flights():
+            lines.append(flight.report())
+        phrasebook = get_phrasebook()
+        if phrasebook is not None:
+            lines.append(phrasebook.report())
+        return "\n".join(lines)
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.log is not None:
+            for handler in list(self.log.handlers):
+                handler.close()
+                self.log.removeHandler(handler)
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """返回进程内共享的计时统计
+
+    在.env中设置 METRICS_PORT 时启动本地的 /metrics 接口，设置 METRICS_LOG 时把每句话的记录写入滚动的JSONL文件。
+    """
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            load_dotenv()
+            _metrics = UtteranceMetrics(
+                log_path=os.environ.get('METRICS_LOG') or None,
+                log_max_bytes=int(float(os.environ.get('METRICS_LOG_MAX_MB', DEFAULT_LOG_MAX_BYTES / 1024 / 1024)) * 1024 * 1024),
+                log_backups=int(os.environ.get('METRICS_LOG_BACKUPS', DEFAULT_LOG_BACKUPS)),
+            )
+            port = int(os.environ.get('METRICS_PORT', 0) or 0)
+            if port:
+                try:
+                    _metrics.serve(port)
+                    print(f"指标接口: http://127.0.0.1:{port}/metrics")
+                except OSError as e:
+                    print(f"启动指标接口失败: {e}")
+        return _metrics
@@ -0,0 +1,220 @@
+import json
+import os
+import threading
+from dotenv import load_dotenv
+
+# 整句匹配和判断语气词时忽略的标点和空白
+PUNCTUATION = " \t\r\n　。，、！？；：…,.!?;:~～·\"'“”‘’（）()《》【】「」-—"
+_STRIP_TABLE = str.maketrans("", "", PUNCTUATION)
+
+
+def normalize(text):
+    """去掉首尾的标点和空白并转成小写，用于整句匹配"""
+    return text.strip(PUNCTUATION).lower()
+
+
+def _is_word_char(char):
+    return char.isascii() and char.isalnum()
+
+
+class AhoCorasick:
+    """多模式匹配自动机：扫描一遍文本就能找出所有关键词出现的位置"""
+
+    def __init__(self, words):
+        self.goto = [{}]
+        self.fail = [0]
+        # 每个状态结束的关键词长度（包括通过失败链接到达的后缀）
+        self.lengths = [()]
+        for word in words:
+            if word:
+                self._add(word)
+        self._build()
+
+    def _add(self, word):
+        state = 0
+        for char in word:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.lengths.append(())
+            state = next_state
+        self.lengths[state] = (len(word),)
+
+    def _build(self):
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                self.lengths[next_state] = self.lengths[next_state] + self.lengths[self.fail[next_state]]
+
+    def find_all(self, text):
+        """返回所有匹配的 (开始, 结束) 位置，可能互相重叠"""
+        matches = []
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for length in self.lengths[state]:
+                matches.append((index + 1 - length, index + 1))
+        return matches
+
+    def find(self, text):
+        """返回互不重叠的匹配，同一位置优先选择最长的关键词"""
+        selected = []
+        end = 0
+        for start, stop in sorted(self.find_all(text), key=lambda match: (match[0], -match[1])):
+            if start >= end:
+                selected.append((start, stop))
+                end = stop
+        return selected
+
+
+class Phrasebook:
+    """用户提供的短语表和术语表，在调用翻译服务之前处理
+
+    phrases 为 {原文: {目标语言: 译文}}，整句（忽略首尾标点、不区分大小写）匹配时直接返回译文，
+    不发送翻译请求。fillers 为语气词列表（“嗯”“啊”“那个”），一句话去掉标点后只由语气词组成时
+    丢弃，不翻译也不朗读。glossary 为 {术语: 译文 或 {目标语言: 译文}}，句子中出现的术语用翻译服务的
+    动态词典标记（<mstrans:dictionary>）包起来，保证译法一致。只处理源语言为 source 的文本。
+    """
+
+    def __init__(self, phrases=None, glossary=None, fillers=None, source="zh-Hans"):
+        self.source = source
+        self.phrases = {normalize(text): translations for text, translations in (phrases or {}).items()
+                        if normalize(text)}
+        self.glossary = {term.lower(): translation for term, translation in (glossary or {}).items() if term}
+        self.glossary_matcher = AhoCorasick(self.glossary)
+        self.filler_matcher = AhoCorasick(filler.lower() for filler in (fillers or []))
+        self.has_fillers = bool(fillers)
+        self.lock = threading.Lock()
+
+        # 统计信息
+        self.phrase_hits = 0
+        self.fillers_dropped = 0
+        self.protected = 0
+        self.terms_protected = 0
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get('phrases'), data.get('glossary'), data.get('fillers'), data.get('source', "zh-Hans"))
+
+    def lookup(self, text, source_language, target_languages):
+        """整句命中短语表且每个目标语言都有译文时返回 {目标语言: 译文}，否则返回None"""
+        if source_language != self.source:
+            return None
+        translations = self.phrases.get(normalize(text))
+        if translations is None or any(language not in translations for language in target_languages):
+            return None
+        with self.lock:
+            self.phrase_hits += 1
+        return {language: translations[language] for language in target_languages}
+
+    def is_filler(self, text):
+        """这句话去掉标点后是否只由语气词组成（是的话计入丢弃的句数）"""
+        if not self.has_fillers:
+            return False
+        stripped = text.translate(_STRIP_TABLE).lower()
+        # reachable[i] 表示前 i 个字可以完全由语气词拼出
+        reachable = [True] + [False] * len(stripped)
+        for start, end in sorted(self.filler_matcher.find_all(stripped)):
+            if reachable[start]:
+                reachable[end] = True
+        if not reachable[-1]:
+            return False
+        with self.lock:
+            self.fillers_dropped += 1
+        return True
+
+    def protect(self, text, source_language, target_language):
+        """用动态词典标记包起句子中的术语，返回要发送给翻译服务的文本"""
+        if source_language != self.source or not self.glossary:
+            return text
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            lowered = text
+        parts = []
+        position = 0
+        for start, end in self.glossary_matcher.find(lowered):
+            # 英文术语不能是更长单词的一部分
+            if (start > 0 and _is_word_char(text[start]) and _is_word_char(text[start - 1])) or \
+                    (end < len(text) and _is_word_char(text[end - 1]) and _is_word_char(text[end])):
+                continue
+            translation = self.glossary[lowered[start:end]]
+            if isinstance(translation, dict):
+                translation = translation.get(target_language)
+            if not translation:
+                continue
+            parts.append(text[position:start])
+            parts.append('<mstrans:dictionary translation="{}">{}</mstrans:dictionary>'.format(
+                translation.replace('"', "'"), text[start:end]))
+            position = end
+        if not parts:
+            return text
+        parts.append(text[position:])
+        with self.lock:
+            self.protected += 1
+            self.terms_protected += len(parts) // 2
+        return "".join(parts)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'phrases': len(self.phrases),
+                'glossary': len(self.glossary),
+                'phrase_hits': self.phrase_hits,
+                'fillers_dropped': self.fillers_dropped,
+                'protected': self.protected,
+                'terms_protected': self.terms_protected,
+                # 整句命中和丢弃的语气词都省去了一次翻译请求，丢弃的语气词还省去了朗读
+                'calls_saved': self.phrase_hits + self.fillers_dropped,
+            }
+
+    def render_prometheus(self):
+        """Prometheus 文本格式的计数（不含 HELP/TYPE 行）"""
+        s = self.stats()
+        return [
+            f'voice_translator_phrasebook_total{{result="phrase_hit"}} {s["phrase_hits"]}',
+            f'voice_translator_phrasebook_total{{result="filler_dropped"}} {s["fillers_dropped"]}',
+            f'voice_translator_phrasebook_total{{result="protected"}} {s["protected"]}',
+        ]
+
+    def report(self):
+        s = self.stats()
+        return (
+            f"短语表: 整句命中 {s['phrase_hits']} 句  丢弃语气词 {s['fillers_dropped']} 句  "
+            f"术语保护 {s['protected']} 次/{s['terms_protected']} 处  节省翻译请求 {s['calls_saved']} 次"
+        )
+
+
+_phrasebook = None
+_phrasebook_checked = False
+_phrasebook_lock = threading.Lock()
+
+
+def get_phrasebook():
+    """返回进程内共享的短语表（.env 中的 PHRASEBOOK 为JSON文件路径）；没有配置或读取失败时返回None"""
+    global _phrasebook, _phrasebook_checked
+    with _phrasebook_lock:
+        if not _phrasebook_checked:
+            _phrasebook_checked = True
+            load_dotenv()
+            path = os.environ.get('PHRASEBOOK', '').strip()
+            if not path:
+                return None
+            try:
+                _phrasebook = Phrasebook.load(path)
+            except (OSError, ValueError) as e:
+                print(f"读取短语表 {path} 失败: {e}")
+                return None
+        return _phrasebook
@@ -0,0 +1,199 @@
+import queue
+import threading
+import time
+
+# 队列中用于通知工作线程退出的标记
+_STOP = object()
+
+
+class StageStats:
+    """单个流水线阶段的统计信息（线程安全）"""
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_busy = 0.0
+        self.max_depth = 0
+
+    def record(self, wait, busy):
+        with self.lock:
+            self.processed += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.total_busy += busy
+
+    def record_depth(self, depth):
+        with self.lock:
+            self.max_depth = max(self.max_depth, depth)
+
+    def record_drop(self):
+        with self.lock:
+            self.dropped += 1
+
+    def record_error(self):
+        with self.lock:
+            self.errors += 1
+
+    def snapshot(self):
+        with self.lock:
+            count = self.processed
+            return {
+                'name': self.name,
+                'processed': count,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'avg_wait': self.total_wait / count if count else 0.0,
+                'max_wait': self.max_wait,
+                'avg_busy': self.total_busy / count if count else 0.0,
+                'max_depth': self.max_depth,
+            }
+
+
+class PipelineStage:
+    """流水线中的一个阶段：在独立线程中从输入队列取任务，处理后放入下一个队列"""
+
+    def __init__(self, name, handler, input_queue, output_queue=None, next_stats=None):
+        self.name = name
+        self.handler = handler
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.next_stats = next_stats
+        self.stats = StageStats(name)
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name=f"stage-{self.name}", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.input_queue.get()
+            if item is _STOP:
+                # 把退出标记继续传给下游阶段
+                if self.output_queue is not None:
+                    self.output_queue.put(_STOP)
+                break
+
+            enqueued_at, payload = item
+            started = time.perf_counter()
+            try:
+                result = self.handler(payload)
+            except Exception as e:
+                print(f"[{self.name}] 处理时发生错误: {e}")
+                self.stats.record_error()
+                result = None
+            finished = time.perf_counter()
+            self.stats.record(started - enqueued_at, finished - started)
+
+            if self.output_queue is not None and result is not None:
+                # 下游阶段满了就在这里等待（背压），不会影响识别阶段
+                self.output_queue.put((time.perf_counter(), result))
+                if self.next_stats is not None:
+                    self.next_stats.record_depth(self.output_queue.qsize())
+
+
+class Pipeline:
+    """识别 → 翻译 → 朗读 的分阶段流水线，各阶段之间用有界队列连接
+
+    识别结果通过 submit() 进入第一个队列。第一个队列已满时丢弃最旧的任务，
+    这样识别线程永远不会阻塞，麦克风始终处于监听状态。
+    """
+
+    def __init__(self, queue_size=8):
+        self.queue_size = queue_size
+        self.stages = []
+        self.sources = []
+        self.source_stats = []
+        self.running = threading.Event()
+
+    def add_stage(self, name, handler):
+        """添加一个处理阶段，handler 返回 None 表示不再向下游传递"""
+        input_queue = queue.Queue(maxsize=self.queue_size)
+        stage = PipelineStage(name, handler, input_queue)
+        if self.stages:
+            previous = self.stages[-1]
+            previous.output_queue = input_queue
+            previous.next_stats = stage.stats
+        self.stages.append(stage)
+        return stage
+
+    def add_source(self, name, producer):
+        """添加一个源阶段（例如语音识别），producer 每次调用返回一个结果或 None"""
+        stats = StageStats(name)
+        self.source_stats.append(stats)
+        self.sources.append((name, producer, stats))
+
+    def _run_source(self, producer, stats):
+        while self.running.is_set():
+            started = time.perf_counter()
+            try:
+                result = producer()
+            except Exception as e:
+                print(f"[{stats.name}] 发生错误: {e}")
+                stats.record_error()
+                time.sleep(2)
+                continue
+            stats.record(0.0, time.perf_counter() - started)
+            if result is not None:
+                self.submit(result)
+
+    def submit(self, payload):
+        """把一个任务放入第一个阶段的队列，不会阻塞调用者"""
+        if not self.stages:
+            return
+        first = self.stages[0]
+        item = (time.perf_counter(), payload)
+        while True:
+            try:
+                first.input_queue.put_nowait(item)
+                break
+            except queue.Full:
+                # 队列已满：丢弃最旧的任务，保证最新的语音能被处理
+                try:
+                    first.input_queue.get_nowait()
+                    first.stats.record_drop()
+                except queue.Empty:
+                    pass
+        first.stats.record_depth(first.input_queue.qsize())
+
+    def start(self):
+        self.running.set()
+        for stage in self.stages:
+            stage.start()
+        for name, producer, stats in self.sources:
+            thread = threading.Thread(target=self._run_source, args=(producer, stats), name=f"source-{name}", daemon=True)
+            thread.start()
+
+    def stop(self, timeout=5.0):
+        """停止源阶段，并让已排队的任务处理完毕"""
+        self.running.clear()
+        if not self.stages:
+            return
+        self.stages[0].input_queue.put(_STOP)
+        deadline = time.perf_counter() + timeout
+        for stage in self.stages:
+            stage.thread.join(max(0.0, deadline - time.perf_counter()))
+
+    def queue_depths(self):
+        return {stage.name: stage.input_queue.qsize() for stage in self.stages}
+
+    def report(self):
+        """返回各阶段队列深度和等待时间的文字报告"""
+        lines = ["------ 流水线统计 ------"]
+        for stats in self.source_stats:
+            s = stats.snapshot()
+            lines.append(f"[{s['name']}] 次数: {s['processed']}  平均耗时: {s['avg_busy'] * 1000:.0f} ms  错误: {s['errors']}")
+        depths = self.queue_depths()
+        for stage in self.stages:
+            s = stage.stats.snapshot()
+            lines.append(
+                f"[{s['name']}] 处理: {s['processed']}  队列深度: {depths[s['name']]} (最大 {s['max_depth']})  "
+                f"平均等待: {s['avg_wait'] * 1000:.0f} ms (最大 {s['max_wait'] * 1000:.0f} ms)  "
+                f"平均耗时: {s['avg_busy'] * 1000:.0f} ms  丢弃: {s['dropped']}  错误: {s['errors']}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,254 @@
+import os
+import threading
+import time
+import azure.cognitiveservices.speech as speechsdk
+from governor import get_governor
+from phrasebook import get_phrasebook
+
+# 识别模式：continuous 为事件驱动的连续识别，once 为原来的单次识别轮询
+RECOGNITION_MODE_CONTINUOUS = "continuous"
+RECOGNITION_MODE_ONCE = "once"
+
+
+def get_recognition_mode():
+    """从环境变量 RECOGNITION_MODE 读取识别模式，默认使用连续识别"""
+    mode = os.environ.get('RECOGNITION_MODE', RECOGNITION_MODE_CONTINUOUS).strip().lower()
+    if mode not in (RECOGNITION_MODE_CONTINUOUS, RECOGNITION_MODE_ONCE):
+        print(f"未知的识别模式: {mode}，使用连续识别")
+        mode = RECOGNITION_MODE_CONTINUOUS
+    return mode
+
+
+def handle_result(result, on_recognized, on_no_match=None, on_canceled=None, drop_fillers=False, on_dropped=None):
+    """根据识别结果的类型分发给对应的回调函数
+
+    drop_fillers 为 True 时（翻译程序），只有语气词的句子（见 phrasebook.py）直接丢弃，不翻译也不朗读，
+    并调用 on_dropped(文本)（例如清除这句话的中间结果）；只做识别的程序保留原样的识别结果。
+    """
+    if result.reason == speechsdk.ResultReason.RecognizedSpeech:
+        phrasebook = get_phrasebook() if drop_fillers else None
+        if phrasebook is not None and phrasebook.is_filler(result.text):
+            if on_dropped:
+                on_dropped(result.text)
+            return
+        on_recognized(result.text)
+    elif result.reason == speechsdk.ResultReason.NoMatch:
+        if on_no_match:
+            on_no_match()
+    elif result.reason == speechsdk.ResultReason.Canceled:
+        if on_canceled:
+            on_canceled(speechsdk.CancellationDetails(result))
+
+
+class RecognitionStats:
+    """记录两次识别之间的间隔、麦克风未监听的时间、未识别到语音的次数以及进程CPU占用，用于比较两种识别模式"""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.started_wall = time.perf_counter()
+        self.started_cpu = time.process_time()
+        self.utterances = 0
+        self.no_matches = 0
+        self.last_utterance = None
+        self.total_interval = 0.0
+        self.min_interval = None
+        self.max_interval = 0.0
+        self.deaf_time = 0.0
+        self.deaf_gaps = 0
+        self.last_listen_end = None
+
+    def record_utterance(self):
+        """每得到一条识别结果时调用"""
+        now = time.perf_counter()
+        with self.lock:
+            if self.last_utterance is not None:
+                interval = now - self.last_utterance
+                self.total_interval += interval
+                self.max_interval = max(self.max_interval, interval)
+                if self.min_interval is None or interval < self.min_interval:
+                    self.min_interval = interval
+            self.last_utterance = now
+            self.utterances += 1
+
+    def record_no_match(self):
+        """每得到一条 NoMatch 结果（上传了音频但没有识别出文字）时调用"""
+        with self.lock:
+            self.no_matches += 1
+
+    def listen_started(self):
+        """轮询模式下每次开始 recognize_once 时调用，记录上一次结束以来麦克风未监听的时间"""
+        now = time.perf_counter()
+        with self.lock:
+            if self.last_listen_end is not None:
+                self.deaf_time += now - self.last_listen_end
+                self.deaf_gaps += 1
+
+    def listen_finished(self):
+        with self.lock:
+            self.last_listen_end = time.perf_counter()
+
+    def report(self):
+        with self.lock:
+            wall = time.perf_counter() - self.started_wall
+            cpu = time.process_time() - self.started_cpu
+            intervals = self.utterances - 1
+            avg_interval = self.total_interval / intervals if intervals > 0 else 0.0
+            avg_deaf = self.deaf_time / self.deaf_gaps if self.deaf_gaps else 0.0
+            results = self.utterances + self.no_matches
+            no_match_rate = self.no_matches / results * 100 if results else 0.0
+            return (
+                f"识别模式: {self.mode}  运行时间: {wall:.1f} s  识别次数: {self.utterances}\n"
+                f"未识别到语音: {self.no_matches} 次 ({no_match_rate:.1f}%)\n"
+                f"识别间隔: 平均 {avg_interval:.2f} s  最短 {(self.min_interval or 0.0):.2f} s  最长 {self.max_interval:.2f} s\n"
+                f"麦克风未监听时间: 共 {self.deaf_time:.2f} s  平均每次 {avg_deaf * 1000:.0f} ms\n"
+                f"进程CPU占用: {cpu / wall * 100 if wall > 0 else 0.0:.1f}%"
+            )
+
+
+def is_error(result):
+    """识别结果是否因为错误（网络、鉴权、配额等）被取消"""
+    return (result.reason == speechsdk.ResultReason.Canceled
+            and speechsdk.CancellationDetails(result).reason == speechsdk.CancellationReason.Error)
+
+
+def audio_clock(audio_input=None):
+    """开始识别时调用，返回把识别结果的 offset（秒）换算成说话时间的函数
+
+    传入麦克风输入（vad_gate.create_audio_input 的返回值）时由它换算，语音活动检测丢掉的
+    静音不在 offset 中；否则 offset 就是从现在开始的时间。
+    """
+    if audio_input is not None:
+        return audio_input.clock()
+    started = time.perf_counter()
+    return lambda offset: started + offset
+
+
+def recognize_once(speech_recognizer, stats=None, metrics=None, audio_input=None):
+    """单次识别（轮询模式），同时记录麦克风未监听的时间；传入 metrics 时记录这句话的识别时间
+
+    上一次识别出错后，会按退避时间等待再开始，服务连续出错时等到熔断结束（见 governor.py）。
+    """
+    governor = get_governor("speech")
+    governor.acquire(wait_open=True)
+    if stats:
+        stats.listen_started()
+    clock = audio_clock(audio_input)
+    try:
+        result = speech_recognizer.recognize_once()
+    finally:
+        if stats:
+            stats.listen_finished()
+    if result.reason == speechsdk.ResultReason.RecognizedSpeech:
+        if stats:
+            stats.record_utterance()
+        if metrics:
+            metrics.recognized(result, clock)
+    elif result.reason == speechsdk.ResultReason.NoMatch and stats:
+        stats.record_no_match()
+    if is_error(result):
+        governor.record_failure()
+    else:
+        governor.record_success()
+    return result
+
+
+class ContinuousRecognition:
+    """基于 start_continuous_recognition_async 的事件驱动连续识别
+
+    recognized 事件中的结果按类型分发给 on_recognized / on_no_match，
+    canceled 事件交给 on_canceled。如果会话因为错误意外结束，会按退避时间（连续出错时
+    等到熔断结束）自动重新开始识别。传入 metrics（UtteranceMetrics）时记录每句话的识别时间，
+    audio_input 为识别器使用的麦克风输入，用来把结果的 offset 换算成说话的时间；drop_fillers 和 on_dropped 同 handle_result。
+    """
+
+    def __init__(self, speech_recognizer, on_recognized, on_no_match=None, on_canceled=None, stats=None, metrics=None,
+                 governor=None, audio_input=None, drop_fillers=False, on_dropped=None):
+        self.speech_recognizer = speech_recognizer
+        self.on_recognized = on_recognized
+        self.on_no_match = on_no_match
+        self.on_canceled = on_canceled
+        self.stats = stats
+        self.metrics = metrics
+        self.governor = governor if governor is not None else get_governor("speech")
+        self.audio_input = audio_input
+        self.drop_fillers = drop_fillers
+        self.on_dropped = on_dropped
+        # 识别会话开始时得到，把识别结果的 offset 换算成说话的时间
+        self.audio_clock = None
+        self.running = False
+        self.stopped = threading.Event()
+        self.stopped.set()
+        self.lock = threading.Lock()
+
+        speech_recognizer.recognized.connect(self._on_recognized)
+        speech_recognizer.canceled.connect(self._on_canceled)
+        speech_recognizer.session_stopped.connect(self._on_session_stopped)
+
+    def _on_recognized(self, evt):
+        if not self.running:
+            return
+        if evt.result.reason == speechsdk.ResultReason.RecognizedSpeech:
+            self.governor.record_success()
+            if self.stats:
+                self.stats.record_utterance()
+            if self.metrics:
+                self.metrics.recognized(evt.result, self.audio_clock)
+        elif evt.result.reason == speechsdk.ResultReason.NoMatch and self.stats:
+            self.stats.record_no_match()
+        try:
+            handle_result(evt.result, self.on_recognized, self.on_no_match, drop_fillers=self.drop_fillers,
+                          on_dropped=self.on_dropped)
+        except Exception as e:
+            print(f"处理识别结果时发生错误: {e}")
+
+    def _on_canceled(self, evt):
+        if self.on_canceled and self.running:
+            self.on_canceled(evt.cancellation_details)
+
+    def _on_session_stopped(self, evt):
+        if self.running:
+            # 会话意外结束（例如网络错误），稍后在其他线程中重新开始，不能在SDK回调线程里直接调用
+            timer = threading.Timer(self.governor.record_failure(), self._restart)
+            timer.daemon = True
+            timer.start()
+        else:
+            self.stopped.set()
+
+    def _restart(self):
+        with self.lock:
+            if not self.running:
+                self.stopped.set()
+                return
+            try:
+                self.speech_recognizer.stop_continuous_recognition_async().get()
+                self.governor.acquire(wait_open=True)
+                self.audio_clock = audio_clock(self.audio_input)
+                self.speech_recognizer.start_continuous_recognition_async().get()
+            except Exception as e:
+                print(f"重新开始连续识别失败: {e}")
+                timer = threading.Timer(self.governor.record_failure(), self._restart)
+                timer.daemon = True
+                timer.start()
+
+    def start(self):
+        """开始连续识别（会阻塞到识别会话建立，GUI中应在后台线程调用）"""
+        with self.lock:
+            if self.running:
+                return
+            self.running = True
+            self.stopped.clear()
+            self.governor.acquire(wait_open=True)
+            self.audio_clock = audio_clock(self.audio_input)
+            self.speech_recognizer.start_continuous_recognition_async().get()
+
+    def stop(self):
+        """停止连续识别"""
+        with self.lock:
+            if not self.running:
+                return
+            self.running = False
+            try:
+                self.speech_recognizer.stop_continuous_recognition_async().get()
+            finally:
+                self.stopped.set()
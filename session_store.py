@@ -0,0 +1,293 @@
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+from srt import format_srt_time
+
+DEFAULT_SESSION_DB = "sessions.db"
+# 后台线程最多攒多少条、多久写一次磁盘
+FLUSH_INTERVAL = 1.0
+FLUSH_RECORDS = 100
+# 没有识别时长时，按每个字符这么多秒估计一句话的长度（用于SRT）
+SECONDS_PER_CHAR = 0.25
+
+# 关闭写入线程的标记
+_STOP = object()
+
+
+def _connect(db_path):
+    db = sqlite3.connect(db_path, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    return db
+
+
+def _create_schema(db):
+    """建表；返回是否可以使用FTS5全文索引（trigram分词可以按任意连续的三个字搜索中文）"""
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS sessions ("
+        " id INTEGER PRIMARY KEY, program TEXT NOT NULL, started REAL NOT NULL, ended REAL)"
+    )
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS utterances ("
+        " id INTEGER PRIMARY KEY, session_id INTEGER NOT NULL, created REAL NOT NULL, duration REAL,"
+        " source TEXT NOT NULL, translations TEXT, voice TEXT, latencies TEXT)"
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS idx_utterances_session ON utterances (session_id, id)")
+    fts = True
+    try:
+        db.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS utterances_fts USING fts5("
+            " source, translations, content='utterances', content_rowid='id', tokenize='trigram')"
+        )
+        # 记录只追加不修改，所以只需要插入触发器
+        db.execute(
+            "CREATE TRIGGER IF NOT EXISTS utterances_fts_insert AFTER INSERT ON utterances BEGIN"
+            " INSERT INTO utterances_fts (rowid, source, translations) VALUES (new.id, new.source, new.translations);"
+            " END"
+        )
+    except sqlite3.OperationalError:
+        # SQLite版本太旧（没有FTS5或trigram分词），搜索时退回到 LIKE
+        fts = False
+    db.commit()
+    return fts
+
+
+class Session:
+    """一次运行的会话，record() 把一句话交给后台线程写入"""
+
+    def __init__(self, store, session_id, started):
+        self.store = store
+        self.id = session_id
+        self.started = started
+
+    def record(self, source, translations=None, voice=None, timing=None):
+        """记录一句话：原文、{目标语言: 译文}、朗读用的语音和计时记录（UtteranceTiming）"""
+        created = time.time()
+        duration = None
+        latencies = None
+        if timing is not None:
+            created = timing.created
+            duration = timing.speech_duration
+            latencies = {stage: round(value * 1000, 1) for stage, value in timing.stages().items()}
+        self.store.queue.put((
+            self.id, created, duration, source,
+            json.dumps(translations, ensure_ascii=False, separators=(",", ":")) if translations else None,
+            voice,
+            json.dumps(latencies, separators=(",", ":")) if latencies else None,
+        ))
+
+    def end(self):
+        self.store.queue.put(("end", self.id, time.time()))
+
+
+class SessionStore:
+    """只追加的会话记录，保存在SQLite中并建立全文索引
+
+    每句话的记录放入队列，由后台线程每隔 FLUSH_INTERVAL 秒或攒够 FLUSH_RECORDS 条
+    在一个事务中写入，识别和翻译线程不会等待磁盘。search() 和 export() 使用单独的
+    只读连接，导出时逐行读取和写出，不会把整个会话读入内存。
+    """
+
+    def __init__(self, db_path=DEFAULT_SESSION_DB):
+        self.db_path = db_path
+        self.db = _connect(db_path)
+        self.fts = _create_schema(self.db)
+        self.queue = queue.Queue()
+        self.written = 0
+        self.thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+        self.thread.start()
+
+    def start_session(self, program):
+        started = time.time()
+        cursor = self.db.execute("INSERT INTO sessions (program, started) VALUES (?, ?)", (program, started))
+        self.db.commit()
+        return Session(self, cursor.lastrowid, started)
+
+    def _run(self):
+        writer = _connect(self.db_path)
+        running = True
+        while running:
+            batch = []
+            try:
+                batch.append(self.queue.get(timeout=FLUSH_INTERVAL))
+                deadline = time.monotonic() + FLUSH_INTERVAL
+                while len(batch) < FLUSH_RECORDS:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                pass
+            if _STOP in batch:
+                running = False
+            records = [item for item in batch if item is not _STOP]
+            if records:
+                self._write(writer, records)
+        writer.close()
+
+    def _write(self, writer, records):
+        try:
+            with writer:
+                for record in records:
+                    if record[0] == "end":
+                        writer.execute("UPDATE sessions SET ended = ? WHERE id = ?", (record[2], record[1]))
+                    else:
+                        writer.execute(
+                            "INSERT INTO utterances (session_id, created, duration, source, translations, voice, latencies)"
+                            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            record
+                        )
+                        self.written += 1
+        except sqlite3.Error as e:
+            print(f"写入会话记录失败: {e}")
+
+    def sessions(self, limit=50):
+        """最近的会话：[(编号, 程序, 开始时间, 结束时间, 句数), ...]"""
+        return self.db.execute(
+            "SELECT s.id, s.program, s.started, s.ended, COUNT(u.id) FROM sessions s"
+            " LEFT JOIN utterances u ON u.session_id = s.id"
+            " GROUP BY s.id ORDER BY s.id DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+
+    def search(self, keyword, limit=50):
+        """按关键词搜索所有会话的原文和译文，返回 [(会话编号, 时间, 原文, 译文JSON), ...]"""
+        if self.fts and len(keyword) >= 3:
+            # trigram 分词把查询当作子串匹配，加引号避免关键词中的符号被解析成查询语法
+            query = '"' + keyword.replace('"', '""') + '"'
+            cursor = self.db.execute(
+                "SELECT u.session_id, u.created, u.source, u.translations FROM utterances_fts f"
+                " JOIN utterances u ON u.id = f.rowid WHERE utterances_fts MATCH ? ORDER BY u.id DESC LIMIT ?",
+                (query, limit)
+            )
+        else:
+            pattern = "%" + keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            cursor = self.db.execute(
+                "SELECT session_id, created, source, translations FROM utterances"
+                " WHERE source LIKE ? ESCAPE '\\' OR translations LIKE ? ESCAPE '\\' ORDER BY id DESC LIMIT ?",
+                (pattern, pattern, limit)
+            )
+        return cursor.fetchall()
+
+    def iter_utterances(self, session_id):
+        """逐行读取一个会话的记录（生成器）"""
+        reader = _connect(self.db_path)
+        try:
+            row = reader.execute("SELECT started FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"会话 {session_id} 不存在")
+            started = row[0]
+            for created, duration, source, translations, voice, latencies in reader.execute(
+                "SELECT created, duration, source, translations, voice, latencies FROM utterances"
+                " WHERE session_id = ? ORDER BY id", (session_id,)
+            ):
+                yield {
+                    'time': created,
+                    'offset': max(0.0, created - started),
+                    'duration': duration,
+                    'source': source,
+                    'translations': json.loads(translations) if translations else {},
+                    'voice': voice,
+                    'latencies_ms': json.loads(latencies) if latencies else {},
+                }
+        finally:
+            reader.close()
+
+    def export(self, session_id, fmt, out):
+        """把一个会话导出为 srt / txt / jsonl，写入文本文件对象 out，返回导出的句数"""
+        count = 0
+        for count, item in enumerate(self.iter_utterances(session_id), 1):
+            if fmt == "jsonl":
+                out.write(json.dumps(item, ensure_ascii=False) + "\n")
+            elif fmt == "txt":
+                stamp = datetime.fromtimestamp(item['time']).strftime("%H:%M:%S")
+                out.write(f"[{stamp}] {item['source']}\n")
+                for language, translated_text in item['translations'].items():
+                    out.write(f"    ({language}) {translated_text}\n")
+            elif fmt == "srt":
+                # 记录时间是识别完成的时间，字幕从这句话开始说的时候显示
+                duration = item['duration'] or len(item['source']) * SECONDS_PER_CHAR
+                end = item['offset']
+                start = max(0.0, end - duration)
+                out.write(f"{count}\n{format_srt_time(start)} --> {format_srt_time(end)}\n{item['source']}\n")
+                for translated_text in item['translations'].values():
+                    out.write(translated_text + "\n")
+                out.write("\n")
+            else:
+                raise ValueError(f"不支持的导出格式: {fmt}")
+        return count
+
+    def close(self):
+        """写完队列中剩余的记录后关闭"""
+        self.queue.put(_STOP)
+        self.thread.join()
+        self.db.close()
+
+
+_store = None
+_store_checked = False
+_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """返回进程内共享的会话记录；在.env中设置 SESSION_LOG=off 时返回None"""
+    global _store, _store_checked
+    with _store_lock:
+        if not _store_checked:
+            _store_checked = True
+            load_dotenv()
+            if os.environ.get('SESSION_LOG', 'on').strip().lower() in ('off', '0', 'false', 'no'):
+                return None
+            try:
+                _store = SessionStore(os.environ.get('SESSION_DB', DEFAULT_SESSION_DB))
+            except sqlite3.Error as e:
+                print(f"打开会话记录失败: {e}")
+        return _store
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="查看、搜索和导出会话记录")
+    parser.add_argument("--db", default=os.environ.get('SESSION_DB', DEFAULT_SESSION_DB))
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="列出最近的会话")
+    search_parser = commands.add_parser("search", help="按关键词搜索原文和译文")
+    search_parser.add_argument("keyword")
+    search_parser.add_argument("-n", "--limit", type=int, default=50)
+    export_parser = commands.add_parser("export", help="导出一个会话")
+    export_parser.add_argument("session_id", type=int)
+    export_parser.add_argument("-f", "--format", choices=["srt", "txt", "jsonl"], default="txt")
+    export_parser.add_argument("-o", "--output", help="输出文件（默认输出到屏幕）")
+    args = parser.parse_args()
+
+    store = SessionStore(args.db)
+    try:
+        if args.command == "list":
+            for session_id, program, started, ended, count in store.sessions():
+                begin = datetime.fromtimestamp(started).strftime("%Y-%m-%d %H:%M:%S")
+                end = datetime.fromtimestamp(ended).strftime("%H:%M:%S") if ended else "未结束"
+                print(f"{session_id:>5}  {begin} - {end}  {program}  {count} 句")
+        elif args.command == "search":
+            for session_id, created, source, translations in store.search(args.keyword, args.limit):
+                stamp = datetime.fromtimestamp(created).strftime("%Y-%m-%d %H:%M:%S")
+                print(f"[会话 {session_id}  {stamp}] {source}")
+                for language, translated_text in (json.loads(translations) if translations else {}).items():
+                    print(f"    ({language}) {translated_text}")
+        else:
+            if args.output:
+                with open(args.output, "w", encoding="utf-8") as f:
+                    count = store.export(args.session_id, args.format, f)
+                print(f"已导出 {count} 句到 {args.output}")
+            else:
+                store.export(args.session_id, args.format, sys.stdout)
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
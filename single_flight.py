@@ -0,0 +1,130 @@
+import asyncio
+import threading
+
+
+class _Call:
+    """一次正在进行的调用，其他相同的调用等待它的结果"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """合并同时进行的相同调用
+
+    缓存只能在调用完成后起作用；多个会话同时说了同一句话，或者推测翻译和最终结果
+    同时翻译同一段文本时，两次调用都还没有完成。同一个 key 已经有调用在进行时，
+    do() 不再重复调用，而是等待那次调用并返回同一个结果（或抛出同一个异常）。
+    do_async() 是 asyncio 版本：共享的请求在所有等待者都取消后才会被取消。
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.tasks = {}
+
+        # 统计信息
+        self.calls = 0
+        self.merged = 0
+
+    def do(self, key, function):
+        """调用 function()；同一个 key 的调用还没有完成时等待它的结果"""
+        with self.lock:
+            self.calls += 1
+            call = self.in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self.in_flight[key] = _Call()
+            else:
+                self.merged += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            call.done.set()
+
+    async def do_async(self, key, factory):
+        """等待 factory() 返回的协程；同一个 key 的协程还没有完成时等待它的结果"""
+        loop = asyncio.get_running_loop()
+        # 不同事件循环中的任务不能互相等待
+        key = (id(loop), key)
+        with self.lock:
+            self.calls += 1
+            entry = self.tasks.get(key)
+            if entry is None:
+                task = loop.create_task(factory())
+                entry = self.tasks[key] = [task, 0]
+                task.add_done_callback(lambda done: self._forget(key, done))
+            else:
+                self.merged += 1
+            entry[1] += 1
+
+        task = entry[0]
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            with self.lock:
+                entry[1] -= 1
+                if entry[1] == 0 and not task.done():
+                    # 最后一个等待者也取消了，之后的相同调用重新开始
+                    if self.tasks.get(key) is entry:
+                        del self.tasks[key]
+                    task.cancel()
+            raise
+
+    def _forget(self, key, task):
+        with self.lock:
+            entry = self.tasks.get(key)
+            if entry is not None and entry[0] is task:
+                del self.tasks[key]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'name': self.name,
+                'calls': self.calls,
+                'merged': self.merged,
+                'in_flight': len(self.in_flight) + len(self.tasks),
+            }
+
+    def render_prometheus(self):
+        """Prometheus 文本格式的计数（不含 HELP/TYPE 行）"""
+        s = self.stats()
+        return [f'voice_translator_coalesced_calls_total{{call="{self.name}"}} {s["merged"]}']
+
+    def report(self):
+        s = self.stats()
+        return f"合并重复调用({self.name}): 调用 {s['calls']} 次  与进行中的相同调用合并 {s['merged']} 次"
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def get_single_flight(name):
+    """返回进程内共享的重复调用合并器（name 为 translate 或 tts）"""
+    with _flights_lock:
+        flight = _flights.get(name)
+        if flight is None:
+            flight = _flights[name] = SingleFlight(name)
+        return flight
+
+
+def all_single_flights():
+    with _flights_lock:
+        return list(_flights.values())
@@ -0,0 +1,215 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from async_translator import cancel_translation, get_async_translator_client, submit_translation_multi
+from phrasebook import PUNCTUATION
+
+# 连续多少个中间结果的公共前缀视为稳定
+DEFAULT_STABLE_COUNT = 3
+# 稳定前缀变化后等待多久再发送翻译（秒）
+DEFAULT_DEBOUNCE = 0.3
+# 稳定前缀至少多长、比上一次翻译的前缀至少多出多少个字符才发送
+DEFAULT_MIN_CHARS = 4
+DEFAULT_MIN_GROWTH = 3
+# 判断推测前缀和最终结果是否相同时忽略标点和空白（最终结果通常会补上标点）
+_IGNORED = str.maketrans("", "", PUNCTUATION)
+
+
+def comparable(text):
+    """去掉所有标点和空白并转成小写，用于比较推测前缀和最终结果"""
+    return text.translate(_IGNORED).lower()
+
+
+def common_prefix(texts):
+    """返回多个字符串的公共前缀"""
+    if not texts:
+        return ""
+    prefix = texts[0]
+    for text in texts[1:]:
+        length = 0
+        for a, b in zip(prefix, text):
+            if a != b:
+                break
+            length += 1
+        prefix = prefix[:length]
+    return prefix
+
+
+class Speculation:
+    """一句话结束时的推测翻译状态"""
+
+    def __init__(self, utterance_id, final_text, translations, first_shown):
+        self.utterance_id = utterance_id
+        self.final_text = final_text
+        # 推测翻译的前缀恰好等于最终结果时，可以直接使用这份译文
+        self.translations = translations
+        self.first_shown = first_shown
+
+
+class SpeculativeTranslator:
+    """根据中间识别结果提前翻译稳定的前缀
+
+    on_partial() 接收 recognizing 事件中的中间结果。当最近 stable_count 个
+    中间结果的公共前缀变长并保持 debounce 秒后，在后台翻译这个前缀，结果通过
+    on_speculative(句子编号, 前缀, 译文) 回调显示。finish() 在一句话识别完成时调用，
+    结束当前句子的推测。显示前可以用 is_current(句子编号) 检查这句话是否已经结束。
+
+    传入 target_languages 且异步翻译客户端可用时，请求按 key 提交：新的请求发出或这句话结束时，
+    还没有完成的旧请求直接取消；否则在线程池中调用 translate(前缀)，旧请求的结果返回后丢弃。
+    推测的半句话不写入翻译缓存（translate 应该以 store=False 翻译）。忽略标点和空白后
+    最后显示的前缀与最终结果相同时，finish() 返回这份译文供直接使用。
+    """
+
+    def __init__(self, translate, on_speculative, stable_count=DEFAULT_STABLE_COUNT, debounce=DEFAULT_DEBOUNCE,
+                 min_chars=DEFAULT_MIN_CHARS, min_growth=DEFAULT_MIN_GROWTH, target_languages=None,
+                 source_language="zh-Hans"):
+        self.translate = translate
+        self.target_languages = target_languages
+        self.source_language = source_language
+        self.use_async = target_languages is not None and get_async_translator_client()[0] is not None
+        # 每个实例的请求用自己的 key，新的请求会取消同一个 key 还没有完成的请求
+        self.key = ("speculative", id(self))
+        self.on_speculative = on_speculative
+        self.stable_count = stable_count
+        self.debounce = debounce
+        self.min_chars = min_chars
+        self.min_growth = min_growth
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="speculative-translation")
+
+        self.utterance_id = 0
+        self.hypotheses = deque(maxlen=stable_count)
+        self.timer = None
+        self.pending_prefix = ""
+        self.requested_prefix = ""
+        self.request_seq = 0
+        self.shown_prefix = None
+        self.shown_translations = None
+        self.first_shown = None
+
+        # 统计信息
+        self.utterances = 0
+        self.speculative_calls = 0
+        self.discarded = 0
+        self.reused = 0
+        self.lead_times = []
+
+    def on_partial(self, text):
+        """收到一个中间识别结果（可以在SDK回调线程中调用）"""
+        with self.lock:
+            self.hypotheses.append(text)
+            if len(self.hypotheses) < self.stable_count:
+                return
+            prefix = common_prefix(list(self.hypotheses))
+            if len(prefix) < self.min_chars or len(prefix) - len(self.requested_prefix) < self.min_growth:
+                return
+            if prefix == self.pending_prefix:
+                return
+            # 稳定前缀变长了：重新开始计时（防抖）
+            self.pending_prefix = prefix
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.debounce, self._fire, args=(self.utterance_id, prefix))
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _fire(self, utterance_id, prefix):
+        with self.lock:
+            if utterance_id != self.utterance_id or prefix != self.pending_prefix:
+                return
+            self.request_seq += 1
+            seq = self.request_seq
+            self.requested_prefix = prefix
+            self.speculative_calls += 1
+        if self.use_async:
+            future = submit_translation_multi(prefix, self.source_language, self.target_languages,
+                                              key=self.key, store=False)
+            future.add_done_callback(lambda done: self._done(utterance_id, seq, prefix, done))
+        else:
+            self.executor.submit(self._run, utterance_id, seq, prefix)
+
+    def _run(self, utterance_id, seq, prefix):
+        try:
+            translations = self.translate(prefix)
+        except Exception as e:
+            print(f"推测翻译失败: {e}")
+            translations = None
+        self._show(utterance_id, seq, prefix, translations)
+
+    def _done(self, utterance_id, seq, prefix, future):
+        try:
+            translations = future.result()
+        except CancelledError:
+            # 被更新的请求或这句话的结束取消了
+            translations = None
+        except Exception as e:
+            print(f"推测翻译失败: {e}")
+            translations = None
+        self._show(utterance_id, seq, prefix, translations)
+
+    def _show(self, utterance_id, seq, prefix, translations):
+        with self.lock:
+            if translations is None or utterance_id != self.utterance_id or seq < self.request_seq:
+                # 这句话已经结束，或者已经有更新的请求：丢弃这个结果
+                self.discarded += 1
+                return
+            self.shown_prefix = prefix
+            self.shown_translations = translations
+            if self.first_shown is None:
+                self.first_shown = time.perf_counter()
+        self.on_speculative(utterance_id, prefix, translations)
+
+    def is_current(self, utterance_id):
+        with self.lock:
+            return utterance_id == self.utterance_id
+
+    def finish(self, final_text):
+        """一句话识别完成，返回这句话的 Speculation 并开始下一句"""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            reusable = None
+            if self.shown_prefix is not None and comparable(self.shown_prefix) == comparable(final_text):
+                reusable = self.shown_translations
+            if reusable is not None:
+                self.reused += 1
+            speculation = Speculation(self.utterance_id, final_text, reusable, self.first_shown)
+
+            self.utterances += 1
+            self.utterance_id += 1
+            self.hypotheses.clear()
+            self.pending_prefix = ""
+            self.requested_prefix = ""
+            self.shown_prefix = None
+            self.shown_translations = None
+            self.first_shown = None
+        if self.use_async:
+            # 这句话的推测请求即使返回也会被丢弃
+            cancel_translation(self.key)
+        return speculation
+
+    def final_shown(self, speculation):
+        """最终译文显示后调用，记录推测译文比最终译文提前了多少"""
+        if speculation is None or speculation.first_shown is None:
+            return
+        with self.lock:
+            self.lead_times.append(time.perf_counter() - speculation.first_shown)
+
+    def report(self):
+        with self.lock:
+            leads = self.lead_times
+            avg_lead = sum(leads) / len(leads) if leads else 0.0
+            return (
+                f"推测翻译: {self.utterances} 句中有 {len(leads)} 句提前显示译文，平均提前 {avg_lead * 1000:.0f} ms\n"
+                f"额外翻译请求 {self.speculative_calls} 次（丢弃 {self.discarded} 次），直接复用推测译文 {self.reused} 次"
+            )
+
+    def close(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+        if self.use_async:
+            cancel_translation(self.key)
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,7 @@
+def format_srt_time(seconds):
+    """把秒数格式化为SRT字幕的时间戳（HH:MM:SS,mmm）"""
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
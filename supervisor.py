@@ -0,0 +1,334 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from dotenv import load_dotenv
+from translation_server import DEFAULT_MAX_SESSIONS, DEFAULT_PORT, TranslationServer
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+HEALTH_INTERVAL = 2       # 健康检查间隔（秒）
+HEALTH_TIMEOUT = 2        # 一次健康检查最多等待的时间（秒）
+MAX_FAILURES = 3          # 连续多少次检查没有响应后重启工作进程
+STARTUP_GRACE = 15        # 工作进程启动后多久内没有响应不算失败（秒）
+RESTART_DELAY = 1         # 重启前等待的时间，反复崩溃时逐渐加倍（秒）
+MAX_RESTART_DELAY = 30
+# 这些配额是整个账号的，按工作进程数平分
+SHARED_QUOTAS = ("TRANSLATOR_CHARS_PER_MINUTE", "TRANSLATOR_REQUESTS_PER_SECOND", "SPEECH_REQUESTS_PER_SECOND")
+
+
+def can_reuse_port():
+    """只有Linux的 SO_REUSEPORT 会把新连接平均分给监听同一端口的多个进程"""
+    return sys.platform.startswith("linux") and hasattr(socket, "SO_REUSEPORT")
+
+
+async def request_stats(port, host="127.0.0.1"):
+    async with websockets.connect(f"ws://{host}:{port}") as websocket:
+        await websocket.send(json.dumps({'type': "stats"}))
+        return json.loads(await websocket.recv())
+
+
+def run_worker(index, host, port, private_port, max_sessions, fake_speech, quota_share):
+    """工作进程：运行一个 TranslationServer
+
+    总是在 127.0.0.1:private_port 上监听（健康检查和代理转发用），port 不为 None 时
+    还用 SO_REUSEPORT 监听公开端口，由内核分配新连接。
+    """
+    load_dotenv()
+    for name in SHARED_QUOTAS:
+        value = float(os.environ.get(name, 0) or 0)
+        if value:
+            os.environ[name] = str(value / quota_share)
+
+    server = TranslationServer(os.environ.get('AZURE_SPEECH_KEY'), os.environ.get('AZURE_SPEECH_REGION'),
+                               max_sessions, fake_speech=fake_speech)
+
+    async def serve():
+        try:
+            async with websockets.serve(server.handle, "127.0.0.1", private_port, max_size=2 ** 20):
+                if port is None:
+                    await asyncio.Future()
+                async with websockets.serve(server.handle, host, port, max_size=2 ** 20, reuse_port=True):
+                    await asyncio.Future()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"[工作进程 {index}] {server.report()}")
+        if server.translation_cache:
+            print(f"[工作进程 {index}] {server.translation_cache.report()}")
+
+
+async def _pipe(reader, writer):
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except OSError:
+        pass
+    finally:
+        writer.close()
+
+
+class Worker:
+    """监督进程记录的一个工作进程的状态"""
+
+    def __init__(self, index, private_port):
+        self.index = index
+        self.private_port = private_port
+        self.process = None
+        self.started = 0.0
+        self.healthy = False
+        self.failures = 0
+        self.restarts = 0
+        self.restart_delay = RESTART_DELAY
+        # 代理模式下经过监督进程转发、还没有结束的连接数
+        self.active = 0
+        self.last_stats = None
+
+
+class Supervisor:
+    """把会话分散到多个工作进程，绕开单个进程的GIL和语音SDK的事件线程
+
+    每个工作进程运行一个 TranslationServer，有自己的识别器、翻译客户端和事件循环；
+    翻译缓存（SQLite WAL）和语音缓存目录在进程之间共享，一个进程翻译过的句子在
+    其他进程中也能命中。账号级别的配额按进程数平分。
+
+    分配连接有两种方式：reuseport（Linux）让所有工作进程用 SO_REUSEPORT 监听同一个
+    端口，由内核分配；proxy 由监督进程接受连接，原样转发给当前连接最少的健康进程。
+    监督进程定期向每个工作进程发送 stats 请求，进程退出或连续 MAX_FAILURES 次没有
+    响应时重启它。stats_port 上可以查询所有工作进程汇总后的统计，格式与
+    TranslationServer 的 stats 相同，load_generator.py --stats-url 可以直接使用。
+    """
+
+    def __init__(self, workers=None, host="127.0.0.1", port=DEFAULT_PORT, max_sessions=DEFAULT_MAX_SESSIONS,
+                 fake_speech=False, balancer=None, stats_port=None):
+        self.host = host
+        self.port = port
+        self.max_sessions = max_sessions
+        self.fake_speech = fake_speech
+        self.balancer = balancer or ("reuseport" if can_reuse_port() else "proxy")
+        self.stats_port = stats_port or port + 1
+        # 工作进程的内部端口紧接在统计端口之后
+        self.workers = [Worker(index, self.stats_port + 1 + index) for index in range(workers or os.cpu_count() or 1)]
+        self.context = multiprocessing.get_context("spawn")
+        self.started_wall = time.perf_counter()
+        self.started_cpu = time.process_time()
+
+        # 统计信息
+        self.proxied = 0
+        self.proxy_rejected = 0
+
+    def _spawn(self, worker):
+        public_port = self.port if self.balancer == "reuseport" else None
+        worker.process = self.context.Process(
+            target=run_worker, name=f"translation-worker-{worker.index}", daemon=True,
+            args=(worker.index, self.host, public_port, worker.private_port, self.max_sessions, self.fake_speech,
+                  len(self.workers)),
+        )
+        worker.process.start()
+        worker.started = time.monotonic()
+        worker.healthy = False
+        worker.failures = 0
+
+    async def _restart(self, worker):
+        loop = asyncio.get_running_loop()
+        worker.healthy = False
+        if worker.process.is_alive():
+            worker.process.terminate()
+            await loop.run_in_executor(None, worker.process.join, 5)
+            if worker.process.is_alive():
+                worker.process.kill()
+                await loop.run_in_executor(None, worker.process.join)
+        # 启动后很快又退出时拉长重启间隔，避免反复崩溃占满CPU
+        if time.monotonic() - worker.started < STARTUP_GRACE:
+            worker.restart_delay = min(worker.restart_delay * 2, MAX_RESTART_DELAY)
+        else:
+            worker.restart_delay = RESTART_DELAY
+        await asyncio.sleep(worker.restart_delay)
+        worker.restarts += 1
+        self._spawn(worker)
+
+    async def _check(self, worker):
+        if not worker.process.is_alive():
+            print(f"工作进程 {worker.index} 已退出（退出码 {worker.process.exitcode}），正在重启")
+            await self._restart(worker)
+            return
+        try:
+            worker.last_stats = await asyncio.wait_for(request_stats(worker.private_port), HEALTH_TIMEOUT)
+        except (OSError, asyncio.TimeoutError, websockets.WebSocketException, ValueError):
+            if not worker.healthy and time.monotonic() - worker.started < STARTUP_GRACE:
+                return
+            worker.healthy = False
+            worker.failures += 1
+            if worker.failures >= MAX_FAILURES:
+                print(f"工作进程 {worker.index} 连续 {worker.failures} 次没有响应，正在重启")
+                await self._restart(worker)
+            return
+        worker.healthy = True
+        worker.failures = 0
+
+    async def _monitor(self, worker):
+        while True:
+            await self._check(worker)
+            # 还没有就绪的进程检查得更频繁，尽快开始接收连接
+            await asyncio.sleep(HEALTH_INTERVAL if worker.healthy else 0.5)
+
+    def _pick(self):
+        """代理模式下选择健康的工作进程中当前连接最少的一个"""
+        candidates = [worker for worker in self.workers if worker.healthy]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda worker: worker.active)
+
+    async def _proxy(self, reader, writer):
+        worker = self._pick()
+        upstream = None
+        if worker is not None:
+            try:
+                upstream = await asyncio.open_connection("127.0.0.1", worker.private_port)
+            except OSError:
+                upstream = None
+        if upstream is None:
+            self.proxy_rejected += 1
+            writer.close()
+            return
+        upstream_reader, upstream_writer = upstream
+        worker.active += 1
+        self.proxied += 1
+        try:
+            await asyncio.gather(_pipe(reader, upstream_writer), _pipe(upstream_reader, writer))
+        finally:
+            worker.active -= 1
+
+    async def stats(self):
+        """向所有工作进程查询统计并汇总；没有响应的进程使用上一次健康检查的结果"""
+        results = await asyncio.gather(
+            *(asyncio.wait_for(request_stats(worker.private_port), HEALTH_TIMEOUT) for worker in self.workers),
+            return_exceptions=True)
+        total = {'type': "stats", 'workers': len(self.workers), 'healthy': 0, 'balancer': self.balancer,
+                 'sessions': 0, 'max_sessions': 0, 'accepted': 0, 'rejected': self.proxy_rejected, 'utterances': 0,
+                 'translation_errors': 0, 'restarts': 0,
+                 'wall_seconds': time.perf_counter() - self.started_wall,
+                 # 代理模式下监督进程本身的CPU占用也算在内
+                 'cpu_seconds': time.process_time() - self.started_cpu,
+                 'cache': {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'busy': 0}, 'worker_stats': []}
+        for worker, result in zip(self.workers, results):
+            if isinstance(result, Exception):
+                result = worker.last_stats
+            else:
+                worker.last_stats = result
+            total['healthy'] += worker.healthy
+            total['restarts'] += worker.restarts
+            total['worker_stats'].append({'index': worker.index, 'pid': worker.process.pid, 'healthy': worker.healthy,
+                                          'restarts': worker.restarts, 'active': worker.active,
+                                          'sessions': result['sessions'] if result else None})
+            if not result:
+                continue
+            for key in ('sessions', 'max_sessions', 'accepted', 'rejected', 'utterances', 'translation_errors',
+                        'cpu_seconds'):
+                total[key] += result[key]
+            for key in total['cache']:
+                total['cache'][key] += (result.get('cache') or {}).get(key, 0)
+        lookups = total['cache']['memory_hits'] + total['cache']['disk_hits'] + total['cache']['misses']
+        total['cache']['hit_ratio'] = (lookups - total['cache']['misses']) / lookups if lookups else 0.0
+        return total
+
+    async def _handle_stats(self, websocket):
+        try:
+            message = json.loads(await websocket.recv())
+        except (ValueError, TypeError, websockets.ConnectionClosed):
+            return
+        if message.get('type') == "stats":
+            await websocket.send(json.dumps(await self.stats()))
+
+    async def run(self):
+        for worker in self.workers:
+            self._spawn(worker)
+        monitors = [asyncio.create_task(self._monitor(worker)) for worker in self.workers]
+        servers = [await websockets.serve(self._handle_stats, "127.0.0.1", self.stats_port)]
+        if self.balancer == "proxy":
+            servers.append(await asyncio.start_server(self._proxy, self.host, self.port))
+        print(f"翻译服务已启动: ws://{self.host}:{self.port}  {len(self.workers)} 个工作进程（{self.balancer}），"
+              f"每个最多 {self.max_sessions} 个会话；统计: ws://127.0.0.1:{self.stats_port}，按Ctrl+C退出")
+        try:
+            await asyncio.Future()
+        finally:
+            for monitor in monitors:
+                monitor.cancel()
+            for server in servers:
+                server.close()
+
+    def stop(self):
+        """结束所有工作进程（Ctrl+C 时它们已经收到信号，先等它们自己退出）"""
+        deadline = time.monotonic() + 5
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.process.join(max(0, deadline - time.monotonic()))
+                if worker.process.is_alive():
+                    worker.process.terminate()
+                    worker.process.join()
+
+    def report(self):
+        restarts = sum(worker.restarts for worker in self.workers)
+        text = f"监督进程: {len(self.workers)} 个工作进程（{self.balancer}）  重启 {restarts} 次"
+        if self.balancer == "proxy":
+            text += f"  转发 {self.proxied} 个连接  拒绝 {self.proxy_rejected} 个"
+        return text
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="用多个工作进程运行翻译服务（translation_server.py），并在进程出错时重启")
+    parser.add_argument("-w", "--workers", type=int, default=int(os.environ.get('SERVER_WORKERS', 0) or 0) or None,
+                        help="工作进程数（默认等于CPU核数）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.environ.get('SERVER_PORT', DEFAULT_PORT)))
+    parser.add_argument("--stats-port", type=int, help="汇总统计的端口（默认 port+1，工作进程的内部端口紧随其后）")
+    parser.add_argument("--max-sessions", type=int, default=int(os.environ.get('SERVER_MAX_SESSIONS', DEFAULT_MAX_SESSIONS)),
+                        help="每个工作进程同时进行的会话数上限")
+    parser.add_argument("--balancer", choices=["reuseport", "proxy"],
+                        help="分配连接的方式（Linux默认 reuseport，其他系统默认 proxy）")
+    parser.add_argument("--speech", choices=["azure", "fake"], default="azure",
+                        help="fake 使用假的识别器和语音合成器（压力测试用）")
+    args = parser.parse_args()
+
+    if websockets is None:
+        print("错误：翻译服务需要安装 websockets（pip install websockets）")
+        return
+    if args.speech == "azure" and (not os.environ.get('AZURE_SPEECH_KEY') or not os.environ.get('AZURE_SPEECH_REGION')):
+        print("错误：请在.env文件中设置AZURE_SPEECH_KEY和AZURE_SPEECH_REGION")
+        return
+    if args.balancer == "reuseport" and not can_reuse_port():
+        print("错误：这个系统不支持用 SO_REUSEPORT 分配连接，请使用 --balancer proxy")
+        return
+
+    supervisor = Supervisor(args.workers, args.host, args.port, args.max_sessions, fake_speech=args.speech == "fake",
+                            balancer=args.balancer, stats_port=args.stats_port)
+    # 被 terminate 时也要结束工作进程
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        asyncio.run(supervisor.run())
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        supervisor.stop()
+        print(supervisor.report())
+
+if __name__ == "__main__":
+    main()
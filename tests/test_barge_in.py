@@ -0,0 +1,40 @@
+import threading
+import time
+import tts_cache
+from duplex import DUPLEX_BARGE_IN, DuplexController
+from test_tts_streaming import VOICE, FakeSimpleaudio, NoSynthesizerPool, wav
+from tts_cache import AudioCache
+from tts_pool import OUTPUT_FORMAT
+from tts_streaming import StreamingSpeaker
+
+
+def test_barge_in_stops_cached_playback(monkeypatch):
+    player = FakeSimpleaudio()
+    monkeypatch.setattr(tts_cache, "winsound", None)
+    monkeypatch.setattr(tts_cache, "simpleaudio", player)
+
+    cache = AudioCache(directory=None)
+    text = "Hello, this sentence was spoken before."
+    cache.put(cache.key(text, VOICE, OUTPUT_FORMAT), wav(3.0))
+    speaker = StreamingSpeaker(NoSynthesizerPool(), cache)
+    duplex = DuplexController(DUPLEX_BARGE_IN, stop_playback=speaker.stop)
+
+    results = []
+
+    def speak():
+        with duplex.playback():
+            results.append(speaker.speak(text, VOICE))
+
+    thread = threading.Thread(target=speak)
+    started = time.perf_counter()
+    thread.start()
+    time.sleep(0.2)
+    duplex.local_speech()
+    thread.join(timeout=2)
+
+    assert not thread.is_alive()
+    assert time.perf_counter() - started < 1.0
+    assert results[0].interrupted
+    assert results[0].cached_chunks == 0
+    assert player.plays[0].stopped
+    assert duplex.stats()['barge_ins'] == 1
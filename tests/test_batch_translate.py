@@ -0,0 +1,82 @@
+import json
+import os
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+import batch_translate
+from batch_translate import collect_wav_outputs, process_file, stop_executor
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes(bytes(3200))
+
+
+def read_texts(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)['text'] for line in f]
+
+
+def test_same_name_in_different_directories_does_not_collide(tmp_path, monkeypatch):
+    first = str(tmp_path / "input" / "a" / "x.wav")
+    second = str(tmp_path / "input" / "b" / "x.wav")
+    touch(first)
+    touch(second)
+
+    def transcribe_file(path, speech_key, speech_region, language="zh-CN"):
+        return [{'offset': 0.0, 'duration': 1.0, 'text': path}]
+
+    monkeypatch.setattr(batch_translate, "transcribe_file", transcribe_file)
+    output_dir = str(tmp_path / "output")
+    outputs = collect_wav_outputs([str(tmp_path / "input")])
+    assert [name for _, name in outputs] == [os.path.join("a", "x"), os.path.join("b", "x")]
+    for path, name in outputs:
+        assert process_file(path, output_dir, output_name=name)['error'] is None
+
+    assert read_texts(os.path.join(output_dir, "a", "x.jsonl")) == [first]
+    assert read_texts(os.path.join(output_dir, "b", "x.jsonl")) == [second]
+    assert os.path.exists(os.path.join(output_dir, "a", "x.srt"))
+    assert os.path.exists(os.path.join(output_dir, "b", "x.srt"))
+
+
+def test_same_name_given_as_files_gets_a_suffix(tmp_path):
+    first = str(tmp_path / "a" / "x.wav")
+    second = str(tmp_path / "b" / "X.wav")
+    touch(first)
+    touch(second)
+
+    outputs = collect_wav_outputs([first, second, first])
+    assert outputs == [(first, "x"), (second, "X_2")]
+
+
+def wait_for_stop():
+    return batch_translate.stop_event.wait(30)
+
+
+def test_stop_executor_does_not_wait_for_running_threads(monkeypatch):
+    monkeypatch.setattr(batch_translate, "stop_event", batch_translate.threading.Event())
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        running = executor.submit(wait_for_stop)
+        queued = executor.submit(wait_for_stop)
+        time.sleep(0.1)
+        stop_executor(executor)
+    assert time.perf_counter() - started < 5
+    assert queued.cancelled()
+    assert running.result() is True
+
+
+def test_stop_executor_terminates_worker_processes():
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(time.sleep, 30) for _ in range(4)]
+        time.sleep(0.5)
+        stop_executor(executor)
+    # 工作进程结束后，正在运行的文件以 BrokenProcessPool 结束，不会等30秒
+    _, not_done = wait(futures, timeout=5)
+    assert not not_done
+    assert time.perf_counter() - started < 10
@@ -0,0 +1,37 @@
+import asyncio
+
+import endpoint_selector
+from endpoint_selector import MIN_HEDGE_SAMPLES, Endpoint, EndpointSelector
+from metrics import UtteranceMetrics
+from test_metrics import parse_families
+
+
+def test_cancelled_hedge_is_not_counted_in_latencies():
+    primary, backup = Endpoint("primary"), Endpoint("backup")
+    primary.latencies.extend([0.05] * MIN_HEDGE_SAMPLES)
+    selector = EndpointSelector("test", [primary, backup], hedge=True, hedge_budget=1.0)
+
+    async def send(endpoint):
+        await asyncio.sleep(0.2 if endpoint is primary else 1.0)
+        return endpoint.name
+
+    assert asyncio.run(selector.call_async(send)) == "primary"
+    assert selector.hedges == 1
+    # 对冲请求在大约0.15秒时被取消，这个时间不是它真实的延迟
+    assert len(backup.latencies) == 0
+    assert len(primary.latencies) == MIN_HEDGE_SAMPLES + 1
+
+
+def test_selector_families_have_their_own_headers():
+    selector = EndpointSelector("test", [Endpoint("a"), Endpoint("b")])
+    selector.endpoints[0].rtt = 0.01
+    endpoint_selector._selectors["test"] = selector
+    try:
+        families = parse_families(UtteranceMetrics().render_prometheus())
+    finally:
+        del endpoint_selector._selectors["test"]
+
+    assert families["voice_translator_hedged_requests_total"] == ("counter", 1)
+    assert families["voice_translator_failovers_total"] == ("counter", 1)
+    assert families["voice_translator_endpoint_rtt_seconds"] == ("gauge", 1)
+    assert families["voice_translator_endpoint_healthy"] == ("gauge", 2)
@@ -0,0 +1,35 @@
+from governor import get_governor
+from metrics import UtteranceMetrics
+
+
+def parse_families(text):
+    """检查文本格式：每个指标族的 HELP/TYPE 只出现一次，样本紧跟在后面，返回 {指标族: (类型, 样本数)}"""
+    families = {}
+    current = None
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            current = line.split()[2]
+            assert current not in families, f"{current} 的 HELP 出现了多次"
+            families[current] = [None, 0]
+        elif line.startswith("# TYPE "):
+            _, _, name, kind = line.split()
+            assert name == current and families[name][0] is None
+            families[name][0] = kind
+        elif line:
+            name = line.split("{", 1)[0].split(" ", 1)[0]
+            family = current if name == current or (
+                families[current][0] == "histogram" and name.rsplit("_", 1)[0] == current) else None
+            assert family is not None, f"{name} 不在自己的指标族下面"
+            families[family][1] += 1
+    return {name: tuple(value) for name, value in families.items()}
+
+
+def test_governor_families_have_one_header_and_correct_types():
+    get_governor("translator")
+    get_governor("speech")
+    families = parse_families(UtteranceMetrics().render_prometheus())
+
+    assert families["voice_translator_stage_seconds"][0] == "histogram"
+    assert families["voice_translator_circuit_open"] == ("gauge", 2)
+    for name in ("requests", "retries", "throttled", "failures", "circuit_rejected", "queued_seconds"):
+        assert families[f"voice_translator_{name}_total"] == ("counter", 2)
@@ -0,0 +1,47 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fake_speech import FakeSynthesizer
+from fake_translator_server import LatencyModel
+from tts_pool import SynthesizerPool
+
+SYNTHESIS_SECONDS = 0.2
+
+
+def make_pool(per_voice):
+    pool = SynthesizerPool("key", "region", per_voice=per_voice)
+    created = []
+
+    def create(voice_name, to_speaker):
+        synthesizer = FakeSynthesizer(LatencyModel(SYNTHESIS_SECONDS, sigma=0.0))
+        created.append(synthesizer)
+        return synthesizer
+
+    pool._create = create
+    return pool, created
+
+
+def synthesize_all(pool, count):
+    def synthesize(index):
+        with pool.lease("en-US-JennyNeural") as synthesizer:
+            synthesizer.speak_text_async(f"sentence {index}").get()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        list(executor.map(synthesize, range(count)))
+    return time.perf_counter() - started
+
+
+def test_lease_synthesizes_in_parallel_up_to_per_voice():
+    pool, created = make_pool(per_voice=4)
+    elapsed = synthesize_all(pool, 4)
+    # 共用一个合成器时4句话要排队约0.8秒
+    assert elapsed < SYNTHESIS_SECONDS * 2
+    assert len(created) == 4
+
+
+def test_lease_waits_and_reuses_when_all_synthesizers_are_busy():
+    pool, created = make_pool(per_voice=2)
+    elapsed = synthesize_all(pool, 6)
+    assert elapsed >= SYNTHESIS_SECONDS * 3 * 0.9
+    assert len(created) == 2
+    assert len(pool.idle["en-US-JennyNeural"]) == 2
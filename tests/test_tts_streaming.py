@@ -0,0 +1,124 @@
+import io
+import threading
+import time
+import wave
+import tts_cache
+from tts_cache import AudioCache
+from tts_pool import OUTPUT_FORMAT
+from tts_queue import SpeechQueue
+from tts_streaming import StreamingSpeaker, split_sentences
+
+VOICE = "en-US-JennyNeural"
+
+
+class FakePlayObject:
+    """按音频时长“播放”，可以被 stop() 停止"""
+
+    def __init__(self, seconds):
+        self.finished = time.perf_counter() + seconds
+        self.stopped = False
+
+    def is_playing(self):
+        return not self.stopped and time.perf_counter() < self.finished
+
+    def wait_done(self):
+        while self.is_playing():
+            time.sleep(0.01)
+
+    def stop(self):
+        self.stopped = True
+
+
+class FakeSimpleaudio:
+    def __init__(self):
+        self.plays = []
+
+    def play_buffer(self, frames, channels, sample_width, sample_rate):
+        play = FakePlayObject(len(frames) / channels / sample_width / sample_rate)
+        self.plays.append(play)
+        return play
+
+
+class NoSynthesizerPool:
+    def get(self, voice_name):
+        raise AssertionError("缓存命中时不应该调用合成服务")
+
+
+def wav(seconds, sample_rate=16000):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(bytes(2 * int(seconds * sample_rate)))
+    return buffer.getvalue()
+
+
+def test_replay_preempts_cached_automatic_item(monkeypatch):
+    player = FakeSimpleaudio()
+    monkeypatch.setattr(tts_cache, "winsound", None)
+    monkeypatch.setattr(tts_cache, "simpleaudio", player)
+
+    cache = AudioCache(directory=None)
+    automatic = "A long automatic translation that is already cached."
+    manual = "Replay this line."
+    cache.put(cache.key(automatic, VOICE, OUTPUT_FORMAT), wav(3.0))
+    cache.put(cache.key(manual, VOICE, OUTPUT_FORMAT), wav(0.1))
+    speaker = StreamingSpeaker(NoSynthesizerPool(), cache)
+
+    def speak(text, voice_name, timing):
+        result = speaker.speak(text, voice_name)
+        return None if result.interrupted else result.success
+
+    finished = {}
+    done = threading.Event()
+
+    def on_done(item, spoken):
+        finished[item.text] = spoken
+        if len(finished) == 2:
+            done.set()
+
+    speech_queue = SpeechQueue(speak, speaker.stop)
+    started = time.perf_counter()
+    speech_queue.say(automatic, VOICE, on_done=on_done)
+    time.sleep(0.2)
+    speech_queue.replay(manual, VOICE, on_done=on_done)
+
+    assert done.wait(2)
+    assert time.perf_counter() - started < 1.0
+    assert finished == {automatic: False, manual: True}
+    assert player.plays[0].stopped
+    assert speech_queue.stats()['interrupted'] == 1
+    speech_queue.close()
+
+
+def test_cached_playback_finishes_without_interruption(monkeypatch):
+    player = FakeSimpleaudio()
+    monkeypatch.setattr(tts_cache, "winsound", None)
+    monkeypatch.setattr(tts_cache, "simpleaudio", player)
+
+    cache = AudioCache(directory=None)
+    text = "Short cached line."
+    cache.put(cache.key(text, VOICE, OUTPUT_FORMAT), wav(0.1))
+    result = StreamingSpeaker(NoSynthesizerPool(), cache).speak(text, VOICE)
+
+    assert result.success
+    assert result.cached_chunks == 1
+    assert not player.plays[0].stopped
+
+
+def test_split_sentences_keeps_decimals_and_abbreviations():
+    text = "The price is 3.5 dollars. Mr. Smith from the U.S. will arrive at 10 a.m. tomorrow..."
+    chunks = split_sentences(text)
+
+    assert chunks[0] == "The price is 3.5 dollars."
+    for token in ("3.5", "U.S.", "a.m.", "Mr. Smith"):
+        assert any(token in chunk for chunk in chunks)
+    # 拼回去和原文相同，没有增加空格
+    assert " ".join(chunks) == text
+
+
+def test_split_sentences_splits_chinese_without_whitespace():
+    chunks = split_sentences("你好。今天天气很好！我们去公园吧；好的。")
+
+    assert chunks == ["你好。", "今天天气很好！我们去公园吧；好的。"]
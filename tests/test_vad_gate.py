@@ -0,0 +1,99 @@
+import time
+import numpy as np
+from metrics import TICKS_PER_SECOND, UtteranceMetrics
+from vad_gate import SAMPLE_RATE, VADGate
+
+CHUNK_SECONDS = 0.1
+
+
+class FakePushStream:
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+
+class FakeResult:
+    def __init__(self, offset, duration):
+        self.text = "你好"
+        self.offset = int(offset * TICKS_PER_SECOND)
+        self.duration = int(duration * TICKS_PER_SECOND)
+
+
+def noise(seconds, amplitude, rng):
+    return rng.normal(0, amplitude, int(seconds * SAMPLE_RATE))
+
+
+def tone(seconds, amplitude):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return amplitude * np.sin(2 * np.pi * 440 * t)
+
+
+def feed(gate, samples, started):
+    """按 100ms 一块送入门，返回最后一块的采集时间"""
+    samples = np.clip(samples, -32768, 32767).astype(np.int16)
+    chunk = int(CHUNK_SECONDS * SAMPLE_RATE)
+    now = started
+    for index in range(0, len(samples), chunk):
+        now = started + (index + chunk) / SAMPLE_RATE
+        gate.process(samples[index:index + chunk].tobytes(), now=now)
+    return now
+
+
+def test_speech_end_maps_back_to_capture_time_after_leading_silence():
+    rng = np.random.default_rng(0)
+    gate = VADGate(FakePushStream())
+    started = time.perf_counter() - 10
+    clock = gate.clock()
+    # 3 秒静音之后说 1 秒话，再静音 1 秒；门只上传语音段
+    audio = np.concatenate([noise(3, 20, rng), tone(1, 8000), noise(1, 20, rng)])
+    feed(gate, audio, started)
+    speech_end = started + 4.0
+
+    uploaded = np.frombuffer(bytes(gate.push_stream.data), dtype=np.int16)
+    loud = np.nonzero(np.abs(uploaded) > 4000)[0]
+    # 识别服务看到的语音：offset 不包含被丢掉的 3 秒静音
+    offset = loud[0] / SAMPLE_RATE
+    duration = (loud[-1] + 1) / SAMPLE_RATE - offset
+    assert offset + duration < 2.0
+
+    assert abs(clock(offset + duration) - speech_end) < 0.025
+    assert abs(clock(offset) - (started + 3.0)) < 0.025
+
+    metrics = UtteranceMetrics()
+    timing = metrics.recognized(FakeResult(offset, duration), clock)
+    assert abs(timing.marks["speech_end"] - speech_end) < 0.025
+
+
+def test_clock_for_later_session_starts_at_current_stream_position():
+    rng = np.random.default_rng(1)
+    gate = VADGate(FakePushStream())
+    started = time.perf_counter() - 20
+    now = feed(gate, np.concatenate([noise(1, 20, rng), tone(1, 8000), noise(1, 20, rng)]), started)
+    clock = gate.clock()
+    uploaded_before = len(gate.push_stream.data) // 2
+    feed(gate, np.concatenate([noise(2, 20, rng), tone(1, 8000), noise(1, 20, rng)]), now)
+
+    # 第二次识别会话的 offset 从会话开始时流中的位置算起
+    uploaded = np.frombuffer(bytes(gate.push_stream.data), dtype=np.int16)[uploaded_before:]
+    offset = np.nonzero(np.abs(uploaded) > 4000)[0][0] / SAMPLE_RATE
+    assert abs(clock(offset) - (now + 2.0)) < 0.025
+
+
+def test_gate_closes_after_background_noise_steps_up():
+    rng = np.random.default_rng(2)
+    gate = VADGate(FakePushStream())
+    started = time.perf_counter() - 30
+    # 安静的房间，然后背景噪声突然升高约 30 dB（例如打开了空调）并一直持续
+    now = feed(gate, noise(2, 30, rng), started)
+    now = feed(gate, noise(15, 1000, rng), now)
+
+    assert not gate.open
+    assert gate.stats()['uploaded_seconds'] < 10
+    assert gate.noise_db > -40
+
+    # 噪声中的说话仍然能打开门
+    segments = gate.segments
+    feed(gate, tone(1, 12000) + noise(1, 1000, rng), now)
+    assert gate.segments == segments + 1
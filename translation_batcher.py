@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# 默认的合并参数：最多等待20毫秒，或者凑满100段文本/10000个字符就立即发送
+DEFAULT_WINDOW = 0.02
+DEFAULT_MAX_ITEMS = 100
+DEFAULT_MAX_CHARS = 10000
+
+
+class _Batch:
+    """同一语言对下等待一起发送的一组文本"""
+
+    def __init__(self, source_language, target_language, deadline):
+        self.source_language = source_language
+        self.target_language = target_language
+        self.deadline = deadline
+        self.texts = []
+        self.futures = []
+        self.chars = 0
+
+
+class TranslationBatcher:
+    """把短时间内到达的多个翻译请求合并成一个数组请求发送
+
+    translate() 的用法与 translate_text 相同，会阻塞到这段文本的译文返回。
+    同一语言对的文本在 window 秒内累积，达到 max_items 段或 max_chars 个
+    字符时提前发送，结果按顺序分发回各自的调用者。传入 single_flight 时，
+    同一段文本正在等待译文的调用者不会把它再加入一次。
+    """
+
+    def __init__(self, client, window=DEFAULT_WINDOW, max_items=DEFAULT_MAX_ITEMS,
+                 max_chars=DEFAULT_MAX_CHARS, max_workers=4, single_flight=None):
+        self.client = client
+        self.single_flight = single_flight
+        self.window = window
+        self.max_items = max_items
+        self.max_chars = max_chars
+        self.condition = threading.Condition()
+        self.open_batches = {}
+        self.ready = deque()
+        self.running = True
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="translation-batch")
+
+        # 统计信息
+        self.batch_sizes = Counter()
+        self.items = 0
+        self.requests = 0
+
+        self.thread = threading.Thread(target=self._run, name="translation-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, text, source_language="zh-Hans", target_language="en"):
+        """提交一段文本，返回一个 Future"""
+        future = Future()
+        key = (source_language, target_language)
+        with self.condition:
+            batch = self.open_batches.get(key)
+            if batch is not None and (batch.chars + len(text) > self.max_chars):
+                # 加上这段文本会超过字符上限，先把当前这一组发出去
+                self.ready.append(self.open_batches.pop(key))
+                batch = None
+            if batch is None:
+                batch = _Batch(source_language, target_language, time.perf_counter() + self.window)
+                self.open_batches[key] = batch
+            batch.texts.append(text)
+            batch.futures.append(future)
+            batch.chars += len(text)
+            if len(batch.texts) >= self.max_items or batch.chars >= self.max_chars:
+                self.ready.append(self.open_batches.pop(key))
+            self.condition.notify()
+        return future
+
+    def translate(self, text, source_language="zh-Hans", target_language="en"):
+        """翻译一段文本（与其他调用者的文本合并发送），失败时抛出异常"""
+        if self.single_flight is None:
+            return self.submit(text, source_language, target_language).result()
+        # 键与客户端的 translate_multi 区分开，两者返回的结果类型不同
+        return self.single_flight.do(("batch", text, source_language, target_language),
+                                     lambda: self.submit(text, source_language, target_language).result())
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.ready:
+                    now = time.perf_counter()
+                    expired = [key for key, batch in self.open_batches.items() if batch.deadline <= now]
+                    for key in expired:
+                        self.ready.append(self.open_batches.pop(key))
+                    if self.ready:
+                        break
+                    if self.open_batches:
+                        next_deadline = min(batch.deadline for batch in self.open_batches.values())
+                        self.condition.wait(max(0.0, next_deadline - now))
+                    else:
+                        self.condition.wait()
+                if not self.running:
+                    # 关闭时把所有未发送的文本都发出去
+                    self.ready.extend(self.open_batches.values())
+                    self.open_batches.clear()
+                batches = list(self.ready)
+                self.ready.clear()
+                for batch in batches:
+                    self.batch_sizes[len(batch.texts)] += 1
+                    self.items += len(batch.texts)
+                    self.requests += 1
+
+            for batch in batches:
+                self.executor.submit(self._send, batch)
+            if not self.running:
+                break
+
+    def _send(self, batch):
+        try:
+            translations = self.client.translate_batch(batch.texts, batch.source_language, batch.target_language)
+        except Exception as e:
+            for future in batch.futures:
+                future.set_exception(e)
+            return
+        for future, translation in zip(batch.futures, translations):
+            future.set_result(translation)
+
+    def stats(self):
+        with self.condition:
+            return {
+                'items': self.items,
+                'requests': self.requests,
+                'requests_saved': self.items - self.requests,
+                'batch_sizes': dict(sorted(self.batch_sizes.items())),
+            }
+
+    def report(self):
+        s = self.stats()
+        histogram = "  ".join(f"{size}: {count}" for size, count in s['batch_sizes'].items()) or "无"
+        return (
+            f"翻译合并: 文本 {s['items']} 段  请求 {s['requests']} 次  节省请求 {s['requests_saved']} 次\n"
+            f"每个请求的文本数分布: {histogram}"
+        )
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+        self.executor.shutdown(wait=True)
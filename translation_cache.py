@@ -0,0 +1,206 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# 默认配置，可以在.env中覆盖
+DEFAULT_CACHE_PATH = "translation_cache.db"
+DEFAULT_TTL = 7 * 24 * 3600      # 缓存有效期（秒）
+DEFAULT_MEMORY_ENTRIES = 1024    # 内存中最多保存的条目数
+DEFAULT_DISK_ENTRIES = 100000    # 磁盘上最多保存的条目数
+BUSY_TIMEOUT = 5                 # 其他进程正在写入时最多等待的时间（秒）
+
+
+class TranslationCache:
+    """两级翻译缓存：内存中的LRU + 磁盘上的SQLite
+
+    以 (源语言, 目标语言, 文本) 为键。内存层命中时直接返回，磁盘层命中后
+    会提升到内存层。超过有效期的条目视为未命中并删除，超过容量时淘汰最久
+    未使用的条目。db_path 为 None 时只使用内存层。
+
+    磁盘层使用WAL模式，多个进程可以同时打开同一个数据库（见 supervisor.py）：
+    一个进程写入的译文在其他进程的磁盘层立即可以命中。数据库忙时放弃这次读写，
+    当作未命中处理，不影响翻译本身。
+    """
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL,
+                 max_memory_entries=DEFAULT_MEMORY_ENTRIES, max_disk_entries=DEFAULT_DISK_ENTRIES):
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.busy = 0
+
+        self.db = None
+        if db_path:
+            self.db = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            # WAL模式下 NORMAL 不会损坏数据库，只是断电时可能丢失最后几条
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " source TEXT NOT NULL, target TEXT NOT NULL, text TEXT NOT NULL,"
+                " translation TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (source, target, text))"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS idx_translations_accessed ON translations (accessed_at)")
+            self.db.commit()
+            self.disk_entries = self.db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    def get(self, text, source_language, target_language):
+        """查找缓存，未命中或已过期时返回None"""
+        key = (source_language, target_language, text)
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                translation, created_at = entry
+                if now - created_at <= self.ttl:
+                    self.memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return translation
+                del self.memory[key]
+                self.expirations += 1
+
+            if self.db is not None:
+                try:
+                    translation = self._get_disk(key, now)
+                except sqlite3.OperationalError:
+                    self.db.rollback()
+                    self.busy += 1
+                    translation = None
+                if translation is not None:
+                    self.disk_hits += 1
+                    return translation
+
+            self.misses += 1
+            return None
+
+    def _get_disk(self, key, now):
+        row = self.db.execute(
+            "SELECT translation, created_at FROM translations WHERE source = ? AND target = ? AND text = ?",
+            key
+        ).fetchone()
+        if row is None:
+            return None
+        translation, created_at = row
+        if now - created_at <= self.ttl:
+            self.db.execute(
+                "UPDATE translations SET accessed_at = ? WHERE source = ? AND target = ? AND text = ?",
+                (now,) + key
+            )
+            self.db.commit()
+            self._remember(key, translation, created_at)
+            return translation
+        self.db.execute("DELETE FROM translations WHERE source = ? AND target = ? AND text = ?", key)
+        self.db.commit()
+        self.disk_entries -= 1
+        self.expirations += 1
+        return None
+
+    def put(self, text, source_language, target_language, translation):
+        """保存一条翻译结果"""
+        key = (source_language, target_language, text)
+        now = time.time()
+        with self.lock:
+            self._remember(key, translation, now)
+            if self.db is not None:
+                try:
+                    self._put_disk(key, translation, now)
+                except sqlite3.OperationalError:
+                    self.db.rollback()
+                    self.busy += 1
+
+    def _put_disk(self, key, translation, now):
+        existed = self.db.execute(
+            "SELECT 1 FROM translations WHERE source = ? AND target = ? AND text = ?", key
+        ).fetchone() is not None
+        self.db.execute(
+            "INSERT OR REPLACE INTO translations (source, target, text, translation, created_at, accessed_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            key + (translation, now, now)
+        )
+        if not existed:
+            self.disk_entries += 1
+        if self.disk_entries > self.max_disk_entries:
+            # 其他进程也在写入同一个数据库，淘汰前重新统计条目数
+            self.disk_entries = self.db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        if self.disk_entries > self.max_disk_entries:
+            # 淘汰最久未使用的条目
+            excess = self.disk_entries - self.max_disk_entries
+            self.db.execute(
+                "DELETE FROM translations WHERE rowid IN"
+                " (SELECT rowid FROM translations ORDER BY accessed_at LIMIT ?)",
+                (excess,)
+            )
+            self.disk_entries -= excess
+            self.evictions += excess
+        self.db.commit()
+
+    def _remember(self, key, translation, created_at):
+        self.memory[key] = (translation, created_at)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'busy': self.busy,
+                'hit_ratio': hits / lookups if lookups else 0.0,
+                'memory_entries': len(self.memory),
+                'disk_entries': self.disk_entries if self.db is not None else 0,
+            }
+
+    def report(self):
+        s = self.stats()
+        return (
+            f"翻译缓存: 命中 {s['memory_hits']} (内存) + {s['disk_hits']} (磁盘)  未命中 {s['misses']}  "
+            f"命中率 {s['hit_ratio'] * 100:.1f}%  淘汰 {s['evictions']}  过期 {s['expirations']}  数据库忙 {s['busy']}  "
+            f"条目 {s['memory_entries']} (内存) / {s['disk_entries']} (磁盘)"
+        )
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_translation_cache():
+    """返回进程内共享的翻译缓存，配置从.env读取；TRANSLATION_CACHE=off 时返回None"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            load_dotenv()
+            if os.environ.get('TRANSLATION_CACHE', 'on').strip().lower() in ('off', '0', 'false', 'no'):
+                return None
+            db_path = os.environ.get('TRANSLATION_CACHE_PATH', DEFAULT_CACHE_PATH) or None
+            _cache = TranslationCache(
+                db_path=db_path,
+                ttl=float(os.environ.get('TRANSLATION_CACHE_TTL', DEFAULT_TTL)),
+                max_memory_entries=int(os.environ.get('TRANSLATION_CACHE_MEMORY_ENTRIES', DEFAULT_MEMORY_ENTRIES)),
+                max_disk_entries=int(os.environ.get('TRANSLATION_CACHE_DISK_ENTRIES', DEFAULT_DISK_ENTRIES)),
+            )
+        return _cache
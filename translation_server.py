@@ -0,0 +1,372 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import time
+import azure.cognitiveservices.speech as speechsdk
+from dotenv import load_dotenv
+from translator_client import TranslatorError, get_target_languages, get_translator_client
+from translation_cache import get_translation_cache
+from governor import get_governor
+from endpoint_selector import all_selectors, get_endpoint_selector, select_speech_region
+from phrasebook import get_phrasebook
+from single_flight import all_single_flights, get_single_flight
+from tts_pool import DEFAULT_SYNTHESIZERS_PER_VOICE, DEFAULT_VOICE, OUTPUT_FORMAT, get_synthesizer_pool
+from tts_cache import get_audio_cache
+from async_translator import AsyncTranslatorClient
+from fake_speech import FakeStreamRecognizer, FakeSynthesizerPool
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+DEFAULT_PORT = 8765
+DEFAULT_MAX_SESSIONS = 32
+DEFAULT_SAMPLE_RATE = 16000
+# 客户端发送结束后，等待识别服务返回最后结果的最长时间（秒）
+FINISH_TIMEOUT = 15
+# 超过会话数上限时关闭连接使用的状态码（Try Again Later）
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class TranslationServer:
+    """通过WebSocket同时为多个远程说话人提供识别、翻译和朗读
+
+    协议：客户端先发送一条JSON文本消息
+        {"type": "start", "sample_rate": 16000, "language": "zh-CN", "targets": ["en"], "tts": false, "voice": "..."}
+    然后用二进制消息发送16位单声道PCM音频，说完后发送 {"type": "end"}。服务端按顺序返回JSON事件：
+    ready、recognizing、recognized（含这句话在音频中的 offset 和 duration，单位秒）、
+    translated；打开 tts 时在 translated 之后发送 {"type": "audio", "id": ..., "bytes": ...}
+    和一条二进制WAV消息。全部结果发送完毕后返回 session_end 并关闭连接。
+    发送 {"type": "stats"} 可以查询服务端的会话数和CPU占用。
+
+    每个连接有自己的识别器（PushAudioInputStream），翻译客户端、翻译缓存、语音合成器池
+    和语音缓存在所有会话之间共享；每种语音最多同时合成 TTS_SYNTHESIZERS_PER_VOICE 句。
+    同时进行的会话超过 max_sessions 时新的连接会被拒绝。
+    """
+
+    def __init__(self, speech_key=None, speech_region=None, max_sessions=DEFAULT_MAX_SESSIONS, fake_speech=False):
+        self.speech_key = speech_key
+        self.speech_region = speech_region
+        self.max_sessions = max_sessions
+        self.fake_speech = fake_speech
+        self.sessions = 0
+        self.session_ids = itertools.count(1)
+        self.started_wall = time.perf_counter()
+        self.started_cpu = time.process_time()
+
+        self.translation_cache = get_translation_cache()
+        self.phrasebook = get_phrasebook()
+        self.sync_client = None
+        self.async_client = None
+        try:
+            load_dotenv()
+            if os.environ.get('AZURE_TRANSLATOR_KEY') and os.environ.get('AZURE_TRANSLATOR_ENDPOINT'):
+                self.async_client = AsyncTranslatorClient(
+                    os.environ['AZURE_TRANSLATOR_KEY'], os.environ['AZURE_TRANSLATOR_ENDPOINT'],
+                    os.environ.get('AZURE_SPEECH_REGION', 'eastus'),
+                    max_concurrency=int(os.environ.get('TRANSLATOR_MAX_CONCURRENCY', 16)),
+                    cache=self.translation_cache,
+                    governor=get_governor("translator"),
+                    selector=get_endpoint_selector("translator"),
+                    phrasebook=self.phrasebook,
+                    single_flight=get_single_flight("translate"),
+                )
+        except ImportError:
+            pass
+        if self.async_client is None:
+            # 没有安装 aiohttp/httpx 时，在线程池中使用同步客户端
+            self.sync_client = get_translator_client()
+        if fake_speech:
+            self.synthesizer_pool = FakeSynthesizerPool(per_voice=max(
+                1, int(os.environ.get('TTS_SYNTHESIZERS_PER_VOICE', DEFAULT_SYNTHESIZERS_PER_VOICE))))
+        else:
+            self.synthesizer_pool = get_synthesizer_pool()
+        self.audio_cache = get_audio_cache()
+        # 多个会话同时合成同一句话时只请求一次语音服务
+        self.synthesis_flight = get_single_flight("tts")
+
+        # 统计信息
+        self.accepted = 0
+        self.rejected = 0
+        self.utterances = 0
+        self.translation_errors = 0
+
+    def _create_recognizer(self, sample_rate, language):
+        """返回 (音频流, 识别器)；音频流有 write() 和 close()"""
+        if self.fake_speech:
+            recognizer = FakeStreamRecognizer(sample_rate)
+            return recognizer, recognizer
+        stream_format = speechsdk.audio.AudioStreamFormat(samples_per_second=sample_rate, bits_per_sample=16, channels=1)
+        push_stream = speechsdk.audio.PushAudioInputStream(stream_format)
+        # 每个新会话使用当前延迟最低的区域
+        speech_key, speech_region = select_speech_region(self.speech_key, self.speech_region)
+        speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_region)
+        speech_config.speech_recognition_language = language
+        recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config,
+                                                audio_config=speechsdk.audio.AudioConfig(stream=push_stream))
+        return push_stream, recognizer
+
+    async def _translate(self, text, targets):
+        if self.async_client is not None:
+            return await self.async_client.translate_multi(text, "zh-Hans", targets)
+        if self.sync_client is None:
+            raise TranslatorError("请在.env文件中设置AZURE_TRANSLATOR_KEY和AZURE_TRANSLATOR_ENDPOINT")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.sync_client.translate_multi, text, "zh-Hans", targets)
+
+    def _synthesize(self, text, voice_name):
+        """合成一句话，返回WAV数据（优先使用语音缓存，同一句话正在合成时等待那次合成的结果）"""
+        return self.synthesis_flight.do(("synthesize", text, voice_name),
+                                        lambda: self._synthesize_once(text, voice_name))
+
+    def _synthesize_once(self, text, voice_name):
+        key = None
+        if self.audio_cache is not None:
+            key = self.audio_cache.key(text, voice_name, OUTPUT_FORMAT)
+            data = self.audio_cache.get(key)
+            if data is not None:
+                return data
+        # 每句话借用一个合成器，不同会话的句子可以同时合成
+        with self.synthesizer_pool.lease(voice_name) as synthesizer:
+            result = synthesizer.speak_text_async(text).get()
+        if result.reason != speechsdk.ResultReason.SynthesizingAudioCompleted:
+            return None
+        if key is not None and result.audio_data:
+            self.audio_cache.put(key, result.audio_data)
+        return result.audio_data
+
+    def stats(self):
+        wall = time.perf_counter() - self.started_wall
+        cpu = time.process_time() - self.started_cpu
+        return {
+            'type': "stats",
+            'pid': os.getpid(),
+            'sessions': self.sessions,
+            'max_sessions': self.max_sessions,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'utterances': self.utterances,
+            'translation_errors': self.translation_errors,
+            'wall_seconds': wall,
+            'cpu_seconds': cpu,
+            'cache': self.translation_cache.stats() if self.translation_cache is not None else None,
+        }
+
+    async def handle(self, websocket):
+        """一个WebSocket连接"""
+        try:
+            first = await websocket.recv()
+        except websockets.ConnectionClosed:
+            return
+        try:
+            config = json.loads(first) if isinstance(first, str) else {}
+        except ValueError:
+            config = {}
+        if config.get('type') == "stats":
+            await websocket.send(json.dumps(self.stats()))
+            return
+        if config.get('type') != "start":
+            await websocket.close(1003, "first message must be start")
+            return
+        if self.sessions >= self.max_sessions:
+            self.rejected += 1
+            await websocket.send(json.dumps({'type': "error", 'message': "too many sessions"}))
+            await websocket.close(CLOSE_TRY_AGAIN_LATER, "too many sessions")
+            return
+
+        self.sessions += 1
+        self.accepted += 1
+        try:
+            await self._run_session(websocket, config)
+        finally:
+            self.sessions -= 1
+
+    async def _run_session(self, websocket, config):
+        loop = asyncio.get_running_loop()
+        session_id = next(self.session_ids)
+        sample_rate = int(config.get('sample_rate', DEFAULT_SAMPLE_RATE))
+        targets = config.get('targets') or get_target_languages()
+        tts = bool(config.get('tts'))
+        voice_name = config.get('voice') or DEFAULT_VOICE
+        # 选择区域（可能要等测速完成）和创建识别器都会阻塞，放到线程池中
+        stream, recognizer = await loop.run_in_executor(None, self._create_recognizer, sample_rate,
+                                                        config.get('language', "zh-CN"))
+
+        # SDK回调在它自己的线程中执行，事件交给事件循环按顺序发送
+        outgoing = asyncio.Queue()
+        stopped = asyncio.Event()
+        tasks = set()
+        utterance_ids = itertools.count(1)
+
+        def send_soon(message):
+            loop.call_soon_threadsafe(outgoing.put_nowait, message)
+
+        async def translate_and_send(utterance_id, text):
+            started = time.perf_counter()
+            try:
+                translations = await self._translate(text, targets)
+            except Exception as e:
+                self.translation_errors += 1
+                await outgoing.put(json.dumps({'type': "error", 'id': utterance_id, 'message': f"翻译失败: {e}"},
+                                              ensure_ascii=False))
+                return
+            await outgoing.put(json.dumps({
+                'type': "translated", 'id': utterance_id, 'translations': translations,
+                'latency_ms': round((time.perf_counter() - started) * 1000, 1),
+            }, ensure_ascii=False))
+            if tts and self.synthesizer_pool is not None:
+                audio = await loop.run_in_executor(None, self._synthesize, translations[targets[0]], voice_name)
+                if audio:
+                    await outgoing.put(json.dumps({'type': "audio", 'id': utterance_id, 'bytes': len(audio)}))
+                    await outgoing.put(audio)
+
+        def start_translation(utterance_id, text):
+            task = loop.create_task(translate_and_send(utterance_id, text))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        def on_recognizing(evt):
+            send_soon(json.dumps({'type': "recognizing", 'text': evt.result.text}, ensure_ascii=False))
+
+        def on_recognized(evt):
+            if evt.result.reason != speechsdk.ResultReason.RecognizedSpeech or not evt.result.text:
+                return
+            # 只有语气词的句子不发送给客户端，也不翻译和朗读
+            if self.phrasebook is not None and self.phrasebook.is_filler(evt.result.text):
+                return
+            utterance_id = next(utterance_ids)
+            self.utterances += 1
+            send_soon(json.dumps({
+                'type': "recognized", 'id': utterance_id, 'text': evt.result.text,
+                'offset': evt.result.offset / 10_000_000, 'duration': evt.result.duration / 10_000_000,
+            }, ensure_ascii=False))
+            loop.call_soon_threadsafe(start_translation, utterance_id, evt.result.text)
+
+        def on_canceled(evt):
+            details = evt.cancellation_details
+            if details is not None and details.reason == speechsdk.CancellationReason.Error:
+                send_soon(json.dumps({'type': "error", 'message': f"识别出错: {details.error_details}"},
+                                     ensure_ascii=False))
+
+        recognizer.recognizing.connect(on_recognizing)
+        recognizer.recognized.connect(on_recognized)
+        recognizer.canceled.connect(on_canceled)
+        recognizer.session_stopped.connect(lambda evt: loop.call_soon_threadsafe(stopped.set))
+
+        async def sender():
+            while True:
+                message = await outgoing.get()
+                if message is None:
+                    return
+                await websocket.send(message)
+
+        sender_task = loop.create_task(sender())
+        stream_closed = False
+        try:
+            await loop.run_in_executor(None, lambda: recognizer.start_continuous_recognition_async().get())
+            await outgoing.put(json.dumps({'type': "ready", 'session': session_id}))
+            finished = False
+            async for message in websocket:
+                if isinstance(message, bytes):
+                    stream.write(message)
+                    continue
+                try:
+                    command = json.loads(message)
+                except ValueError:
+                    continue
+                if command.get('type') == "end":
+                    finished = True
+                    break
+            stream_closed = True
+            stream.close()
+            if finished:
+                # 等识别服务处理完剩余的音频，再等所有翻译完成
+                try:
+                    await asyncio.wait_for(stopped.wait(), FINISH_TIMEOUT)
+                except asyncio.TimeoutError:
+                    pass
+                if tasks:
+                    await asyncio.wait(list(tasks))
+                await outgoing.put(json.dumps({'type': "session_end", 'session': session_id}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            # 连接意外断开时也要关闭音频流、停止识别，否则识别会话一直占用
+            if not stream_closed:
+                stream.close()
+            try:
+                await loop.run_in_executor(None, lambda: recognizer.stop_continuous_recognition_async().get())
+            except Exception as e:
+                print(f"会话 {session_id} 停止识别失败: {e}")
+            for task in list(tasks):
+                task.cancel()
+            await outgoing.put(None)
+            try:
+                await sender_task
+            except websockets.ConnectionClosed:
+                pass
+
+    def report(self):
+        s = self.stats()
+        cores = s['cpu_seconds'] / s['wall_seconds'] if s['wall_seconds'] > 0 else 0.0
+        return (
+            f"翻译服务: 接受 {s['accepted']} 个会话  拒绝 {s['rejected']} 个  识别 {s['utterances']} 句  "
+            f"翻译失败 {s['translation_errors']} 次  平均CPU占用 {cores:.2f} 核"
+        )
+
+    async def close(self):
+        if self.async_client is not None:
+            await self.async_client.close()
+
+
+async def serve(server, host, port):
+    try:
+        async with websockets.serve(server.handle, host, port, max_size=2 ** 20):
+            print(f"翻译服务已启动: ws://{host}:{port}  最多 {server.max_sessions} 个会话，按Ctrl+C退出")
+            await asyncio.Future()
+    finally:
+        await server.close()
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="通过WebSocket同时为多个远程说话人提供识别、翻译和朗读")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.environ.get('SERVER_PORT', DEFAULT_PORT)))
+    parser.add_argument("--max-sessions", type=int, default=int(os.environ.get('SERVER_MAX_SESSIONS', DEFAULT_MAX_SESSIONS)))
+    parser.add_argument("--speech", choices=["azure", "fake"], default="azure",
+                        help="fake 使用假的识别器和语音合成器（压力测试用）")
+    args = parser.parse_args()
+
+    if websockets is None:
+        print("错误：翻译服务需要安装 websockets（pip install websockets）")
+        return
+
+    speech_key = os.environ.get('AZURE_SPEECH_KEY')
+    speech_region = os.environ.get('AZURE_SPEECH_REGION')
+    if args.speech == "azure" and (not speech_key or not speech_region):
+        print("错误：请在.env文件中设置AZURE_SPEECH_KEY和AZURE_SPEECH_REGION")
+        return
+
+    server = TranslationServer(speech_key, speech_region, args.max_sessions, fake_speech=args.speech == "fake")
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(server.report())
+        if server.translation_cache:
+            print(server.translation_cache.report())
+        print(get_governor("translator").report())
+        for selector in all_selectors():
+            print(selector.report())
+        if server.phrasebook is not None:
+            print(server.phrasebook.report())
+        for flight in all_single_flights():
+            print(flight.report())
+
+if __name__ == "__main__":
+    main()
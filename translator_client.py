@@ -0,0 +1,319 @@
+import os
+import threading
+import uuid
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from translation_cache import get_translation_cache
+from translation_batcher import TranslationBatcher
+from governor import get_governor
+from endpoint_selector import get_endpoint_selector
+from phrasebook import get_phrasebook
+from single_flight import get_single_flight
+
+# 建立连接和等待响应的超时时间（秒）
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+# 连接池中保持的长连接数量
+POOL_SIZE = 8
+# 可以重试的HTTP状态码：超时、限流和服务端错误
+RETRYABLE_STATUS = (408, 429, 500, 502, 503, 504)
+
+
+class TranslatorError(Exception):
+    """翻译服务返回了无法使用的结果"""
+
+
+def billed_chars(texts, target_languages):
+    """翻译服务按字符计费，每个目标语言都计算一次"""
+    return sum(len(text) for text in texts) * len(target_languages)
+
+
+def parse_translations(result, count, target_languages):
+    """把翻译服务的响应转换成与请求文本一一对应的 {目标语言: 译文} 列表"""
+    if not isinstance(result, list) or len(result) != count:
+        raise TranslatorError("翻译结果格式不正确")
+    translations = []
+    for item in result:
+        by_language = {t.get('to'): t.get('text') for t in item.get('translations', [])}
+        if len(target_languages) == 1 and len(by_language) == 1:
+            # 只有一个目标语言时，兼容不带 to 字段的响应
+            by_language = {target_languages[0]: next(iter(by_language.values()))}
+        if any(by_language.get(language) is None for language in target_languages):
+            raise TranslatorError("翻译结果格式不正确")
+        translations.append(by_language)
+    return translations
+
+
+def classify_error(error):
+    """判断翻译请求的错误是否可以重试，返回 (是否可以重试, Retry-After秒数或None, 是否被限流)"""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True, None, False
+    response = getattr(error, 'response', None)
+    if isinstance(error, requests.HTTPError) and response is not None:
+        if response.status_code not in RETRYABLE_STATUS:
+            return False, None, False
+        retry_after = None
+        try:
+            retry_after = float(response.headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            pass
+        return True, retry_after, response.status_code == 429
+    return False, None, False
+
+
+class TranslatorClient:
+    """Azure翻译服务客户端
+
+    配置只在创建时读取一次，请求通过同一个 requests.Session 发送，
+    TCP/TLS 连接在多次翻译之间复用，不必每句话都重新握手。
+    传入 cache（TranslationCache）时先查缓存，命中就不再请求翻译服务。
+    传入 governor（Governor）时请求按配额限速，限流和服务端错误会退避重试，连续失败时熔断。
+    传入 selector（EndpointSelector）时请求发往当前最快的端点，慢请求会向下一个端点对冲，
+    translator_endpoint 只在没有 selector 时使用。
+    传入 phrasebook（Phrasebook）时整句命中短语表的文本直接返回本地译文，句中的术语加上动态词典标记。
+    传入 single_flight（SingleFlight）时，同一段文本已经在翻译的调用等待那次请求的结果，不再重复请求。
+    """
+
+    def __init__(self, translator_key, translator_endpoint, region,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, pool_size=POOL_SIZE, cache=None,
+                 governor=None, selector=None, phrasebook=None, single_flight=None):
+        self.url = translator_endpoint.rstrip('/') + '/translate'
+        self.cache = cache
+        self.phrasebook = phrasebook
+        self.governor = governor
+        self.selector = selector
+        self.single_flight = single_flight
+        self.timeout = (connect_timeout, read_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Ocp-Apim-Subscription-Key': translator_key,
+            'Ocp-Apim-Subscription-Region': region,
+            'Content-type': 'application/json',
+        })
+
+    def _post(self, texts, source_language, target_languages):
+        """发送一个翻译请求，返回与 texts 一一对应的 {目标语言: 译文} 列表"""
+        params = {
+            'api-version': '3.0',
+            'from': source_language,
+            'to': list(target_languages)  # 多个目标语言会编码成重复的 to 参数
+        }
+        headers = {
+            'X-ClientTraceId': str(uuid.uuid4())
+        }
+        body = [{'text': text} for text in texts]
+
+        def send(endpoint=None):
+            url = endpoint.address + '/translate' if endpoint is not None else self.url
+            response = self.session.post(url, params=params, headers=headers, json=body, timeout=self.timeout)
+            response.raise_for_status()  # 如果请求失败，抛出异常
+            return response.json()
+
+        attempt = send
+        if self.selector is not None:
+            attempt = lambda: self.selector.call(send, classify_error)
+        if self.governor is not None:
+            result = self.governor.call(attempt, billed_chars(texts, target_languages), classify_error)
+        else:
+            result = attempt()
+        return parse_translations(result, len(texts), target_languages)
+
+    def _protect(self, text, source_language, target_language):
+        """返回实际发送给翻译服务的文本（术语加上动态词典标记）"""
+        if self.phrasebook is None:
+            return text
+        return self.phrasebook.protect(text, source_language, target_language)
+
+    def translate(self, text, source_language="zh-Hans", target_language="en"):
+        """翻译一段文本，失败时抛出异常"""
+        return self.translate_multi(text, source_language, [target_language])[target_language]
+
+    def translate_multi(self, text, source_language="zh-Hans", target_languages=("en",), store=True):
+        """在一个请求中把一段文本翻译成多种目标语言，返回 {目标语言: 译文}
+
+        store 为 False 时（例如推测翻译的半句话）翻译服务返回的译文不写入缓存。
+        """
+        if self.single_flight is None:
+            translations, fetched = self._translate_multi(text, source_language, target_languages)
+        else:
+            # 多个调用者同时翻译同一段文本时共用一个请求，每个调用者得到自己的一份结果
+            translations, fetched = self.single_flight.do(
+                (text, source_language, tuple(target_languages)),
+                lambda: self._translate_multi(text, source_language, target_languages))
+        if store and self.cache is not None:
+            # 缓存仍以原文为键
+            for language in fetched:
+                self.cache.put(text, source_language, language, translations[language])
+        return dict(translations)
+
+    def _translate_multi(self, text, source_language, target_languages):
+        """返回 ({目标语言: 译文}, 由翻译服务翻译的目标语言列表)"""
+        if self.phrasebook is not None:
+            local = self.phrasebook.lookup(text, source_language, target_languages)
+            if local is not None:
+                return local, []
+
+        translations = {}
+        missing = []
+        for language in target_languages:
+            cached = self.cache.get(text, source_language, language) if self.cache is not None else None
+            if cached is not None:
+                translations[language] = cached
+            else:
+                missing.append(language)
+
+        # 术语的译法随目标语言不同，标记后文本相同的目标语言放在同一个请求中（没有术语时只有一个请求）
+        groups = {}
+        for language in missing:
+            groups.setdefault(self._protect(text, source_language, language), []).append(language)
+        for request_text, languages in groups.items():
+            result = self._post([request_text], source_language, languages)[0]
+            for language in languages:
+                translations[language] = result[language]
+        return {language: translations[language] for language in target_languages}, missing
+
+    def translate_batch(self, texts, source_language="zh-Hans", target_language="en"):
+        """在一个请求中翻译多段文本（请求体为多个元素的数组），按输入顺序返回译文列表"""
+        translations = [None] * len(texts)
+        missing = []
+        for index, text in enumerate(texts):
+            local = self.phrasebook.lookup(text, source_language, [target_language]) \
+                if self.phrasebook is not None else None
+            if local is not None:
+                translations[index] = local[target_language]
+                continue
+            cached = self.cache.get(text, source_language, target_language) if self.cache is not None else None
+            if cached is not None:
+                translations[index] = cached
+            else:
+                missing.append(index)
+        if not missing:
+            return translations
+
+        result = self._post([self._protect(texts[index], source_language, target_language) for index in missing],
+                            source_language, [target_language])
+        for index, by_language in zip(missing, result):
+            translations[index] = by_language[target_language]
+            if self.cache is not None:
+                self.cache.put(texts[index], source_language, target_language, translations[index])
+        return translations
+
+    def close(self):
+        self.session.close()
+
+
+# 常用目标语言的显示名称
+LANGUAGE_NAMES = {
+    'en': '英文',
+    'ja': '日文',
+    'ko': '韩文',
+    'fr': '法文',
+    'de': '德文',
+    'es': '西班牙文',
+    'ru': '俄文',
+    'zh-Hans': '中文',
+}
+
+
+def language_display_name(language):
+    return LANGUAGE_NAMES.get(language, language)
+
+
+def get_target_languages():
+    """从环境变量 TARGET_LANGUAGES 读取目标语言列表（逗号分隔），默认只翻译成英文"""
+    load_dotenv()
+    languages = [language.strip() for language in os.environ.get('TARGET_LANGUAGES', 'en').split(',')]
+    return [language for language in languages if language] or ['en']
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_translator_client():
+    """返回进程内共享的翻译客户端，第一次调用时从.env加载配置；配置缺失时返回None"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            load_dotenv()
+            translator_key = os.environ.get('AZURE_TRANSLATOR_KEY')
+            translator_endpoint = os.environ.get('AZURE_TRANSLATOR_ENDPOINT')
+            if not translator_key or not translator_endpoint:
+                return None
+            region = os.environ.get('AZURE_SPEECH_REGION', 'eastus')
+            _client = TranslatorClient(translator_key, translator_endpoint, region, cache=get_translation_cache(),
+                                       governor=get_governor("translator"),
+                                       selector=get_endpoint_selector("translator"),
+                                       phrasebook=get_phrasebook(),
+                                       single_flight=get_single_flight("translate"))
+        return _client
+
+
+_batcher = None
+
+
+def get_translation_batcher():
+    """TRANSLATION_BATCH_WINDOW_MS 大于0时返回共享的请求合并器，否则返回None"""
+    global _batcher
+    client = get_translator_client()
+    with _client_lock:
+        if _batcher is None and client is not None:
+            window_ms = float(os.environ.get('TRANSLATION_BATCH_WINDOW_MS', 0))
+            if window_ms <= 0:
+                return None
+            _batcher = TranslationBatcher(
+                client,
+                single_flight=client.single_flight,
+                window=window_ms / 1000,
+                max_items=int(os.environ.get('TRANSLATION_BATCH_MAX_ITEMS', 100)),
+                max_chars=int(os.environ.get('TRANSLATION_BATCH_MAX_CHARS', 10000)),
+            )
+        return _batcher
+
+
+def translate_text(text, source_language="zh-Hans", target_language="en"):
+    """使用Azure翻译服务将文本从源语言翻译为目标语言，失败时返回None"""
+    client = get_translator_client()
+    if client is None:
+        print("错误：请在.env文件中设置AZURE_TRANSLATOR_KEY和AZURE_TRANSLATOR_ENDPOINT")
+        return None
+
+    try:
+        # 开启请求合并时，同一时间窗口内的多个句子会合并成一个请求发送
+        batcher = get_translation_batcher()
+        if batcher is not None:
+            return batcher.translate(text, source_language, target_language)
+        return client.translate(text, source_language, target_language)
+    except TranslatorError as e:
+        print(e)
+        return None
+    except Exception as e:
+        print(f"翻译过程中发生错误: {e}")
+        return None
+
+
+def translate_text_multi(text, source_language="zh-Hans", target_languages=("en",)):
+    """在一个请求中把文本翻译成多种目标语言，返回 {目标语言: 译文}，失败时返回None"""
+    client = get_translator_client()
+    if client is None:
+        print("错误：请在.env文件中设置AZURE_TRANSLATOR_KEY和AZURE_TRANSLATOR_ENDPOINT")
+        return None
+
+    try:
+        if len(target_languages) == 1:
+            # 只有一个目标语言时走普通路径（可以与其他句子合并发送）
+            batcher = get_translation_batcher()
+            if batcher is not None:
+                return {target_languages[0]: batcher.translate(text, source_language, target_languages[0])}
+        return client.translate_multi(text, source_language, target_languages)
+    except TranslatorError as e:
+        print(e)
+        return None
+    except Exception as e:
+        print(f"翻译过程中发生错误: {e}")
+        return None
@@ -0,0 +1,248 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import wave
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+try:
+    import winsound
+except ImportError:
+    winsound = None
+
+try:
+    import simpleaudio
+except ImportError:
+    simpleaudio = None
+
+DEFAULT_CACHE_DIR = "tts_cache"
+DEFAULT_MAX_DISK_BYTES = 200 * 1024 * 1024   # 磁盘缓存上限
+DEFAULT_MAX_MEMORY_BYTES = 20 * 1024 * 1024  # 内存缓存上限
+# 本地播放时多久检查一次是否被打断（秒）
+PLAYBACK_POLL_SECONDS = 0.02
+
+
+def can_play_audio():
+    """本地是否可以直接播放缓存的音频（Windows自带winsound，其他平台需要安装simpleaudio）"""
+    return winsound is not None or simpleaudio is not None
+
+
+def play_wav(data, interrupted=None):
+    """在默认扬声器上播放WAV音频，播放完毕后返回True；无法播放时返回False
+
+    传入 interrupted（threading.Event）时，其他线程设置它可以打断播放，这时返回None。
+    """
+    if winsound is not None:
+        if interrupted is None:
+            winsound.PlaySound(data, winsound.SND_MEMORY)
+            return True
+        return _play_winsound_async(data, interrupted)
+    if simpleaudio is not None:
+        with wave.open(io.BytesIO(data)) as wav:
+            frames = wav.readframes(wav.getnframes())
+            play = simpleaudio.play_buffer(frames, wav.getnchannels(), wav.getsampwidth(), wav.getframerate())
+        if interrupted is None:
+            play.wait_done()
+            return True
+        while play.is_playing():
+            if interrupted.wait(PLAYBACK_POLL_SECONDS):
+                play.stop()
+                return None
+        return True
+    return False
+
+
+def _play_winsound_async(data, interrupted):
+    # winsound 不能异步播放内存中的音频，先写到临时文件，再用 SND_PURGE 停止
+    with wave.open(io.BytesIO(data)) as wav:
+        seconds = wav.getnframes() / wav.getframerate()
+    fd, path = tempfile.mkstemp(suffix=".wav")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        winsound.PlaySound(path, winsound.SND_FILENAME | winsound.SND_ASYNC | winsound.SND_NODEFAULT)
+        if interrupted.wait(seconds + PLAYBACK_POLL_SECONDS):
+            winsound.PlaySound(None, winsound.SND_PURGE)
+            return None
+        return True
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class AudioCache:
+    """按内容寻址的合成音频缓存
+
+    以 hash(文本, 语音, 输出格式, 是否SSML) 为键，音频保存在内存（LRU）和磁盘
+    目录中。两层都有字节数上限，超过时淘汰最久未使用的音频。多个进程可以共用同一个
+    目录：文件写完后才改名到位，其他进程写入的音频在 get() 时也会被找到。
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_disk_bytes=DEFAULT_MAX_DISK_BYTES,
+                 max_memory_bytes=DEFAULT_MAX_MEMORY_BYTES):
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+
+        # 磁盘上的条目按最近使用时间排序
+        self.disk = OrderedDict()
+        self.disk_bytes = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            entries = []
+            for name in os.listdir(directory):
+                if name.endswith(".wav"):
+                    path = os.path.join(directory, name)
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, name[:-4], stat.st_size))
+            for _, key, size in sorted(entries):
+                self.disk[key] = size
+                self.disk_bytes += size
+
+    @staticmethod
+    def key(text, voice_name, output_format, ssml=False):
+        content = "\0".join([voice_name, str(output_format), "ssml" if ssml else "text", text])
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".wav")
+
+    def _adopt(self, key):
+        """磁盘索引中没有时检查文件是否已经由其他进程写入"""
+        if not self.directory or key in self.disk:
+            return key in self.disk
+        try:
+            size = os.path.getsize(self._path(key))
+        except OSError:
+            return False
+        self.disk[key] = size
+        self.disk_bytes += size
+        return True
+
+    def contains(self, key):
+        with self.lock:
+            return key in self.memory or self._adopt(key)
+
+    def get(self, key):
+        """查找音频，未命中时返回None"""
+        with self.lock:
+            data = self.memory.get(key)
+            if data is not None:
+                self.memory.move_to_end(key)
+            elif self._adopt(key):
+                try:
+                    with open(self._path(key), "rb") as f:
+                        data = f.read()
+                    os.utime(self._path(key))
+                    self.disk.move_to_end(key)
+                    self._remember(key, data)
+                except OSError:
+                    self.disk_bytes -= self.disk.pop(key)
+                    data = None
+
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.bytes_saved += len(data)
+            return data
+
+    def put(self, key, data):
+        """保存一段合成好的音频"""
+        if not data:
+            return
+        with self.lock:
+            self._remember(key, data)
+            if not self.directory or key in self.disk:
+                return
+            # 先写到临时文件再改名，其他进程不会读到写了一半的音频
+            temp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+            try:
+                with open(temp_path, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, self._path(key))
+            except OSError as e:
+                print(f"写入语音缓存失败: {e}")
+                return
+            self.disk[key] = len(data)
+            self.disk_bytes += len(data)
+            while self.disk_bytes > self.max_disk_bytes and len(self.disk) > 1:
+                old_key, size = self.disk.popitem(last=False)
+                self.disk_bytes -= size
+                self.evictions += 1
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+
+    def _remember(self, key, data):
+        if key in self.memory:
+            self.memory_bytes -= len(self.memory.pop(key))
+        self.memory[key] = data
+        self.memory_bytes += len(data)
+        while self.memory_bytes > self.max_memory_bytes and len(self.memory) > 1:
+            _, old = self.memory.popitem(last=False)
+            self.memory_bytes -= len(old)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'bytes_saved': self.bytes_saved,
+                'evictions': self.evictions,
+                'memory_bytes': self.memory_bytes,
+                'disk_bytes': self.disk_bytes,
+            }
+
+    def report(self):
+        s = self.stats()
+        return (
+            f"语音缓存: 命中 {s['hits']}  未命中 {s['misses']}  命中率 {s['hit_ratio'] * 100:.1f}%  "
+            f"节省 {s['bytes_saved'] / 1024:.0f} KB  淘汰 {s['evictions']}  "
+            f"占用 {s['memory_bytes'] / 1024:.0f} KB (内存) / {s['disk_bytes'] / 1024:.0f} KB (磁盘)"
+        )
+
+
+def load_phrases(path):
+    """读取常用短语文件，每行一个短语，忽略空行和#开头的注释"""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+_cache = None
+_cache_checked = False
+_cache_lock = threading.Lock()
+
+
+def get_audio_cache():
+    """返回进程内共享的语音缓存；TTS_CACHE=off 或本地无法播放音频时返回None"""
+    global _cache, _cache_checked
+    with _cache_lock:
+        if not _cache_checked:
+            _cache_checked = True
+            load_dotenv()
+            if os.environ.get('TTS_CACHE', 'on').strip().lower() in ('off', '0', 'false', 'no'):
+                return None
+            if not can_play_audio():
+                print("提示：未找到可以播放缓存音频的模块（Windows自带winsound，其他平台可安装simpleaudio），语音缓存未启用")
+                return None
+            _cache = AudioCache(
+                directory=os.environ.get('TTS_CACHE_DIR', DEFAULT_CACHE_DIR),
+                max_disk_bytes=int(float(os.environ.get('TTS_CACHE_MAX_MB', DEFAULT_MAX_DISK_BYTES / 1024 / 1024)) * 1024 * 1024),
+            )
+        return _cache
@@ -0,0 +1,174 @@
+import os
+import threading
+from contextlib import contextmanager
+import azure.cognitiveservices.speech as speechsdk
+from dotenv import load_dotenv
+from tts_cache import get_audio_cache, load_phrases
+from endpoint_selector import select_speech_region
+
+DEFAULT_VOICE = "en-US-JennyNeural"
+# 合成音频的输出格式（WAV），缓存的音频可以直接在本地播放
+OUTPUT_FORMAT = speechsdk.SpeechSynthesisOutputFormat.Riff24Khz16BitMonoPcm
+# lease() 每种语音最多同时借出的内存合成器数（一个合成器同一时间只合成一句话）
+DEFAULT_SYNTHESIZERS_PER_VOICE = 4
+
+
+def voice_language(voice_name):
+    """从语音名称中取出语言代码，例如 en-US-JennyNeural -> en-US"""
+    parts = voice_name.split("-")
+    return parts[0] + "-" + parts[1]
+
+
+class SynthesizerPool:
+    """按语音名称缓存的语音合成器池
+
+    每种语音只创建一次 SpeechConfig 和 SpeechSynthesizer，并通过
+    Connection.open 提前建立到语音服务的连接，之后每句话都复用，
+    不必在朗读前重新创建对象和连接。
+
+    一个合成器的请求按顺序排队，多个会话共用 get() 返回的合成器时合成是串行的。
+    服务模式用 lease() 借用只输出到内存的合成器：每种语音最多 per_voice 个，
+    用完归还给下一句话复用，都在使用时等待。
+    """
+
+    def __init__(self, speech_key, speech_region, per_voice=DEFAULT_SYNTHESIZERS_PER_VOICE):
+        self.speech_key = speech_key
+        self.speech_region = speech_region
+        self.per_voice = per_voice
+        self.lock = threading.Lock()
+        # 保证 get() 每种语音只创建一个合成器；建立连接较慢，期间不占用 self.lock
+        self.create_lock = threading.Lock()
+        self.synthesizers = {}
+        self.connections = []
+        # lease() 用的空闲合成器和每种语音的信号量
+        self.idle = {}
+        self.slots = {}
+
+    def _create(self, voice_name, to_speaker):
+        """创建合成器并预先建立连接"""
+        # 新的合成器使用当前延迟最低的区域
+        speech_key, speech_region = select_speech_region(self.speech_key, self.speech_region)
+        speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_region)
+        speech_config.speech_synthesis_language = voice_language(voice_name)
+        speech_config.speech_synthesis_voice_name = voice_name
+        speech_config.set_speech_synthesis_output_format(OUTPUT_FORMAT)
+
+        if to_speaker:
+            # 创建语音合成器，使用默认扬声器作为音频输出
+            synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config)
+        else:
+            synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+        connection = speechsdk.Connection.from_speech_synthesizer(synthesizer)
+        connection.open(True)
+        with self.lock:
+            self.connections.append(connection)
+        return synthesizer
+
+    def get(self, voice_name=DEFAULT_VOICE, to_speaker=True):
+        """返回指定语音的合成器，不存在时创建并预先建立连接
+
+        to_speaker 为 False 时返回只输出到内存的合成器（结果在 result.audio_data 中，不播放）。
+        """
+        key = (voice_name, to_speaker)
+        with self.create_lock:
+            synthesizer = self.synthesizers.get(key)
+            if synthesizer is None:
+                synthesizer = self._create(voice_name, to_speaker)
+                self.synthesizers[key] = synthesizer
+            return synthesizer
+
+    @contextmanager
+    def lease(self, voice_name=DEFAULT_VOICE):
+        """借用一个只输出到内存的合成器，with 块结束时归还
+
+        同一种语音的多句话可以同时合成；借出的合成器已经有 per_voice 个时等待归还。
+        """
+        with self.lock:
+            slots = self.slots.setdefault(voice_name, threading.BoundedSemaphore(self.per_voice))
+        slots.acquire()
+        try:
+            with self.lock:
+                idle = self.idle.setdefault(voice_name, [])
+                synthesizer = idle.pop() if idle else None
+            if synthesizer is None:
+                synthesizer = self._create(voice_name, False)
+            try:
+                yield synthesizer
+            finally:
+                with self.lock:
+                    self.idle.setdefault(voice_name, []).append(synthesizer)
+        finally:
+            slots.release()
+
+    def warm_up(self, voice_names):
+        """启动时预先创建并连接这些语音的合成器，失败只打印错误"""
+        for voice_name in voice_names:
+            try:
+                self.get(voice_name)
+            except Exception as e:
+                print(f"预热语音合成器失败 ({voice_name}): {e}")
+
+    def preload(self, phrases, voice_name, audio_cache):
+        """把常用短语预先合成到语音缓存中（只合成不播放），已缓存的短语会跳过"""
+        synthesizer = None
+        loaded = 0
+        for phrase in phrases:
+            key = audio_cache.key(phrase, voice_name, OUTPUT_FORMAT)
+            if audio_cache.contains(key):
+                continue
+            try:
+                if synthesizer is None:
+                    synthesizer = self.get(voice_name, to_speaker=False)
+                result = synthesizer.speak_text_async(phrase).get()
+                if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+                    audio_cache.put(key, result.audio_data)
+                    loaded += 1
+            except Exception as e:
+                print(f"预加载短语失败 ({phrase}): {e}")
+        return loaded
+
+    def close(self):
+        with self.lock:
+            for connection in self.connections:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+            self.connections.clear()
+            self.synthesizers.clear()
+            self.idle.clear()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_synthesizer_pool():
+    """返回进程内共享的语音合成器池，语音服务配置缺失时返回None"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            load_dotenv()
+            speech_key = os.environ.get('AZURE_SPEECH_KEY')
+            speech_region = os.environ.get('AZURE_SPEECH_REGION')
+            if not speech_key or not speech_region:
+                return None
+            _pool = SynthesizerPool(speech_key, speech_region, per_voice=max(
+                1, int(os.environ.get('TTS_SYNTHESIZERS_PER_VOICE', DEFAULT_SYNTHESIZERS_PER_VOICE))))
+        return _pool
+
+
+def preload_common_phrases(synthesizer_pool, voice_name=DEFAULT_VOICE):
+    """如果在.env中设置了 TTS_PRELOAD_PHRASES（短语文件路径），把其中的短语预先合成到语音缓存"""
+    path = os.environ.get('TTS_PRELOAD_PHRASES')
+    audio_cache = get_audio_cache()
+    if not path or audio_cache is None:
+        return 0
+    try:
+        phrases = load_phrases(path)
+    except OSError as e:
+        print(f"读取常用短语文件失败: {e}")
+        return 0
+    loaded = synthesizer_pool.preload(phrases, voice_name, audio_cache)
+    print(f"已预加载 {loaded} 条常用短语的语音")
+    return loaded
@@ -0,0 +1,199 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+# 丢弃策略：latest 只朗读最新的一句（新句子到达时丢弃还在排队的旧句子），
+# fifo 按顺序朗读，排队超过 max_backlog 句时丢弃最早的一句
+POLICY_LATEST = "latest"
+POLICY_FIFO = "fifo"
+DEFAULT_MAX_BACKLOG = 3
+
+# 优先级：手动重新朗读排在自动朗读之前
+PRIORITY_REPLAY = 0
+PRIORITY_AUTO = 1
+
+# 丢弃原因的显示名称
+DROP_REASONS = {
+    'replaced': "被新句子取代",
+    'backlog': "积压过多",
+    'stale': "等待过久",
+    'cleared': "停止时清空",
+}
+
+
+class SpeechItem:
+    """一句等待朗读的文本"""
+
+    def __init__(self, text, voice_name, priority, timing=None, on_done=None):
+        self.text = text
+        self.voice_name = voice_name
+        self.priority = priority
+        self.timing = timing
+        self.on_done = on_done
+        self.created = time.perf_counter()
+
+
+class SpeechQueue:
+    """由一个长期运行的线程按优先级朗读队列中的文本
+
+    speak(text, voice_name, timing) 在朗读线程中调用，返回是否朗读成功（被打断时返回None）；
+    stop() 在其他线程中调用，打断正在进行的朗读（例如 StreamingSpeaker.stop，使用 stop_speaking_async）。
+    自动朗读的句子按 policy 丢弃：latest 只保留最新的一句，fifo 最多积压 max_backlog 句；
+    max_age 大于0时，排队超过 max_age 秒的句子不再朗读。replay() 的手动朗读不会被丢弃，
+    它会打断正在进行的自动朗读并排在所有自动朗读之前。每一句（包括被丢弃的）最后都会
+    调用 on_done(item, spoken)。
+    """
+
+    def __init__(self, speak, stop, policy=POLICY_LATEST, max_backlog=DEFAULT_MAX_BACKLOG, max_age=0):
+        self.speak = speak
+        self.stop = stop
+        self.policy = policy
+        self.max_backlog = max_backlog
+        self.max_age = max_age
+        self.condition = threading.Condition()
+        self.heap = []
+        self.sequence = itertools.count()
+        self.current = None
+        self.running = True
+
+        # 统计信息
+        self.spoken = 0
+        self.interrupted = 0
+        self.dropped = {reason: 0 for reason in DROP_REASONS}
+        self.max_depth = 0
+
+        self.thread = threading.Thread(target=self._run, name="tts-queue", daemon=True)
+        self.thread.start()
+
+    def _push(self, item):
+        heapq.heappush(self.heap, (item.priority, next(self.sequence), item))
+        self.max_depth = max(self.max_depth, len(self.heap))
+        self.condition.notify()
+
+    def _remove(self, entries, reason):
+        """从队列中移除 entries，返回被丢弃的句子（在锁外调用它们的 on_done）"""
+        removed = {id(entry) for entry in entries}
+        self.heap = [entry for entry in self.heap if id(entry) not in removed]
+        heapq.heapify(self.heap)
+        self.dropped[reason] += len(entries)
+        return [entry[2] for entry in entries]
+
+    def say(self, text, voice_name, timing=None, on_done=None):
+        """自动朗读一句译文"""
+        item = SpeechItem(text, voice_name, PRIORITY_AUTO, timing, on_done)
+        with self.condition:
+            waiting = sorted(entry for entry in self.heap if entry[0] == PRIORITY_AUTO)
+            if self.policy == POLICY_LATEST:
+                dropped = self._remove(waiting, 'replaced')
+            elif self.max_backlog > 0 and len(waiting) >= self.max_backlog:
+                dropped = self._remove(waiting[:len(waiting) - self.max_backlog + 1], 'backlog')
+            else:
+                dropped = []
+            self._push(item)
+        self._finish(dropped, False)
+
+    def replay(self, text, voice_name, on_done=None):
+        """手动重新朗读：打断正在进行的自动朗读，排在所有自动朗读之前"""
+        item = SpeechItem(text, voice_name, PRIORITY_REPLAY, on_done=on_done)
+        with self.condition:
+            self._push(item)
+            interrupt = self.current is not None and self.current.priority == PRIORITY_AUTO
+        if interrupt:
+            self.stop()
+
+    def clear(self, stop_current=True):
+        """丢弃所有还在排队的句子，stop_current 为 True 时同时打断正在进行的朗读"""
+        with self.condition:
+            dropped = self._remove(list(self.heap), 'cleared')
+            interrupt = stop_current and self.current is not None
+        if interrupt:
+            self.stop()
+        self._finish(dropped, False)
+
+    def _finish(self, items, spoken):
+        for item in items:
+            if item.on_done is not None:
+                item.on_done(item, spoken)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.heap:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                item = heapq.heappop(self.heap)[2]
+                stale = (item.priority == PRIORITY_AUTO and self.max_age > 0 and
+                         time.perf_counter() - item.created > self.max_age)
+                if stale:
+                    self.dropped['stale'] += 1
+                else:
+                    self.current = item
+            if stale:
+                self._finish([item], False)
+                continue
+
+            spoken = False
+            try:
+                spoken = self.speak(item.text, item.voice_name, item.timing)
+            except Exception as e:
+                print(f"朗读过程中发生错误: {e}")
+            finally:
+                with self.condition:
+                    self.current = None
+                    if spoken:
+                        self.spoken += 1
+                    elif spoken is None:
+                        self.interrupted += 1
+                self._finish([item], bool(spoken))
+
+    @property
+    def speaking(self):
+        with self.condition:
+            return self.current is not None
+
+    def depth(self):
+        """还在排队等待朗读的句数"""
+        with self.condition:
+            return len(self.heap)
+
+    def stats(self):
+        with self.condition:
+            return {
+                'policy': self.policy,
+                'depth': len(self.heap),
+                'max_depth': self.max_depth,
+                'spoken': self.spoken,
+                'interrupted': self.interrupted,
+                'dropped': dict(self.dropped),
+            }
+
+    def report(self):
+        s = self.stats()
+        dropped = "  ".join(f"{DROP_REASONS[reason]} {count}" for reason, count in s['dropped'].items() if count)
+        return (
+            f"朗读队列({s['policy']}): 朗读 {s['spoken']} 句  被打断 {s['interrupted']} 句  "
+            f"丢弃 {sum(s['dropped'].values())} 句（{dropped or '无'}）  最大队列深度 {s['max_depth']}"
+        )
+
+    def close(self):
+        self.clear()
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join(timeout=5)
+
+
+def get_speech_queue_settings():
+    """从.env读取朗读队列的设置，返回 (policy, max_backlog, max_age)"""
+    load_dotenv()
+    policy = os.environ.get('TTS_QUEUE_POLICY', POLICY_LATEST).strip().lower()
+    if policy not in (POLICY_LATEST, POLICY_FIFO):
+        print(f"未知的朗读队列策略 {policy}，使用 {POLICY_LATEST}")
+        policy = POLICY_LATEST
+    max_backlog = int(os.environ.get('TTS_MAX_BACKLOG', DEFAULT_MAX_BACKLOG))
+    max_age = float(os.environ.get('TTS_MAX_AGE_SECONDS', 0) or 0)
+    return policy, max_backlog, max_age
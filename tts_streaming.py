@@ -0,0 +1,201 @@
+import re
+import threading
+import time
+import azure.cognitiveservices.speech as speechsdk
+from tts_cache import get_audio_cache, play_wav
+from tts_pool import OUTPUT_FORMAT, get_synthesizer_pool
+from single_flight import get_single_flight
+
+# 句子结束的位置：中文标点之后；英文标点只有后面是空白或文本结尾时才算（3.5、U.S. 不切开）
+SENTENCE_END = re.compile(r'(?<=[。！？；])|(?<=[.!?;])(?=\s|$)')
+# 合并短句时每段的最少字符数，以及一段的最大字符数
+MIN_CHUNK_CHARS = 40
+MAX_CHUNK_CHARS = 300
+
+
+def split_sentences(text, min_chars=MIN_CHUNK_CHARS, max_chars=MAX_CHUNK_CHARS):
+    """把长文本在句子边界切成若干段
+
+    第一句单独成段，让第一段尽快合成、尽早出声；后面的短句合并到至少
+    min_chars 个字符，减少请求数。超过 max_chars 的句子在逗号或空格处再切开。
+    """
+    sentences = []
+    for sentence in SENTENCE_END.split(text.strip()):
+        # 句子之间的空白留在后一句的开头，合并时原样拼接，不增加也不丢掉空格
+        while len(sentence.strip()) > max_chars:
+            cut = max(sentence.rfind(",", 0, max_chars), sentence.rfind("，", 0, max_chars), sentence.rfind(" ", 0, max_chars))
+            cut = cut + 1 if cut > 0 else max_chars
+            sentences.append(sentence[:cut])
+            sentence = sentence[cut:]
+        if sentence.strip():
+            sentences.append(sentence)
+
+    chunks = []
+    for sentence in sentences:
+        if len(chunks) > 1 and len(chunks[-1].strip()) < min_chars and len(chunks[-1]) + len(sentence) < max_chars:
+            chunks[-1] = chunks[-1] + sentence
+        else:
+            chunks.append(sentence)
+    return [chunk.strip() for chunk in chunks]
+
+
+class SpeakResult:
+    """一次朗读的结果"""
+
+    def __init__(self):
+        self.success = False
+        self.reason = None
+        self.cancellation = None
+        self.time_to_first_audio = None
+        self.chunks = 0
+        self.cached_chunks = 0
+        self.interrupted = False
+
+
+class StreamingSpeaker:
+    """分句流式朗读
+
+    长文本按句子切成若干段，连续的未缓存段一次性提交给合成器排队，
+    合成器在播放当前段的同时合成下一段；已缓存的段直接在本地播放。
+    通过合成器的 synthesizing 事件记录每句话从开始到收到第一段音频的时间。
+    传入 single_flight 时，同一段文本正在朗读（或排队等待朗读）的调用直接等待那次朗读的结果，不会重复朗读。
+    """
+
+    def __init__(self, synthesizer_pool, audio_cache=None, single_flight=None):
+        self.synthesizer_pool = synthesizer_pool
+        self.audio_cache = audio_cache
+        self.single_flight = single_flight
+        self.lock = threading.Lock()
+        # 正在使用的合成器和打断标志，stop() 在其他线程中使用；本地播放的缓存音频也由这个标志打断
+        self.active = None
+        self.interrupted = threading.Event()
+        self.watched = set()
+        self.first_audio = None
+        self.stats_lock = threading.Lock()
+        self.first_audio_times = []
+
+    def _on_synthesizing(self, evt):
+        if self.first_audio is None:
+            self.first_audio = time.perf_counter()
+
+    def _watch(self, synthesizer):
+        # 每个合成器只连接一次事件
+        if id(synthesizer) not in self.watched:
+            synthesizer.synthesizing.connect(self._on_synthesizing)
+            self.watched.add(id(synthesizer))
+
+    def speak(self, text, voice_name):
+        """朗读一段文本，返回 SpeakResult；同一时间只朗读一句"""
+        if self.single_flight is None:
+            return self._speak(text, voice_name)
+        return self.single_flight.do(("speak", text, voice_name), lambda: self._speak(text, voice_name))
+
+    def _speak(self, text, voice_name):
+        outcome = SpeakResult()
+        chunks = split_sentences(text)
+        outcome.chunks = len(chunks)
+
+        with self.lock:
+            started = time.perf_counter()
+            self.first_audio = None
+            self.interrupted.clear()
+            self.active = None
+            synthesizer = None
+
+            keys = [None] * len(chunks)
+            cached = [None] * len(chunks)
+            if self.audio_cache is not None:
+                for index, chunk in enumerate(chunks):
+                    keys[index] = self.audio_cache.key(chunk, voice_name, OUTPUT_FORMAT)
+                    cached[index] = self.audio_cache.get(keys[index])
+
+            index = 0
+            while index < len(chunks):
+                if self.interrupted.is_set():
+                    return self._interrupt(outcome, started)
+                if cached[index] is not None:
+                    if self.first_audio is None:
+                        self.first_audio = time.perf_counter()
+                    played = play_wav(cached[index], self.interrupted)
+                    if played is None:
+                        return self._interrupt(outcome, started)
+                    if played:
+                        outcome.cached_chunks += 1
+                        index += 1
+                        continue
+                    cached[index] = None
+
+                # 把接下来连续的未缓存段一起提交，合成器播放当前段时就开始合成下一段
+                if synthesizer is None:
+                    synthesizer = self.synthesizer_pool.get(voice_name)
+                    self._watch(synthesizer)
+                    self.active = synthesizer
+                run = []
+                while index < len(chunks) and cached[index] is None:
+                    run.append((index, synthesizer.speak_text_async(chunks[index])))
+                    index += 1
+                for chunk_index, future in run:
+                    result = future.get()
+                    if self.interrupted.is_set():
+                        # stop() 已经让合成器停止，排队的后续段也会被丢弃
+                        return self._interrupt(outcome, started)
+                    if result.reason != speechsdk.ResultReason.SynthesizingAudioCompleted:
+                        outcome.reason = result.reason
+                        if result.reason == speechsdk.ResultReason.Canceled:
+                            outcome.cancellation = speechsdk.SpeechSynthesisCancellationDetails(result)
+                        # 丢弃已经排队的后续段
+                        synthesizer.stop_speaking_async().get()
+                        self._record(outcome, started)
+                        return outcome
+                    if self.audio_cache is not None:
+                        self.audio_cache.put(keys[chunk_index], result.audio_data)
+
+            outcome.success = True
+            outcome.reason = speechsdk.ResultReason.SynthesizingAudioCompleted
+            self._record(outcome, started)
+            return outcome
+
+    def stop(self):
+        """打断正在进行的朗读：合成器或本地播放的缓存音频停止播放，还没有播放的段不再播放"""
+        self.interrupted.set()
+        synthesizer = self.active
+        if synthesizer is not None:
+            synthesizer.stop_speaking_async()
+
+    def _interrupt(self, outcome, started):
+        outcome.interrupted = True
+        outcome.reason = speechsdk.ResultReason.Canceled
+        self._record(outcome, started)
+        return outcome
+
+    def _record(self, outcome, started):
+        if self.first_audio is not None:
+            outcome.time_to_first_audio = self.first_audio - started
+            with self.stats_lock:
+                self.first_audio_times.append(outcome.time_to_first_audio)
+
+    def report(self):
+        with self.stats_lock:
+            times = sorted(self.first_audio_times)
+        if not times:
+            return "首段音频延迟: 暂无数据"
+        return (
+            f"首段音频延迟: {len(times)} 句  平均 {sum(times) / len(times) * 1000:.0f} ms  "
+            f"中位数 {times[len(times) // 2] * 1000:.0f} ms  最长 {times[-1] * 1000:.0f} ms"
+        )
+
+
+_speaker = None
+_speaker_lock = threading.Lock()
+
+
+def get_streaming_speaker():
+    """返回进程内共享的分句朗读器，语音服务配置缺失时返回None"""
+    global _speaker
+    with _speaker_lock:
+        if _speaker is None:
+            synthesizer_pool = get_synthesizer_pool()
+            if synthesizer_pool is None:
+                return None
+            _speaker = StreamingSpeaker(synthesizer_pool, get_audio_cache(), get_single_flight("tts"))
+        return _speaker
@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+import tkinter as tk
+from collections import deque
+from dotenv import load_dotenv
+
+# 界面刷新频率（每秒帧数）
+DEFAULT_FPS = 30
+# 文本区域最多保留的行数，超过后一次删除 TRIM_LINES 行最早的内容
+DEFAULT_MAX_LINES = 2000
+DEFAULT_TRIM_LINES = 200
+
+
+class UIDispatcher:
+    """把后台线程中的界面更新集中到主线程按固定帧率执行
+
+    后台线程调用 call() 按顺序排队更新，调用 call_latest() 提交只需要保留最新值的
+    更新（状态栏、进度条、中间结果等），同一个 key 在一帧内只执行最后一次。
+    主线程每帧（默认 1/30 秒）用一次 root.after 取出全部更新执行，而不是每个事件都
+    向Tk的事件队列提交一个 after(0) 回调。
+    """
+
+    def __init__(self, root, fps=DEFAULT_FPS):
+        self.root = root
+        self.interval_ms = max(1, int(1000 / fps))
+        self.lock = threading.Lock()
+        self.pending = deque()
+        self.latest = {}
+        self.transcripts = []
+        self.running = False
+        self.after_id = None
+
+        # 统计信息
+        self.frames = 0
+        self.applied = 0
+        self.coalesced = 0
+        self.max_backlog = 0
+        self.latencies = deque(maxlen=1000)
+        self.max_latency = 0.0
+
+    def call(self, func, *args, **kwargs):
+        """在下一帧按顺序执行 func(*args, **kwargs)（可以在任何线程中调用）"""
+        with self.lock:
+            self.pending.append((time.perf_counter(), func, args, kwargs))
+            self.max_backlog = max(self.max_backlog, len(self.pending))
+
+    def call_latest(self, key, func, *args, **kwargs):
+        """在下一帧执行 func，同一个 key 只保留最后一次提交的调用"""
+        with self.lock:
+            previous = self.latest.pop(key, None)
+            if previous is not None:
+                self.coalesced += 1
+            # 保留第一次提交的时间，延迟统计反映更新实际等待的时间
+            queued = previous[0] if previous is not None else time.perf_counter()
+            self.latest[key] = (queued, func, args, kwargs)
+
+    def cancel_latest(self, key):
+        """撤销还没有执行的 call_latest 更新"""
+        with self.lock:
+            self.latest.pop(key, None)
+
+    def register(self, transcript):
+        """每帧结束时调用 transcript.flush()（裁剪行数并滚动到底部）"""
+        self.transcripts.append(transcript)
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.after_id = self.root.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        self.running = False
+        if self.after_id is not None:
+            try:
+                self.root.after_cancel(self.after_id)
+            except tk.TclError:
+                pass
+            self.after_id = None
+
+    def _tick(self):
+        with self.lock:
+            updates = list(self.pending)
+            self.pending.clear()
+            updates.extend(self.latest.values())
+            self.latest.clear()
+
+        now = time.perf_counter()
+        for queued, func, args, kwargs in updates:
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                print(f"更新界面时发生错误: {e}")
+            latency = now - queued
+            self.latencies.append(latency)
+            self.max_latency = max(self.max_latency, latency)
+        for transcript in self.transcripts:
+            transcript.flush()
+        self.frames += 1
+        self.applied += len(updates)
+
+        if self.running:
+            self.after_id = self.root.after(self.interval_ms, self._tick)
+
+    def report(self):
+        latencies = sorted(self.latencies)
+        p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+        trimmed = sum(transcript.trimmed for transcript in self.transcripts)
+        return (
+            f"界面更新: {self.frames} 帧  执行 {self.applied} 次  合并 {self.coalesced} 次  最大积压 {self.max_backlog}\n"
+            f"更新延迟: p95 {p95 * 1000:.0f} ms  最长 {self.max_latency * 1000:.0f} ms  文本区域已裁剪 {trimmed} 行"
+        )
+
+
+class TranscriptBuffer:
+    """有行数上限的文本区域（环形缓冲）
+
+    append() 只插入文本；flush() 在每帧结束时调用一次，行数超过 max_lines 时
+    一次删除 trim_lines 行最早的内容，并滚动到底部。都必须在主线程中调用。
+    """
+
+    def __init__(self, widget, max_lines=DEFAULT_MAX_LINES, trim_lines=DEFAULT_TRIM_LINES):
+        self.widget = widget
+        self.max_lines = max_lines
+        self.trim_lines = min(trim_lines, max_lines)
+        self.dirty = False
+        self.trimmed = 0
+
+    def append(self, text, *tags):
+        self.widget.insert(tk.END, text + "\n", tags)
+        self.dirty = True
+
+    def line_count(self):
+        # 每行都以换行结尾，end-1c 位于最后一个换行之后的空行
+        return int(self.widget.index("end-1c").split(".")[0]) - 1
+
+    def flush(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        lines = self.line_count()
+        if lines > self.max_lines:
+            remove = lines - self.max_lines + self.trim_lines
+            self.widget.delete("1.0", f"{remove + 1}.0")
+            self.trimmed += remove
+        self.widget.see(tk.END)  # 滚动到底部
+
+    def clear(self):
+        self.widget.delete(1.0, tk.END)
+        self.dirty = False
+
+
+def get_ui_settings():
+    """从.env读取界面刷新频率（UI_FPS）和文本区域的行数上限（TRANSCRIPT_MAX_LINES）"""
+    load_dotenv()
+    fps = float(os.environ.get('UI_FPS', DEFAULT_FPS))
+    max_lines = int(os.environ.get('TRANSCRIPT_MAX_LINES', DEFAULT_MAX_LINES))
+    return fps, max_lines
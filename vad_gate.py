@@ -0,0 +1,311 @@
+import os
+import threading
+import time
+from collections import deque
+import azure.cognitiveservices.speech as speechsdk
+from dotenv import load_dotenv
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+# 比背景噪声高出多少分贝、且不低于多少 dBFS 的帧视为语音
+DEFAULT_MARGIN_DB = 10.0
+DEFAULT_MIN_DBFS = -50.0
+# 连续多少毫秒的语音才开始上传；语音结束后继续上传多久（拖尾）；开始上传时补上之前多久的音频（预卷）
+DEFAULT_ATTACK_MS = 60
+DEFAULT_HANGOVER_MS = 300
+DEFAULT_PREROLL_MS = 300
+# 每段语音结束后补充的静音，让识别服务判断这句话已经结束
+DEFAULT_TAIL_SILENCE_MS = 600
+# 背景噪声估计每秒最多上升多少分贝（下降不受限制），噪声变大后门也能重新关上
+DEFAULT_NOISE_RISE_DB = 3.0
+
+
+class VADGate:
+    """基于帧能量的语音活动检测门，只把语音段写入 PushAudioInputStream
+
+    输入 16kHz 16位单声道PCM。每帧（20ms）的能量用NumPy一次算出，背景噪声在每一帧上
+    跟踪：比估计低时很快跟下去，比估计高时每秒最多上升 noise_rise_db 分贝，说话时间不长
+    不会抬高估计，背景噪声持续变大时门也能重新关上。连续 attack_ms 的语音帧打开门，
+    并先写入预卷缓冲中之前 preroll_ms 的音频，避免吞掉第一个字；语音停止 hangover_ms
+    后关门，再补 tail_silence_ms 的静音，让识别服务及时结束这一句。
+
+    识别服务看到的只是写入的音频，结果的 offset 不包含被丢掉的静音。门记录每段连续
+    写入的音频在流中的位置和采集时间，clock() 用它把 offset 换算回采集的时间。
+    """
+
+    def __init__(self, push_stream, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS, margin_db=DEFAULT_MARGIN_DB,
+                 min_dbfs=DEFAULT_MIN_DBFS, attack_ms=DEFAULT_ATTACK_MS, hangover_ms=DEFAULT_HANGOVER_MS,
+                 preroll_ms=DEFAULT_PREROLL_MS, tail_silence_ms=DEFAULT_TAIL_SILENCE_MS,
+                 noise_rise_db=DEFAULT_NOISE_RISE_DB):
+        self.push_stream = push_stream
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.frame_seconds = frame_ms / 1000
+        self.margin_db = margin_db
+        self.min_dbfs = min_dbfs
+        self.attack_frames = max(1, attack_ms // frame_ms)
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.noise_rise = noise_rise_db * self.frame_seconds
+        self.tail_silence = bytes(2 * sample_rate * tail_silence_ms // 1000)
+        self.preroll = deque(maxlen=max(1, preroll_ms // frame_ms))
+        self.lock = threading.Lock()
+        # 语音开始（门打开）时调用，用于说话打断朗读
+        self.on_speech = None
+
+        self.remainder = np.zeros(0, dtype=np.int16)
+        self.noise_db = None
+        self.open = False
+        self.speech_run = 0
+        self.silence_run = 0
+        # 已写入流的音频时长（秒），以及每段连续写入开始时的 (流中位置, 采集时间)
+        self.position = 0.0
+        self.anchors = deque(maxlen=256)
+        self.next_wall = None
+
+        # 统计信息
+        self.captured_frames = 0
+        self.uploaded_frames = 0
+        self.tail_seconds = 0.0
+        self.segments = 0
+
+    def process(self, data, now=None):
+        """处理一段采集到的PCM音频（bytes），now 为这段音频最后一个采样的采集时间（默认为现在）"""
+        if now is None:
+            now = time.perf_counter()
+        with self.lock:
+            samples = np.concatenate([self.remainder, np.frombuffer(data, dtype=np.int16)])
+            count = len(samples) // self.frame_samples
+            self.remainder = samples[count * self.frame_samples:]
+            if count == 0:
+                return
+            frames = samples[:count * self.frame_samples].reshape(count, self.frame_samples)
+            # 每帧的能量（dBFS），一次算完整块
+            power = np.mean(frames.astype(np.float32) ** 2, axis=1)
+            energy_db = 10 * np.log10(power / (32768.0 ** 2) + 1e-12)
+
+            # 每帧开始的采集时间：最后一个采样在 now，剩下不足一帧的采样（新的 remainder）在这些帧之后
+            first = now - (len(self.remainder) / self.sample_rate) - count * self.frame_seconds
+            for index, (frame, level) in enumerate(zip(frames, energy_db)):
+                self._frame(frame.tobytes(), float(level), first + index * self.frame_seconds)
+
+    def mute(self):
+        """丢弃这段时间的音频（朗读期间）：正在上传的语音段立即结束，预卷缓冲清空"""
+        with self.lock:
+            self.remainder = np.zeros(0, dtype=np.int16)
+            self.preroll.clear()
+            self.speech_run = 0
+            if self.open:
+                self.open = False
+                self._write_tail()
+
+    def _frame(self, frame, level, wall):
+        self.captured_frames += 1
+        if self.noise_db is None:
+            self.noise_db = level
+        is_speech = level > self.noise_db + self.margin_db and level > self.min_dbfs
+        # 背景噪声在每一帧上跟踪：快降慢升
+        if level < self.noise_db:
+            self.noise_db = 0.7 * self.noise_db + 0.3 * level
+        else:
+            self.noise_db = min(level, self.noise_db + self.noise_rise)
+
+        if self.open:
+            self._write(frame, wall)
+            if is_speech:
+                self.silence_run = 0
+            else:
+                self.silence_run += 1
+                if self.silence_run >= self.hangover_frames:
+                    self.open = False
+                    self._write_tail()
+            return
+
+        self.preroll.append((frame, wall))
+        self.speech_run = self.speech_run + 1 if is_speech else 0
+        if self.speech_run >= self.attack_frames:
+            self.open = True
+            self.segments += 1
+            self.silence_run = 0
+            self.speech_run = 0
+            if self.on_speech is not None:
+                self.on_speech()
+            for buffered, buffered_wall in self.preroll:
+                self._write(buffered, buffered_wall)
+            self.preroll.clear()
+
+    def _write(self, frame, wall):
+        if self.next_wall is None or abs(wall - self.next_wall) > self.frame_seconds / 2:
+            self.anchors.append((self.position, wall))
+        self.push_stream.write(frame)
+        self.uploaded_frames += 1
+        self.position += self.frame_seconds
+        self.next_wall = wall + self.frame_seconds
+
+    def _write_tail(self):
+        # 补的静音紧接在语音段之后，采集时间按语音段结束后继续计算
+        self.push_stream.write(self.tail_silence)
+        seconds = len(self.tail_silence) / 2 / self.sample_rate
+        self.tail_seconds += seconds
+        self.position += seconds
+        self.next_wall = None
+
+    def wall_time(self, position):
+        """流中 position 秒处的音频的采集时间；还没有写入过音频时返回None"""
+        with self.lock:
+            for anchor_position, anchor_wall in reversed(self.anchors):
+                if anchor_position <= position:
+                    return anchor_wall + (position - anchor_position)
+            return None
+
+    def clock(self):
+        """识别开始时调用，返回把识别结果的 offset（秒）换算成采集时间的函数"""
+        with self.lock:
+            started = self.position
+        return lambda offset: self.wall_time(started + offset)
+
+    def stats(self):
+        with self.lock:
+            captured = self.captured_frames * self.frame_seconds
+            uploaded = self.uploaded_frames * self.frame_seconds + self.tail_seconds
+            return {
+                'captured_seconds': captured,
+                'uploaded_seconds': uploaded,
+                'uploaded_ratio': uploaded / captured if captured else 0.0,
+                'segments': self.segments,
+                'noise_dbfs': self.noise_db,
+            }
+
+    def report(self):
+        s = self.stats()
+        return (
+            f"语音活动检测: 采集 {s['captured_seconds']:.1f} s  上传 {s['uploaded_seconds']:.1f} s "
+            f"({s['uploaded_ratio'] * 100:.0f}%)  语音段 {s['segments']} 个"
+        )
+
+
+class DefaultMicrophone:
+    """SDK直接使用默认麦克风（所有音频都上传）"""
+
+    def __init__(self):
+        self.config = speechsdk.audio.AudioConfig(use_default_microphone=True)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+    def attach_duplex(self, duplex):
+        """SDK直接读取麦克风，无法在朗读期间停止上传，只能丢弃识别结果"""
+
+    def clock(self):
+        """识别开始时调用：所有音频都上传，识别结果的 offset 就是从现在开始的时间"""
+        started = time.perf_counter()
+        return lambda offset: started + offset
+
+    def report(self):
+        return None
+
+
+class GatedMicrophone:
+    """用PyAudio自己采集麦克风音频，经过 VADGate 只把语音段写入 PushAudioInputStream"""
+
+    def __init__(self, gate_options=None, chunk_ms=100):
+        stream_format = speechsdk.audio.AudioStreamFormat(samples_per_second=SAMPLE_RATE, bits_per_sample=16, channels=1)
+        self.push_stream = speechsdk.audio.PushAudioInputStream(stream_format)
+        self.config = speechsdk.audio.AudioConfig(stream=self.push_stream)
+        self.gate = VADGate(self.push_stream, **(gate_options or {}))
+        self.chunk_samples = SAMPLE_RATE * chunk_ms // 1000
+        self.audio = pyaudio.PyAudio()
+        self.stream = None
+        self.running = threading.Event()
+        self.thread = None
+        self.duplex = None
+
+    def attach_duplex(self, duplex):
+        """朗读期间不上传音频；说话打断朗读模式下语音一开始就通知 duplex"""
+        self.duplex = duplex
+        self.gate.on_speech = duplex.local_speech
+
+    def start(self):
+        """开始采集（识别开始时调用）"""
+        if self.running.is_set():
+            return
+        self.stream = self.audio.open(format=pyaudio.paInt16, channels=1, rate=SAMPLE_RATE, input=True,
+                                      frames_per_buffer=self.chunk_samples)
+        self.running.set()
+        self.thread = threading.Thread(target=self._run, name="vad-capture", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while self.running.is_set():
+            try:
+                data = self.stream.read(self.chunk_samples, exception_on_overflow=False)
+            except OSError as e:
+                print(f"读取麦克风失败: {e}")
+                break
+            if self.duplex is not None and self.duplex.mute(len(data) / 2 / SAMPLE_RATE):
+                self.gate.mute()
+                continue
+            self.gate.process(data)
+
+    def stop(self):
+        """停止采集（识别停止时调用），之后可以再次 start()"""
+        if not self.running.is_set():
+            return
+        self.running.clear()
+        self.thread.join()
+        self.stream.stop_stream()
+        self.stream.close()
+        self.stream = None
+
+    def close(self):
+        self.stop()
+        self.push_stream.close()
+        self.audio.terminate()
+
+    def clock(self):
+        """识别开始时调用：被丢掉的静音不在识别结果的 offset 中，由 VADGate 换算回采集时间"""
+        return self.gate.clock()
+
+    def report(self):
+        return self.gate.report()
+
+
+def create_audio_input():
+    """根据.env中的 VAD_GATE 返回麦克风输入
+
+    VAD_GATE=on 且安装了 numpy 和 pyaudio 时返回 GatedMicrophone，否则返回 DefaultMicrophone。
+    返回值的 config 用于创建 SpeechRecognizer，识别开始和停止时分别调用 start() / stop()。
+    """
+    load_dotenv()
+    if os.environ.get('VAD_GATE', 'off').strip().lower() not in ('on', '1', 'true', 'yes'):
+        return DefaultMicrophone()
+    if np is None or pyaudio is None:
+        print("提示：语音活动检测需要安装 numpy 和 pyaudio（pip install numpy pyaudio），已改用默认麦克风")
+        return DefaultMicrophone()
+    gate_options = {
+        'margin_db': float(os.environ.get('VAD_MARGIN_DB', DEFAULT_MARGIN_DB)),
+        'min_dbfs': float(os.environ.get('VAD_MIN_DBFS', DEFAULT_MIN_DBFS)),
+        'hangover_ms': int(os.environ.get('VAD_HANGOVER_MS', DEFAULT_HANGOVER_MS)),
+        'preroll_ms': int(os.environ.get('VAD_PREROLL_MS', DEFAULT_PREROLL_MS)),
+        'noise_rise_db': float(os.environ.get('VAD_NOISE_RISE_DB', DEFAULT_NOISE_RISE_DB)),
+    }
+    try:
+        return GatedMicrophone(gate_options)
+    except Exception as e:
+        print(f"打开麦克风失败: {e}，已改用默认麦克风")
+        return DefaultMicrophone()
@@ -6,6 +6,11 @@ from tkinter import scrolledtext, messagebox
 import azure.cognitiveservices.speech as speechsdk
 from dotenv import load_dotenv
 import sys
+from recognition import (RECOGNITION_MODE_CONTINUOUS, ContinuousRecognition, RecognitionStats,
+                         get_recognition_mode, handle_result, recognize_once)
+from ui_dispatcher import TranscriptBuffer, UIDispatcher, get_ui_settings
+from vad_gate import create_audio_input
+from endpoint_selector import select_speech_region
 
 class VoiceRecognitionApp:
     def __init__(self, root):
@@ -54,15 +59,18 @@ class VoiceRecognitionApp:
             return
         
         # 创建语音配置
-        self.speech_config = speechsdk.SpeechConfig(subscription=self.speech_key, region=self.speech_region)
+        # 配置了多个区域（AZURE_SPEECH_REGIONS）时使用当前延迟最低的区域
+        speech_key, speech_region = select_speech_region(self.speech_key, self.speech_region)
+        self.speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_region)
         self.speech_config.speech_recognition_language = "zh-CN"  # 设置中文识别
         
         # 打印配置信息
         print(f"语音识别语言: {self.speech_config.speech_recognition_language}")
         print(f"使用的区域: {self.speech_region}")
         
-        # 创建从默认麦克风获取音频的配置
-        self.audio_config = speechsdk.audio.AudioConfig(use_default_microphone=True)
+        # 创建从默认麦克风获取音频的配置；VAD_GATE=on 时自己采集音频，只把语音段上传给识别服务
+        self.audio_input = create_audio_input()
+        self.audio_config = self.audio_input.config
         
         # 创建语音识别器
         try:
@@ -82,8 +90,27 @@ class VoiceRecognitionApp:
         self.is_recognizing = False
         self.recognition_thread = None
         
+        # 识别模式（连续识别或单次识别轮询）
+        self.recognition_mode = get_recognition_mode()
+        self.recognition_stats = RecognitionStats(self.recognition_mode)
+        print(f"识别模式: {self.recognition_mode}")
+        self.continuous_recognition = None
+        if self.recognition_mode == RECOGNITION_MODE_CONTINUOUS:
+            self.continuous_recognition = ContinuousRecognition(
+                self.speech_recognizer,
+                self.on_recognized,
+                self.on_no_match,
+                self.on_canceled,
+                stats=self.recognition_stats
+            )
+        
+        # 后台线程的界面更新按固定帧率在主线程中批量执行
+        ui_fps, self.transcript_max_lines = get_ui_settings()
+        self.ui = UIDispatcher(self.root, ui_fps)
+        
         # 创建GUI元素
         self.create_widgets()
+        self.ui.start()
     
     def create_widgets(self):
         # 顶部状态标签
@@ -93,6 +120,9 @@ class VoiceRecognitionApp:
         # 文本显示区域
         self.text_area = scrolledtext.ScrolledText(self.root, wrap=tk.WORD, width=60, height=15, font=("SimHei", 12))
         self.text_area.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+        # 长时间运行时只保留最近的内容
+        self.transcript = TranscriptBuffer(self.text_area, self.transcript_max_lines)
+        self.ui.register(self.transcript)
         
         # 添加配置信息到文本区域
         self.text_area.insert(tk.END, f"Azure语音服务区域: {self.speech_region}\n")
@@ -117,67 +147,89 @@ class VoiceRecognitionApp:
         footer_label.pack(side=tk.BOTTOM, pady=5)
     
     def append_text(self, text):
-        """向文本区域追加文本"""
-        self.text_area.insert(tk.END, text + "\n")
-        self.text_area.see(tk.END)  # 滚动到底部
+        """向文本区域追加文本（超过行数上限时删除最早的内容）"""
+        self.transcript.append(text)
+    
+    def on_recognized(self, recognized_text):
+        """识别成功的回调（可能在后台线程中调用）"""
+        # 在主线程中更新UI
+        self.ui.call(self.append_text, recognized_text)
+    
+    def on_no_match(self):
+        """没有识别到语音的回调"""
+        self.ui.call_latest("status", self.status_label.config, text="没有识别到语音", fg="#FF9800")
+    
+    def on_canceled(self, cancellation):
+        """识别被取消的回调"""
+        error_message = f"识别被取消: {cancellation.reason}"
+        if cancellation.reason == speechsdk.CancellationReason.Error:
+            error_message += f"\n错误详情: {cancellation.error_details}"
+        # 在主线程中更新UI
+        self.ui.call(self.append_text, error_message)
     
     def recognition_loop(self):
-        """识别循环，在独立线程中运行"""
+        """识别循环（单次识别轮询模式），在独立线程中运行"""
         while self.is_recognizing:
             try:
                 # 单次识别
-                result = self.speech_recognizer.recognize_once()
-                
-                if result.reason == speechsdk.ResultReason.RecognizedSpeech:
-                    recognized_text = result.text
-                    # 在主线程中更新UI
-                    self.root.after(0, lambda text=recognized_text: self.append_text(text))
-                elif result.reason == speechsdk.ResultReason.NoMatch:
-                    self.root.after(0, lambda: self.status_label.config(text="没有识别到语音", fg="#FF9800"))
-                elif result.reason == speechsdk.ResultReason.Canceled:
-                    cancellation = speechsdk.CancellationDetails(result)
-                    error_message = f"识别被取消: {cancellation.reason}"
-                    if cancellation.reason == speechsdk.CancellationReason.Error:
-                        error_message += f"\n错误详情: {cancellation.error_details}"
-                    # 在主线程中更新UI
-                    self.root.after(0, lambda msg=error_message: self.append_text(msg))
-                    # 如果是错误，暂停一下再继续
-                    if cancellation.reason == speechsdk.CancellationReason.Error:
-                        time.sleep(2)
+                result = recognize_once(self.speech_recognizer, self.recognition_stats)
+                # 出错后下一次识别会按退避时间等待（见 governor.py）
+                handle_result(result, self.on_recognized, self.on_no_match, self.on_canceled)
             except Exception as e:
                 error_message = f"识别过程中发生错误: {e}"
-                self.root.after(0, lambda msg=error_message: self.append_text(msg))
+                self.ui.call(self.append_text, error_message)
                 time.sleep(2)
                 
             # 短暂暂停，避免CPU使用率过高
             if self.is_recognizing:  # 再次检查，以便能够更快地退出线程
                 time.sleep(0.1)
     
+    def run_continuous_recognition(self):
+        """启动连续识别（会等待识别会话建立，因此在独立线程中运行）"""
+        try:
+            self.continuous_recognition.start()
+        except Exception as e:
+            error_message = f"启动连续识别失败: {e}"
+            self.ui.call(self.append_text, error_message)
+    
     def start_recognition(self):
         """开始语音识别"""
         if not self.is_recognizing:
             self.is_recognizing = True
-            self.status_label.config(text="正在识别中...", fg="#4CAF50")
+            self.ui.call_latest("status", self.status_label.config, text="正在识别中...", fg="#4CAF50")
             self.start_button.config(state=tk.DISABLED)
             self.stop_button.config(state=tk.NORMAL)
             
-            # 在新线程中启动识别循环
-            self.recognition_thread = threading.Thread(target=self.recognition_loop, daemon=True)
+            self.audio_input.start()
+            # 在新线程中启动识别
+            if self.continuous_recognition:
+                self.recognition_thread = threading.Thread(target=self.run_continuous_recognition, daemon=True)
+            else:
+                self.recognition_thread = threading.Thread(target=self.recognition_loop, daemon=True)
             self.recognition_thread.start()
     
     def stop_recognition(self):
         """停止语音识别"""
         if self.is_recognizing:
             self.is_recognizing = False
-            self.status_label.config(text="已停止", fg="#F44336")
+            self.ui.call_latest("status", self.status_label.config, text="已停止", fg="#F44336")
             self.start_button.config(state=tk.NORMAL)
             self.stop_button.config(state=tk.DISABLED)
             
-            # 线程会自行停止，因为我们设置了is_recognizing = False
+            if self.continuous_recognition:
+                # 停止连续识别需要等待SDK确认，放到后台线程避免阻塞界面
+                threading.Thread(target=self.continuous_recognition.stop, daemon=True).start()
+            self.audio_input.stop()
+            # 轮询模式的线程会自行停止，因为我们设置了is_recognizing = False
+            print(self.recognition_stats.report())
+            vad_report = self.audio_input.report()
+            if vad_report:
+                print(vad_report)
+            print(self.ui.report())
     
     def clear_text(self):
         """清空文本区域"""
-        self.text_area.delete(1.0, tk.END)
+        self.transcript.clear()
         # 重新添加配置信息
         self.text_area.insert(tk.END, f"Azure语音服务区域: {self.speech_region}\n")
         self.text_area.insert(tk.END, f"语音识别语言: {self.speech_config.speech_recognition_language}\n")
@@ -187,6 +239,8 @@ class VoiceRecognitionApp:
         """关闭窗口时的操作"""
         if self.is_recognizing:
             self.stop_recognition()
+        self.ui.stop()
+        self.audio_input.close()
         self.root.destroy()
 
 if __name__ == "__main__":
@@ -3,6 +3,10 @@ import time
 import azure.cognitiveservices.speech as speechsdk
 from dotenv import load_dotenv
 import sys
+from vad_gate import create_audio_input
+from endpoint_selector import select_speech_region
+from recognition import (RECOGNITION_MODE_CONTINUOUS, ContinuousRecognition, RecognitionStats,
+                         get_recognition_mode, handle_result, recognize_once)
 
 def main():
     # 打印当前工作目录
@@ -37,6 +41,9 @@ def main():
         print("错误：请将.env文件中的AZURE_SPEECH_REGION替换为实际的区域名称")
         return
     
+    # 配置了多个区域（AZURE_SPEECH_REGIONS）时使用当前延迟最低的区域
+    speech_key, speech_region = select_speech_region(speech_key, speech_region)
+
     # 创建语音配置
     speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_region)
     speech_config.speech_recognition_language = "zh-CN"  # 设置中文识别
@@ -45,8 +52,9 @@ def main():
     print(f"语音识别语言: {speech_config.speech_recognition_language}")
     print(f"使用的区域: {speech_region}")
     
-    # 使用默认麦克风 (这种方式不需要PyAudio)
-    audio_config = speechsdk.audio.AudioConfig(use_default_microphone=True)
+    # 使用默认麦克风 (这种方式不需要PyAudio)；VAD_GATE=on 时自己采集音频，只把语音段上传给识别服务
+    audio_input = create_audio_input()
+    audio_config = audio_input.config
     
     # 创建语音识别器
     speech_recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
@@ -55,26 +63,44 @@ def main():
     print("请对着麦克风说话...")
     print("按Ctrl+C退出程序")
     
-    # 使用单次识别，而不是连续识别模式
+    def on_recognized(text):
+        print(f"识别结果: {text}")
+    
+    def on_no_match():
+        print("没有识别到语音")
+    
+    def on_canceled(cancellation):
+        print(f"识别被取消: {cancellation.reason}")
+        if cancellation.reason == speechsdk.CancellationReason.Error:
+            print(f"错误详情: {cancellation.error_details}")
+            # 打印更多错误信息
+            print(f"完整错误信息: {cancellation.error_details}")
+    
+    recognition_mode = get_recognition_mode()
+    stats = RecognitionStats(recognition_mode)
+    print(f"识别模式: {recognition_mode}")
+    
     try:
-        while True:
+        audio_input.start()
+        if recognition_mode == RECOGNITION_MODE_CONTINUOUS:
+            # 连续识别：识别结果通过事件回调返回，麦克风一直在监听
+            recognition = ContinuousRecognition(speech_recognizer, on_recognized, on_no_match, on_canceled, stats=stats)
+            recognition.start()
             print("\n正在听取语音...")
-            result = speech_recognizer.recognize_once()
-            
-            if result.reason == speechsdk.ResultReason.RecognizedSpeech:
-                print(f"识别结果: {result.text}")
-            elif result.reason == speechsdk.ResultReason.NoMatch:
-                print("没有识别到语音")
-            elif result.reason == speechsdk.ResultReason.Canceled:
-                cancellation = speechsdk.CancellationDetails(result)
-                print(f"识别被取消: {cancellation.reason}")
-                if cancellation.reason == speechsdk.CancellationReason.Error:
-                    print(f"错误详情: {cancellation.error_details}")
-                    # 打印更多错误信息
-                    print(f"完整错误信息: {cancellation.error_details}")
-            
-            # 短暂暂停，避免CPU使用率过高
-            time.sleep(0.5)
+            try:
+                while True:
+                    time.sleep(0.5)
+            finally:
+                recognition.stop()
+        else:
+            # 使用单次识别轮询
+            while True:
+                print("\n正在听取语音...")
+                result = recognize_once(speech_recognizer, stats)
+                handle_result(result, on_recognized, on_no_match, on_canceled)
+                
+                # 短暂暂停，避免CPU使用率过高
+                time.sleep(0.5)
             
     except KeyboardInterrupt:
         print("\n停止语音识别...")
@@ -82,6 +108,12 @@ def main():
         print(f"发生未预期的错误: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        print(stats.report())
+        audio_input.close()
+        vad_report = audio_input.report()
+        if vad_report:
+            print(vad_report)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,64 +1,17 @@
 import os
+import queue
 import time
-import requests
-import uuid
 import json
 import azure.cognitiveservices.speech as speechsdk
 from dotenv import load_dotenv
-
-def translate_text(text, source_language="zh-Hans", target_language="en"):
-    """使用Azure翻译服务将文本从源语言翻译为目标语言"""
-    # 加载环境变量
-    load_dotenv()
-    
-    # 获取Azure翻译服务密钥和端点
-    translator_key = os.environ.get('AZURE_TRANSLATOR_KEY')
-    translator_endpoint = os.environ.get('AZURE_TRANSLATOR_ENDPOINT')
-    
-    if not translator_key or not translator_endpoint:
-        print("错误：请在.env文件中设置AZURE_TRANSLATOR_KEY和AZURE_TRANSLATOR_ENDPOINT")
-        return None
-    
-    # 配置API请求
-    path = '/translate'
-    constructed_url = translator_endpoint + path
-    
-    params = {
-        'api-version': '3.0',
-        'from': source_language,
-        'to': target_language
-    }
-    
-    headers = {
-        'Ocp-Apim-Subscription-Key': translator_key,
-        'Ocp-Apim-Subscription-Region': os.environ.get('AZURE_SPEECH_REGION', 'eastus'),
-        'Content-type': 'application/json',
-        'X-ClientTraceId': str(uuid.uuid4())
-    }
-    
-    # 准备要翻译的文本
-    body = [{
-        'text': text
-    }]
-    
-    # 发送请求
-    try:
-        response = requests.post(constructed_url, params=params, headers=headers, json=body)
-        response.raise_for_status()  # 如果请求失败，抛出异常
-        
-        # 解析响应
-        result = response.json()
-        
-        if result and len(result) > 0 and 'translations' in result[0] and len(result[0]['translations']) > 0:
-            translated_text = result[0]['translations'][0]['text']
-            return translated_text
-        else:
-            print("翻译结果格式不正确")
-            return None
-    
-    except Exception as e:
-        print(f"翻译过程中发生错误: {e}")
-        return None
+from translator_client import get_target_languages, get_translation_batcher, language_display_name, translate_text_multi
+from translation_cache import get_translation_cache
+from metrics import get_metrics
+from session_store import get_session_store
+from vad_gate import create_audio_input
+from endpoint_selector import select_speech_region
+from recognition import (RECOGNITION_MODE_CONTINUOUS, ContinuousRecognition, RecognitionStats,
+                         get_recognition_mode, handle_result, recognize_once)
 
 def main():
     # 加载环境变量
@@ -85,49 +38,91 @@ def main():
         print("错误：请将.env文件中的AZURE_SPEECH_REGION替换为实际的区域名称")
         return
     
+    # 配置了多个区域（AZURE_SPEECH_REGIONS）时使用当前延迟最低的区域
+    speech_key, speech_region = select_speech_region(speech_key, speech_region)
+
     # 创建语音配置
     speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_region)
     speech_config.speech_recognition_language = "zh-CN"  # 设置中文识别
     
-    # 使用默认麦克风
-    audio_config = speechsdk.audio.AudioConfig(use_default_microphone=True)
+    # 使用默认麦克风；VAD_GATE=on 时自己采集音频，只把语音段上传给识别服务
+    audio_input = create_audio_input()
+    audio_config = audio_input.config
     
     # 创建语音识别器
     speech_recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
     
     print("====== 中文语音识别和翻译 ======")
-    print("对着麦克风说中文，程序将识别并翻译成英文")
+    # 目标语言列表，一个请求同时翻译成所有目标语言
+    target_languages = get_target_languages()
+    target_names = "、".join(language_display_name(language) for language in target_languages)
+    print(f"对着麦克风说中文，程序将识别并翻译成{target_names}")
     print("按Ctrl+C退出程序")
     
-    # 使用单次识别，而不是连续识别模式
+    def on_recognized(chinese_text):
+        print(f"识别结果 (中文): {chinese_text}")
+        timing = metrics.begin(chinese_text)
+        
+        # 翻译成所有目标语言
+        print("正在翻译...")
+        timing.mark("translation_sent")
+        translations = translate_text_multi(chinese_text, target_languages=target_languages)
+        timing.mark("translation_received")
+        metrics.finish(timing)
+        if session:
+            session.record(chinese_text, translations, timing=timing)
+        
+        if translations:
+            for language, translated_text in translations.items():
+                print(f"翻译结果 ({language_display_name(language)}): {translated_text}")
+        else:
+            print("翻译失败")
+    
+    def on_no_match():
+        print("没有识别到语音")
+    
+    def on_canceled(cancellation):
+        print(f"识别被取消: {cancellation.reason}")
+        if cancellation.reason == speechsdk.CancellationReason.Error:
+            print(f"错误详情: {cancellation.error_details}")
+    
+    recognition_mode = get_recognition_mode()
+    stats = RecognitionStats(recognition_mode)
+    # 每句话各阶段的耗时
+    metrics = get_metrics()
+    # 每句话的原文、译文和耗时保存到会话记录中，之后可以搜索和导出
+    session_store = get_session_store()
+    session = session_store.start_session("voice_translate") if session_store else None
+    print(f"识别模式: {recognition_mode}")
+    
     try:
-        while True:
+        audio_input.start()
+        if recognition_mode == RECOGNITION_MODE_CONTINUOUS:
+            # 连续识别：回调只把识别结果放入队列，翻译在主线程中进行，不会阻塞SDK的事件线程
+            recognized_queue = queue.Queue()
+            recognition = ContinuousRecognition(speech_recognizer, recognized_queue.put, on_no_match, on_canceled,
+                                                stats=stats, metrics=metrics, audio_input=audio_input,
+                                                drop_fillers=True)
+            recognition.start()
             print("\n正在听取语音...")
-            result = speech_recognizer.recognize_once()
-            
-            if result.reason == speechsdk.ResultReason.RecognizedSpeech:
-                chinese_text = result.text
-                print(f"识别结果 (中文): {chinese_text}")
-                
-                # 翻译成英文
-                print("正在翻译...")
-                english_text = translate_text(chinese_text)
-                
-                if english_text:
-                    print(f"翻译结果 (英文): {english_text}")
-                else:
-                    print("翻译失败")
+            try:
+                while True:
+                    try:
+                        chinese_text = recognized_queue.get(timeout=0.5)
+                    except queue.Empty:
+                        continue
+                    on_recognized(chinese_text)
+            finally:
+                recognition.stop()
+        else:
+            # 使用单次识别轮询
+            while True:
+                print("\n正在听取语音...")
+                result = recognize_once(speech_recognizer, stats, metrics, audio_input)
+                handle_result(result, on_recognized, on_no_match, on_canceled, drop_fillers=True)
                 
-            elif result.reason == speechsdk.ResultReason.NoMatch:
-                print("没有识别到语音")
-            elif result.reason == speechsdk.ResultReason.Canceled:
-                cancellation = speechsdk.CancellationDetails(result)
-                print(f"识别被取消: {cancellation.reason}")
-                if cancellation.reason == speechsdk.CancellationReason.Error:
-                    print(f"错误详情: {cancellation.error_details}")
-            
-            # 短暂暂停，避免CPU使用率过高
-            time.sleep(0.5)
+                # 短暂暂停，避免CPU使用率过高
+                time.sleep(0.5)
             
     except KeyboardInterrupt:
         print("\n停止语音识别和翻译...")
@@ -135,6 +130,22 @@ def main():
         print(f"发生未预期的错误: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        print(stats.report())
+        audio_input.close()
+        vad_report = audio_input.report()
+        if vad_report:
+            print(vad_report)
+        print(metrics.report())
+        if session_store:
+            session.end()
+            session_store.close()
+        translation_cache = get_translation_cache()
+        if translation_cache:
+            print(translation_cache.report())
+        translation_batcher = get_translation_batcher()
+        if translation_batcher:
+            print(translation_batcher.report())
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,103 +1,60 @@
 import os
+import threading
 import time
-import requests
-import uuid
 import json
 import azure.cognitiveservices.speech as speechsdk
 from dotenv import load_dotenv
+from translator_client import get_target_languages, get_translation_batcher, language_display_name, translate_text_multi
+from translation_cache import get_translation_cache
+from metrics import get_metrics
+from session_store import get_session_store
+from pipeline import Pipeline
+from tts_pool import DEFAULT_VOICE, get_synthesizer_pool, preload_common_phrases
+from tts_cache import get_audio_cache
+from tts_streaming import get_streaming_speaker
+from vad_gate import create_audio_input
+from endpoint_selector import select_speech_region
+from phrasebook import get_phrasebook
+from duplex import create_duplex_controller
+from recognition import (RECOGNITION_MODE_CONTINUOUS, ContinuousRecognition, RecognitionStats,
+                         get_recognition_mode, handle_result, recognize_once)
 
-def translate_text(text, source_language="zh-Hans", target_language="en"):
-    """使用Azure翻译服务将文本从源语言翻译为目标语言"""
-    # 加载环境变量
-    load_dotenv()
-    
-    # 获取Azure翻译服务密钥和端点
-    translator_key = os.environ.get('AZURE_TRANSLATOR_KEY')
-    translator_endpoint = os.environ.get('AZURE_TRANSLATOR_ENDPOINT')
-    
-    if not translator_key or not translator_endpoint:
-        print("错误：请在.env文件中设置AZURE_TRANSLATOR_KEY和AZURE_TRANSLATOR_ENDPOINT")
-        return None
-    
-    # 配置API请求
-    path = '/translate'
-    constructed_url = translator_endpoint + path
-    
-    params = {
-        'api-version': '3.0',
-        'from': source_language,
-        'to': target_language
-    }
-    
-    headers = {
-        'Ocp-Apim-Subscription-Key': translator_key,
-        'Ocp-Apim-Subscription-Region': os.environ.get('AZURE_SPEECH_REGION', 'eastus'),
-        'Content-type': 'application/json',
-        'X-ClientTraceId': str(uuid.uuid4())
-    }
-    
-    # 准备要翻译的文本
-    body = [{
-        'text': text
-    }]
-    
-    # 发送请求
-    try:
-        response = requests.post(constructed_url, params=params, headers=headers, json=body)
-        response.raise_for_status()  # 如果请求失败，抛出异常
-        
-        # 解析响应
-        result = response.json()
-        
-        if result and len(result) > 0 and 'translations' in result[0] and len(result[0]['translations']) > 0:
-            translated_text = result[0]['translations'][0]['text']
-            return translated_text
-        else:
-            print("翻译结果格式不正确")
-            return None
-    
-    except Exception as e:
-        print(f"翻译过程中发生错误: {e}")
-        return None
+# 流水线各阶段之间队列的最大长度
+PIPELINE_QUEUE_SIZE = 8
+# 打印流水线统计信息的间隔（秒）
+PIPELINE_REPORT_INTERVAL = 30
 
-def text_to_speech(text, language="en-US", voice_name="en-US-JennyNeural"):
-    """使用Azure语音服务将文本转换为语音"""
-    # 加载环境变量
-    load_dotenv()
-    
-    # 获取Azure语音服务密钥和区域
-    speech_key = os.environ.get('AZURE_SPEECH_KEY')
-    speech_region = os.environ.get('AZURE_SPEECH_REGION')
-    
-    if not speech_key or not speech_region:
+def text_to_speech(text, voice_name=DEFAULT_VOICE, timing=None):
+    """使用Azure语音服务将文本转换为语音（长文本按句子分段，边合成边播放）
+
+    传入 timing（UtteranceTiming）时记录首段音频和播放完成的时间。
+    """
+    # 合成器从池中取出，已经建立好连接，不必每句话重新创建
+    speaker = get_streaming_speaker()
+    if speaker is None:
         print("错误：请在.env文件中设置AZURE_SPEECH_KEY和AZURE_SPEECH_REGION")
         return False
     
-    # 创建语音配置
-    speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_region)
-    
-    # 设置语音合成的语言和声音
-    speech_config.speech_synthesis_language = language
-    speech_config.speech_synthesis_voice_name = voice_name
-    
-    # 创建语音合成器，使用默认扬声器作为音频输出
-    speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config)
-    
     try:
-        # 进行语音合成
+        # 进行语音合成，已缓存的段直接在本地播放
         print(f"正在将文本转换为语音: {text}")
-        result = speech_synthesizer.speak_text_async(text).get()
+        started = time.perf_counter()
+        result = speaker.speak(text, voice_name)
+        if timing is not None:
+            timing.mark_speech(started, result)
+        
+        if result.time_to_first_audio is not None:
+            print(f"首段音频延迟: {result.time_to_first_audio * 1000:.0f} ms（共 {result.chunks} 段，缓存 {result.cached_chunks} 段）")
         
         # 检查结果
-        if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+        if result.success:
             print("语音合成成功")
             return True
         else:
             print(f"语音合成失败: {result.reason}")
-            if result.reason == speechsdk.ResultReason.Canceled:
-                cancellation = speechsdk.SpeechSynthesisCancellationDetails(result)
-                print(f"语音合成被取消: {cancellation.reason}")
-                print(f"错误详情: {cancellation.error_details}")
+            if result.cancellation is not None:
+                print(f"语音合成被取消: {result.cancellation.reason}")
+                print(f"错误详情: {result.cancellation.error_details}")
             return False
     
     except Exception as e:
@@ -129,53 +86,134 @@ def main():
         print("错误：请将.env文件中的AZURE_SPEECH_REGION替换为实际的区域名称")
         return
     
+    # 配置了多个区域（AZURE_SPEECH_REGIONS）时使用当前延迟最低的区域
+    speech_key, speech_region = select_speech_region(speech_key, speech_region)
+
     # 创建语音配置
     speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_region)
     speech_config.speech_recognition_language = "zh-CN"  # 设置中文识别
     
-    # 使用默认麦克风
-    audio_config = speechsdk.audio.AudioConfig(use_default_microphone=True)
+    # 使用默认麦克风；VAD_GATE=on 时自己采集音频，只把语音段上传给识别服务
+    audio_input = create_audio_input()
+    audio_config = audio_input.config
     
     # 创建语音识别器
     speech_recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
     
     print("====== 中文语音识别、翻译和文本转语音 ======")
-    print("对着麦克风说中文，程序将识别、翻译成英文并朗读")
+    # 目标语言列表，一个请求同时翻译成所有目标语言，朗读第一个目标语言的译文
+    target_languages = get_target_languages()
+    target_names = "、".join(language_display_name(language) for language in target_languages)
+    print(f"对着麦克风说中文，程序将识别、翻译成{target_names}并朗读{language_display_name(target_languages[0])}")
     print("按Ctrl+C退出程序")
     
-    # 使用单次识别，而不是连续识别模式
+    def on_no_match():
+        print("没有识别到语音")
+    
+    def on_canceled(cancellation):
+        print(f"识别被取消: {cancellation.reason}")
+        if cancellation.reason == speechsdk.CancellationReason.Error:
+            print(f"错误详情: {cancellation.error_details}")
+    
+    def recognize():
+        """识别阶段（轮询模式）：麦克风一直处于监听状态，识别结果交给翻译阶段"""
+        # 半双工时朗读期间不开始新的识别，这时听到的只会是自己朗读的声音
+        if not duplex.wait_quiet(0.5):
+            return None
+        result = recognize_once(speech_recognizer, stats, metrics, audio_input)
+        
+        if result.reason == speechsdk.ResultReason.RecognizedSpeech:
+            phrasebook = get_phrasebook()
+            # 只有语气词的句子不翻译也不朗读
+            if phrasebook is not None and phrasebook.is_filler(result.text):
+                return None
+            # 朗读期间识别到的是自己朗读的回声
+            if duplex.discard(result.text):
+                return None
+            print(f"\n识别结果 (中文): {result.text}")
+            return result.text
+        
+        # 出错后下一次识别会按退避时间等待（见 governor.py）
+        handle_result(result, None, on_no_match, on_canceled)
+        return None
+    
+    def translate(chinese_text):
+        """翻译阶段，把译文和这句话的计时记录一起交给朗读阶段"""
+        timing = metrics.begin(chinese_text)
+        timing.mark("translation_sent")
+        translations = translate_text_multi(chinese_text, target_languages=target_languages)
+        timing.mark("translation_received")
+        if not translations:
+            print(f"翻译失败: {chinese_text}")
+            finish_utterance(timing, None)
+            return None
+        for language, translated_text in translations.items():
+            print(f"翻译结果 ({language_display_name(language)}): {translated_text}")
+        return translations, timing
+    
+    def speak(payload):
+        """朗读阶段"""
+        translations, timing = payload
+        try:
+            with duplex.playback():
+                text_to_speech(translations[target_languages[0]], timing=timing)
+        finally:
+            finish_utterance(timing, translations, DEFAULT_VOICE)
+        return None
+    
+    def finish_utterance(timing, translations, voice_name=None):
+        """一句话处理完毕：计入耗时统计并写入会话记录"""
+        metrics.finish(timing)
+        if session:
+            session.record(timing.text, translations, voice_name, timing)
+    
+    recognition_mode = get_recognition_mode()
+    stats = RecognitionStats(recognition_mode)
+    # 每句话各阶段的耗时
+    metrics = get_metrics()
+    # 每句话的原文、译文和耗时保存到会话记录中，之后可以搜索和导出
+    session_store = get_session_store()
+    session = session_store.start_session("voice_translate_tts") if session_store else None
+    print(f"识别模式: {recognition_mode}")
+    # 朗读期间丢弃麦克风听到的回声，或者在说话时打断朗读（DUPLEX_MODE）
+    duplex = create_duplex_controller(stop_playback=lambda: get_streaming_speaker().stop())
+    audio_input.attach_duplex(duplex)
+    speech_recognizer.recognizing.connect(duplex.local_speech)
+    
+    # 启动时预先创建语音合成器并建立连接，第一句话朗读时不再等待
+    synthesizer_pool = get_synthesizer_pool()
+    synthesizer_pool.warm_up([DEFAULT_VOICE])
+    # 在后台把常用短语预先合成到语音缓存
+    threading.Thread(target=preload_common_phrases, args=(synthesizer_pool, DEFAULT_VOICE), daemon=True).start()
+    
+    # 识别、翻译、朗读各自在独立线程中运行，朗读时仍然可以继续识别
+    pipeline = Pipeline(queue_size=PIPELINE_QUEUE_SIZE)
+    recognition = None
+    if recognition_mode == RECOGNITION_MODE_CONTINUOUS:
+        # 连续识别：识别结果在事件回调中直接送入流水线
+        def submit_recognized(chinese_text):
+            if duplex.discard(chinese_text):
+                return
+            print(f"\n识别结果 (中文): {chinese_text}")
+            pipeline.submit(chinese_text)
+        
+        recognition = ContinuousRecognition(speech_recognizer, submit_recognized, on_no_match, on_canceled,
+                                            stats=stats, metrics=metrics, audio_input=audio_input,
+                                            drop_fillers=True)
+    else:
+        pipeline.add_source("识别", recognize)
+    pipeline.add_stage("翻译", translate)
+    pipeline.add_stage("朗读", speak)
+    pipeline.start()
+    audio_input.start()
+    if recognition:
+        recognition.start()
+    print("\n正在听取语音...")
+    
     try:
         while True:
-            print("\n正在听取语音...")
-            result = speech_recognizer.recognize_once()
-            
-            if result.reason == speechsdk.ResultReason.RecognizedSpeech:
-                chinese_text = result.text
-                print(f"识别结果 (中文): {chinese_text}")
-                
-                # 翻译成英文
-                print("正在翻译...")
-                english_text = translate_text(chinese_text)
-                
-                if english_text:
-                    print(f"翻译结果 (英文): {english_text}")
-                    
-                    # 将英文文本转换为语音
-                    print("正在朗读...")
-                    text_to_speech(english_text)
-                else:
-                    print("翻译失败")
-                
-            elif result.reason == speechsdk.ResultReason.NoMatch:
-                print("没有识别到语音")
-            elif result.reason == speechsdk.ResultReason.Canceled:
-                cancellation = speechsdk.CancellationDetails(result)
-                print(f"识别被取消: {cancellation.reason}")
-                if cancellation.reason == speechsdk.CancellationReason.Error:
-                    print(f"错误详情: {cancellation.error_details}")
-            
-            # 短暂暂停，避免CPU使用率过高
-            time.sleep(0.5)
+            time.sleep(PIPELINE_REPORT_INTERVAL)
+            print(pipeline.report())
             
     except KeyboardInterrupt:
         print("\n停止程序...")
@@ -183,6 +221,31 @@ def main():
         print(f"发生未预期的错误: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        if recognition:
+            recognition.stop()
+        pipeline.stop(timeout=1.0)
+        print(pipeline.report())
+        print(stats.report())
+        print(duplex.report())
+        audio_input.close()
+        vad_report = audio_input.report()
+        if vad_report:
+            print(vad_report)
+        print(metrics.report())
+        if session_store:
+            session.end()
+            session_store.close()
+        translation_cache = get_translation_cache()
+        if translation_cache:
+            print(translation_cache.report())
+        print(get_streaming_speaker().report())
+        audio_cache = get_audio_cache()
+        if audio_cache:
+            print(audio_cache.report())
+        translation_batcher = get_translation_batcher()
+        if translation_batcher:
+            print(translation_batcher.report())
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,19 +1,44 @@
 import os
+import queue
 import time
 import threading
 import tkinter as tk
 from tkinter import scrolledtext, messagebox, ttk
 import azure.cognitiveservices.speech as speechsdk
-import requests
-import uuid
 import json
 from dotenv import load_dotenv
+from translator_client import TranslatorError, get_target_languages, get_translator_client, language_display_name
+from speculative_translation import SpeculativeTranslator
+from async_translator import close_async_translator
+from metrics import get_metrics
+from endpoint_selector import select_speech_region
+from single_flight import get_single_flight
+from session_store import get_session_store
+from ui_dispatcher import TranscriptBuffer, UIDispatcher, get_ui_settings
+from tts_pool import DEFAULT_VOICE, SynthesizerPool, preload_common_phrases
+from vad_gate import create_audio_input
+from tts_cache import get_audio_cache
+from tts_streaming import StreamingSpeaker
+from tts_queue import SpeechQueue, get_speech_queue_settings
+from duplex import create_duplex_controller
+from recognition import (RECOGNITION_MODE_CONTINUOUS, ContinuousRecognition, RecognitionStats,
+                         get_recognition_mode, handle_result, recognize_once)
+
+# 可选的朗读语音
+VOICE_OPTIONS = [
+    "en-US-JennyNeural",  # 女声
+    "en-US-GuyNeural",    # 男声
+    "en-US-AriaNeural",   # 女声
+    "en-GB-SoniaNeural"   # 英式女声
+]
 
 class VoiceTranslateTTSApp:
     def __init__(self, root):
         self.root = root
         self.root.title("中文语音识别、翻译与朗读")
-        self.root.geometry("700x500")
+        # 目标语言列表，每种目标语言一个输出区域
+        self.target_languages = get_target_languages()
+        self.root.geometry(f"{350 * (len(self.target_languages) + 1)}x500")
         self.root.resizable(True, True)
         
         # 加载环境变量
@@ -23,10 +48,6 @@ class VoiceTranslateTTSApp:
         self.speech_key = os.environ.get('AZURE_SPEECH_KEY')
         self.speech_region = os.environ.get('AZURE_SPEECH_REGION')
         
-        # 获取Azure翻译服务密钥和端点
-        self.translator_key = os.environ.get('AZURE_TRANSLATOR_KEY')
-        self.translator_endpoint = os.environ.get('AZURE_TRANSLATOR_ENDPOINT')
-        
         # 检查环境变量是否正确设置
         if not self.speech_key or not self.speech_region:
             error_msg = "请在.env文件中设置AZURE_SPEECH_KEY和AZURE_SPEECH_REGION"
@@ -34,7 +55,9 @@ class VoiceTranslateTTSApp:
             root.destroy()
             return
         
-        if not self.translator_key or not self.translator_endpoint:
+        # 进程内共享的翻译客户端（复用HTTP长连接，重复的句子直接从缓存返回）
+        self.translator_client = get_translator_client()
+        if self.translator_client is None:
             error_msg = "请在.env文件中设置AZURE_TRANSLATOR_KEY和AZURE_TRANSLATOR_ENDPOINT"
             messagebox.showerror("错误", error_msg)
             root.destroy()
@@ -46,17 +69,30 @@ class VoiceTranslateTTSApp:
             root.destroy()
             return
         
+        self.translation_cache = self.translator_client.cache
+        
         # 创建语音配置
-        self.speech_config = speechsdk.SpeechConfig(subscription=self.speech_key, region=self.speech_region)
+        # 配置了多个区域（AZURE_SPEECH_REGIONS）时使用当前延迟最低的区域
+        speech_key, speech_region = select_speech_region(self.speech_key, self.speech_region)
+        self.speech_config = speechsdk.SpeechConfig(subscription=speech_key, region=speech_region)
         self.speech_config.speech_recognition_language = "zh-CN"  # 设置中文识别
         
-        # 创建文本转语音配置
-        self.tts_config = speechsdk.SpeechConfig(subscription=self.speech_key, region=self.speech_region)
-        self.tts_config.speech_synthesis_language = "en-US"
-        self.tts_config.speech_synthesis_voice_name = "en-US-JennyNeural"
-        
-        # 创建从默认麦克风获取音频的配置
-        self.audio_config = speechsdk.audio.AudioConfig(use_default_microphone=True)
+        # 文本转语音使用的语音，合成器按语音缓存在池中
+        self.current_voice = DEFAULT_VOICE
+        self.synthesizer_pool = SynthesizerPool(self.speech_key, self.speech_region)
+        # 合成过的音频缓存在本地，重复朗读时直接播放
+        self.audio_cache = get_audio_cache()
+        self.speaker = StreamingSpeaker(self.synthesizer_pool, self.audio_cache, get_single_flight("tts"))
+        # 所有朗读由同一个线程按队列进行，来不及朗读的旧译文按 TTS_QUEUE_POLICY 丢弃
+        policy, max_backlog, max_age = get_speech_queue_settings()
+        self.speech_queue = SpeechQueue(self.text_to_speech, self.speaker.stop, policy, max_backlog, max_age)
+        # 朗读期间丢弃麦克风听到的回声，或者在说话时打断朗读（DUPLEX_MODE）
+        self.duplex = create_duplex_controller(stop_playback=self.speaker.stop)
+        
+        # 创建从默认麦克风获取音频的配置；VAD_GATE=on 时自己采集音频，只把语音段上传给识别服务
+        self.audio_input = create_audio_input()
+        self.audio_input.attach_duplex(self.duplex)
+        self.audio_config = self.audio_input.config
         
         # 创建语音识别器
         try:
@@ -65,8 +101,8 @@ class VoiceTranslateTTSApp:
                 audio_config=self.audio_config
             )
             
-            # 创建语音合成器
-            self.speech_synthesizer = speechsdk.SpeechSynthesizer(speech_config=self.tts_config)
+            # 创建默认语音的合成器并建立连接
+            self.synthesizer_pool.get(self.current_voice)
             
         except Exception as e:
             error_msg = f"创建语音服务失败: {e}"
@@ -77,10 +113,50 @@ class VoiceTranslateTTSApp:
         # 识别状态
         self.is_recognizing = False
         self.recognition_thread = None
-        self.is_speaking = False
+        
+        # 识别模式（连续识别或单次识别轮询）
+        self.recognition_mode = get_recognition_mode()
+        self.recognition_stats = RecognitionStats(self.recognition_mode)
+        # 每句话各阶段的耗时
+        self.metrics = get_metrics()
+        # 每句话的原文、译文和耗时保存到会话记录中，之后可以搜索和导出
+        self.session_store = get_session_store()
+        self.session = self.session_store.start_session("voice_translate_tts_gui") if self.session_store else None
+        self.continuous_recognition = None
+        if self.recognition_mode == RECOGNITION_MODE_CONTINUOUS:
+            # 连续识别的回调只把结果放入队列，由翻译线程处理，不阻塞SDK的事件线程
+            self.recognized_queue = queue.Queue()
+            self.continuous_recognition = ContinuousRecognition(
+                self.speech_recognizer,
+                self.on_final,
+                self.on_no_match,
+                self.on_canceled,
+                stats=self.recognition_stats,
+                metrics=self.metrics,
+                audio_input=self.audio_input,
+                drop_fillers=True,
+                on_dropped=self.on_dropped
+            )
+        
+        # 中间识别结果实时显示，稳定的前缀提前翻译（SPECULATIVE_TRANSLATION=off 时只显示中间结果）
+        self.speculative = None
+        if os.environ.get('SPECULATIVE_TRANSLATION', 'on').strip().lower() not in ('off', '0', 'false', 'no'):
+            self.speculative = SpeculativeTranslator(self.translate_prefix, self.on_speculative,
+                                                     target_languages=self.target_languages)
+        self.speech_recognizer.recognizing.connect(self.on_recognizing)
+        
+        # 后台线程的界面更新按固定帧率在主线程中批量执行
+        ui_fps, self.transcript_max_lines = get_ui_settings()
+        self.ui = UIDispatcher(self.root, ui_fps)
         
         # 创建GUI元素
         self.create_widgets()
+        self.ui.start()
+        
+        # 在后台预热其他可选语音的合成器，切换语音时不再有额外延迟
+        threading.Thread(target=self.synthesizer_pool.warm_up, args=(VOICE_OPTIONS,), daemon=True).start()
+        # 在后台把常用短语预先合成到语音缓存
+        threading.Thread(target=preload_common_phrases, args=(self.synthesizer_pool, self.current_voice), daemon=True).start()
     
     def create_widgets(self):
         # 顶部状态标签
@@ -101,13 +177,24 @@ class VoiceTranslateTTSApp:
         
         self.chinese_text = scrolledtext.ScrolledText(chinese_frame, wrap=tk.WORD, width=30, height=15, font=("SimHei", 12))
         self.chinese_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        
-        # 英文文本区域
-        english_frame = tk.LabelFrame(text_frame, text="英文翻译结果", font=("SimHei", 10))
-        english_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5, pady=5)
-        
-        self.english_text = scrolledtext.ScrolledText(english_frame, wrap=tk.WORD, width=30, height=15, font=("SimHei", 12))
-        self.english_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.chinese_text.tag_config("partial", foreground="gray")
+        # 长时间运行时每个文本区域只保留最近的内容
+        self.chinese_transcript = TranscriptBuffer(self.chinese_text, self.transcript_max_lines)
+        self.ui.register(self.chinese_transcript)
+        
+        # 每种目标语言一个翻译文本区域
+        self.translation_texts = {}
+        self.translation_transcripts = {}
+        for language in self.target_languages:
+            translation_frame = tk.LabelFrame(text_frame, text=f"{language_display_name(language)}翻译结果", font=("SimHei", 10))
+            translation_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5, pady=5)
+            
+            translation_text = scrolledtext.ScrolledText(translation_frame, wrap=tk.WORD, width=30, height=15, font=("SimHei", 12))
+            translation_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+            translation_text.tag_config("partial", foreground="gray")
+            self.translation_texts[language] = translation_text
+            self.translation_transcripts[language] = TranscriptBuffer(translation_text, self.transcript_max_lines)
+            self.ui.register(self.translation_transcripts[language])
         
         # 按钮区域
         button_frame = tk.Frame(self.root)
@@ -122,7 +209,7 @@ class VoiceTranslateTTSApp:
         self.clear_button = tk.Button(button_frame, text="清空文本", command=self.clear_text, bg="#2196F3", fg="white", font=("SimHei", 12), width=10)
         self.clear_button.pack(side=tk.LEFT, padx=5)
         
-        self.speak_button = tk.Button(button_frame, text="朗读英文", command=self.speak_last_translation, bg="#FF9800", fg="white", font=("SimHei", 12), width=10)
+        self.speak_button = tk.Button(button_frame, text=f"朗读{language_display_name(self.target_languages[0])}", command=self.speak_last_translation, bg="#FF9800", fg="white", font=("SimHei", 12), width=10)
         self.speak_button.pack(side=tk.LEFT, padx=5)
         
         # 选择语音下拉框
@@ -131,15 +218,9 @@ class VoiceTranslateTTSApp:
         
         tk.Label(voice_frame, text="选择语音:", font=("SimHei", 10)).pack(side=tk.LEFT, padx=5)
         
-        self.voice_var = tk.StringVar(value="en-US-JennyNeural")
-        voice_options = [
-            "en-US-JennyNeural",  # 女声
-            "en-US-GuyNeural",    # 男声
-            "en-US-AriaNeural",   # 女声
-            "en-GB-SoniaNeural"   # 英式女声
-        ]
+        self.voice_var = tk.StringVar(value=self.current_voice)
         
-        self.voice_dropdown = ttk.Combobox(voice_frame, textvariable=self.voice_var, values=voice_options, width=20)
+        self.voice_dropdown = ttk.Combobox(voice_frame, textvariable=self.voice_var, values=VOICE_OPTIONS, width=20)
         self.voice_dropdown.pack(side=tk.LEFT, padx=5)
         self.voice_dropdown.bind("<<ComboboxSelected>>", self.on_voice_change)
         
@@ -155,155 +236,223 @@ class VoiceTranslateTTSApp:
     def on_voice_change(self, event):
         """更新选择的语音"""
         selected_voice = self.voice_var.get()
-        self.tts_config.speech_synthesis_voice_name = selected_voice
-        language_code = selected_voice.split("-")[0] + "-" + selected_voice.split("-")[1]
-        self.tts_config.speech_synthesis_language = language_code
+        # 下一句话直接使用池中已经连接好的合成器
+        self.current_voice = selected_voice
         self.update_status(f"已选择语音: {selected_voice}", "#000000")
     
-    def append_chinese_text(self, text):
-        """向中文文本区域追加文本"""
-        self.chinese_text.insert(tk.END, text + "\n")
-        self.chinese_text.see(tk.END)  # 滚动到底部
+    def show_partial_text(self, widget, text):
+        """在文本区域末尾用灰色显示（或替换）中间结果"""
+        self.clear_partial_text(widget)
+        widget.insert(tk.END, text + "\n", "partial")
+        widget.see(tk.END)
     
-    def append_english_text(self, text):
-        """向英文文本区域追加文本"""
-        self.english_text.insert(tk.END, text + "\n")
-        self.english_text.see(tk.END)  # 滚动到底部
-        # 存储最新的翻译文本
-        self.last_translation = text
+    def clear_partial_text(self, widget):
+        """删除文本区域中的中间结果"""
+        ranges = widget.tag_ranges("partial")
+        if ranges:
+            widget.delete(ranges[0], ranges[-1])
     
-    def translate_text(self, text, source_language="zh-Hans", target_language="en"):
-        """使用Azure翻译服务将文本从源语言翻译为目标语言"""
-        # 配置API请求
-        path = '/translate'
-        constructed_url = self.translator_endpoint + path
-        
-        params = {
-            'api-version': '3.0',
-            'from': source_language,
-            'to': target_language
-        }
-        
-        headers = {
-            'Ocp-Apim-Subscription-Key': self.translator_key,
-            'Ocp-Apim-Subscription-Region': self.speech_region,
-            'Content-type': 'application/json',
-            'X-ClientTraceId': str(uuid.uuid4())
-        }
-        
-        # 准备要翻译的文本
-        body = [{
-            'text': text
-        }]
-        
-        # 发送请求
-        try:
-            response = requests.post(constructed_url, params=params, headers=headers, json=body)
-            response.raise_for_status()  # 如果请求失败，抛出异常
-            
-            # 解析响应
-            result = response.json()
-            
-            if result and len(result) > 0 and 'translations' in result[0] and len(result[0]['translations']) > 0:
-                translated_text = result[0]['translations'][0]['text']
-                # 存储最新的翻译，用于朗读按钮
-                self.last_translation = translated_text
-                return translated_text
-            else:
-                self.update_status("翻译结果格式不正确", "red")
-                return None
-        
-        except Exception as e:
-            self.update_status(f"翻译错误: {e}", "red")
-            return None
+    def append_chinese_text(self, text):
+        """向中文文本区域追加文本（超过行数上限时删除最早的内容）"""
+        self.clear_partial_text(self.chinese_text)
+        self.chinese_transcript.append(text)
     
-    def text_to_speech(self, text):
-        """将文本转换为语音"""
+    def append_translation_text(self, language, text):
+        """向目标语言的文本区域追加文本"""
+        self.clear_partial_text(self.translation_texts[language])
+        self.translation_transcripts[language].append(text)
+        # 存储最新的翻译文本（朗读第一个目标语言）
+        if language == self.target_languages[0]:
+            self.last_translation = text
+    
+    def text_to_speech(self, text, voice_name=None, timing=None):
+        """将文本转换为语音（在朗读队列的线程中调用），传入 timing 时记录首段音频和播放完成的时间
+
+        返回是否朗读成功，被打断时返回None。
+        """
         if not text:
             self.update_status("没有文本可以朗读", "#FF9800")
             return False
         
         try:
-            self.is_speaking = True
-            self.update_status("正在朗读...", "#4CAF50")
+            waiting = self.speech_queue.depth()
+            self.update_status(f"正在朗读...（还有 {waiting} 句等待朗读）" if waiting else "正在朗读...", "#4CAF50")
             
-            # 执行文本转语音
-            result = self.speech_synthesizer.speak_text_async(text).get()
+            # 长文本按句子分段，边合成边播放；已缓存的段直接在本地播放
+            started = time.perf_counter()
+            with self.duplex.playback():
+                result = self.speaker.speak(text, voice_name or self.current_voice)
+            if timing is not None:
+                timing.mark_speech(started, result)
+            if result.time_to_first_audio is not None:
+                print(f"首段音频延迟: {result.time_to_first_audio * 1000:.0f} ms（共 {result.chunks} 段，缓存 {result.cached_chunks} 段）")
             
             # 检查结果
-            if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+            if result.interrupted:
+                self.update_status("朗读已打断", "#FF9800")
+                return None
+            if result.success:
                 self.update_status("朗读完成", "#4CAF50")
                 return True
             else:
                 self.update_status(f"朗读失败: {result.reason}", "red")
-                if result.reason == speechsdk.ResultReason.Canceled:
-                    cancellation = speechsdk.SpeechSynthesisCancellationDetails(result)
-                    self.update_status(f"朗读取消: {cancellation.reason}", "red")
+                if result.cancellation is not None:
+                    self.update_status(f"朗读取消: {result.cancellation.reason}", "red")
                 return False
         
         except Exception as e:
             self.update_status(f"朗读错误: {e}", "red")
             return False
-        finally:
-            self.is_speaking = False
     
     def speak_last_translation(self):
         """朗读最后一次翻译的文本"""
         if hasattr(self, 'last_translation') and self.last_translation:
-            # 在新线程中执行，避免阻塞UI
-            threading.Thread(target=self.text_to_speech, args=(self.last_translation,), daemon=True).start()
+            # 手动朗读排在队列最前面，正在进行的自动朗读会被打断
+            self.speech_queue.replay(self.last_translation, self.current_voice)
         else:
             self.update_status("没有可朗读的翻译", "#FF9800")
     
+    def translate_to_targets(self, text, source_language="zh-Hans"):
+        """在一个请求中把文本翻译成所有目标语言，返回 {目标语言: 译文}"""
+        try:
+            return self.translator_client.translate_multi(text, source_language, self.target_languages)
+        
+        except TranslatorError as e:
+            self.update_status(str(e), "red")
+            return None
+        
+        except Exception as e:
+            self.update_status(f"翻译错误: {e}", "red")
+            return None
+    
+    def translate_prefix(self, prefix):
+        """推测翻译（在后台线程中调用）：半句话不写入翻译缓存，出错时由 SpeculativeTranslator 丢弃，不显示在状态栏"""
+        return self.translator_client.translate_multi(prefix, "zh-Hans", self.target_languages, store=False)
+    
+    def on_recognizing(self, evt):
+        """中间识别结果的回调（在SDK线程中调用）"""
+        if not self.is_recognizing:
+            return
+        # 说话打断朗读模式下停止正在进行的朗读；半双工时朗读期间的中间结果是回声，不显示也不推测翻译
+        self.duplex.local_speech()
+        if self.duplex.suppressing():
+            return
+        partial_text = evt.result.text
+        self.ui.call_latest("partial", self.show_partial_text, self.chinese_text, partial_text)
+        if self.speculative:
+            self.speculative.on_partial(partial_text)
+    
+    def on_speculative(self, utterance_id, prefix, translations):
+        """稳定前缀的推测译文返回后，在各目标语言区域用灰色显示"""
+        def show():
+            # 这句话已经有最终结果时不再显示
+            if not self.speculative.is_current(utterance_id):
+                return
+            for language, translated_text in translations.items():
+                self.show_partial_text(self.translation_texts[language], translated_text + " …")
+        self.ui.call_latest("speculative", show)
+    
+    def on_dropped(self, chinese_text):
+        """一句话被丢弃（只有语气词，或是朗读的回声）：结束这句话的推测翻译，清除灰色的中间结果和推测译文"""
+        self.ui.cancel_latest("partial")
+        self.ui.cancel_latest("speculative")
+        if self.speculative:
+            self.speculative.finish(chinese_text)
+        self.ui.call(self.clear_partial_texts)
+    
+    def clear_partial_texts(self):
+        """删除所有文本区域中的中间结果"""
+        self.clear_partial_text(self.chinese_text)
+        for widget in self.translation_texts.values():
+            self.clear_partial_text(widget)
+    
+    def on_final(self, chinese_text):
+        """一句话识别完成的回调：结束这句话的推测翻译，再交给翻译流程"""
+        # 这句话还没有显示的中间结果已经过时
+        self.ui.cancel_latest("partial")
+        # 朗读期间识别到的是自己朗读的回声
+        if self.duplex.discard(chinese_text):
+            self.on_dropped(chinese_text)
+            return
+        speculation = self.speculative.finish(chinese_text) if self.speculative else None
+        if self.continuous_recognition:
+            # 连续识别模式下放入队列，由翻译线程处理
+            self.recognized_queue.put((chinese_text, speculation))
+        else:
+            self.on_recognized(chinese_text, speculation)
+    
+    def on_recognized(self, chinese_text, speculation=None):
+        """处理一条识别结果：显示中文、翻译成所有目标语言并自动朗读"""
+        # 更新中文文本
+        self.ui.call(self.append_chinese_text, chinese_text)
+        
+        # 更新状态
+        self.update_status("正在翻译...", "#FF9800")
+        self.ui.call_latest("progress", self.progress_bar.start, 10)
+        
+        # 翻译成所有目标语言（推测翻译的前缀正好是整句话时直接使用）
+        timing = self.metrics.begin(chinese_text)
+        timing.mark("translation_sent")
+        if speculation is not None and speculation.translations:
+            translations = speculation.translations
+        else:
+            translations = self.translate_to_targets(chinese_text)
+        timing.mark("translation_received")
+        
+        # 停止进度条
+        self.ui.call_latest("progress", self.progress_bar.stop)
+        
+        if translations:
+            # 更新各目标语言的文本
+            for language, translated_text in translations.items():
+                self.ui.call(self.append_translation_text, language, translated_text)
+            if self.speculative:
+                # 记录最终译文显示时比推测译文晚了多少
+                self.ui.call(self.speculative.final_shown, speculation)
+            self.update_status("翻译成功", "#4CAF50")
+            
+            # 自动朗读第一个目标语言的翻译结果，朗读完成（或被丢弃）后结束这句话的计时
+            def on_spoken(item, spoken):
+                self.finish_utterance(item.timing, translations, item.voice_name if spoken else None)
+            self.speech_queue.say(translations[self.target_languages[0]], self.current_voice, timing, on_spoken)
+        else:
+            self.finish_utterance(timing, None)
+            self.update_status("翻译失败", "red")
+    
+    def finish_utterance(self, timing, translations, voice_name=None):
+        """一句话处理完毕：计入耗时统计并写入会话记录"""
+        self.metrics.finish(timing)
+        if self.session:
+            self.session.record(timing.text, translations, voice_name, timing)
+    
+    def on_no_match(self):
+        """没有识别到语音的回调"""
+        self.update_status("没有识别到语音", "#FF9800")
+    
+    def on_canceled(self, cancellation):
+        """识别被取消的回调"""
+        error_message = f"识别被取消: {cancellation.reason}"
+        if cancellation.reason == speechsdk.CancellationReason.Error:
+            error_message += f"\n错误详情: {cancellation.error_details}"
+        self.update_status(error_message, "red")
+    
     def recognition_loop(self):
-        """识别循环，在独立线程中运行"""
+        """识别循环（单次识别轮询模式），在独立线程中运行"""
         while self.is_recognizing:
             try:
                 # 更新状态
                 self.update_status("正在听取语音...", "#4CAF50")
                 
-                # 单次识别
-                result = self.speech_recognizer.recognize_once()
-                
-                if result.reason == speechsdk.ResultReason.RecognizedSpeech:
-                    chinese_text = result.text
-                    
-                    # 更新中文文本
-                    self.root.after(0, lambda text=chinese_text: self.append_chinese_text(text))
-                    
-                    # 更新状态
-                    self.update_status("正在翻译...", "#FF9800")
-                    self.root.after(0, lambda: self.progress_bar.start(10))
-                    
-                    # 翻译成英文
-                    english_text = self.translate_text(chinese_text)
-                    
-                    # 停止进度条
-                    self.root.after(0, lambda: self.progress_bar.stop())
-                    
-                    if english_text:
-                        # 更新英文文本
-                        self.root.after(0, lambda text=english_text: self.append_english_text(text))
-                        self.update_status("翻译成功", "#4CAF50")
-                        
-                        # 自动朗读翻译结果
-                        if not self.is_speaking:
-                            threading.Thread(target=self.text_to_speech, args=(english_text,), daemon=True).start()
-                    else:
-                        self.update_status("翻译失败", "red")
+                # 半双工时朗读期间不开始新的识别
+                if not self.duplex.wait_quiet(0.5):
+                    continue
                 
-                elif result.reason == speechsdk.ResultReason.NoMatch:
-                    self.update_status("没有识别到语音", "#FF9800")
-                
-                elif result.reason == speechsdk.ResultReason.Canceled:
-                    cancellation = speechsdk.CancellationDetails(result)
-                    error_message = f"识别被取消: {cancellation.reason}"
-                    if cancellation.reason == speechsdk.CancellationReason.Error:
-                        error_message += f"\n错误详情: {cancellation.error_details}"
-                    self.update_status(error_message, "red")
-                    
-                    # 暂停一下再继续
-                    time.sleep(2)
+                # 单次识别
+                result = recognize_once(self.speech_recognizer, self.recognition_stats, self.metrics,
+                                        self.audio_input)
+                # 出错后下一次识别会按退避时间等待（见 governor.py）
+                handle_result(result, self.on_final, self.on_no_match, self.on_canceled, drop_fillers=True,
+                              on_dropped=self.on_dropped)
             
             except Exception as e:
                 self.update_status(f"识别过程中发生错误: {e}", "red")
@@ -313,9 +462,28 @@ class VoiceTranslateTTSApp:
             if self.is_recognizing:  # 再次检查，以便能够更快地退出线程
                 time.sleep(0.1)
     
+    def translation_loop(self):
+        """连续识别模式下的翻译循环，在独立线程中运行"""
+        try:
+            self.continuous_recognition.start()
+        except Exception as e:
+            self.update_status(f"启动连续识别失败: {e}", "red")
+            return
+        
+        self.update_status("正在听取语音...", "#4CAF50")
+        while self.is_recognizing:
+            try:
+                chinese_text, speculation = self.recognized_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self.on_recognized(chinese_text, speculation)
+            except Exception as e:
+                self.update_status(f"翻译过程中发生错误: {e}", "red")
+    
     def update_status(self, message, color="#000000"):
         """更新状态标签"""
-        self.root.after(0, lambda: self.status_label.config(text=message, fg=color))
+        self.ui.call_latest("status", self.status_label.config, text=message, fg=color)
     
     def start_recognition(self):
         """开始语音识别"""
@@ -325,8 +493,12 @@ class VoiceTranslateTTSApp:
             self.start_button.config(state=tk.DISABLED)
             self.stop_button.config(state=tk.NORMAL)
             
-            # 在新线程中启动识别循环
-            self.recognition_thread = threading.Thread(target=self.recognition_loop, daemon=True)
+            self.audio_input.start()
+            # 在新线程中启动识别
+            if self.continuous_recognition:
+                self.recognition_thread = threading.Thread(target=self.translation_loop, daemon=True)
+            else:
+                self.recognition_thread = threading.Thread(target=self.recognition_loop, daemon=True)
             self.recognition_thread.start()
     
     def stop_recognition(self):
@@ -338,12 +510,32 @@ class VoiceTranslateTTSApp:
             self.stop_button.config(state=tk.DISABLED)
             self.progress_bar.stop()
             
-            # 线程会自行停止，因为我们设置了is_recognizing = False
+            if self.continuous_recognition:
+                # 停止连续识别需要等待SDK确认，放到后台线程避免阻塞界面
+                threading.Thread(target=self.continuous_recognition.stop, daemon=True).start()
+            self.audio_input.stop()
+            # 翻译线程会自行停止，因为我们设置了is_recognizing = False
+            print(self.recognition_stats.report())
+            vad_report = self.audio_input.report()
+            if vad_report:
+                print(vad_report)
+            print(self.metrics.report())
+            print(self.ui.report())
+            if self.speculative:
+                print(self.speculative.report())
+            if self.translation_cache:
+                print(self.translation_cache.report())
+            print(self.speaker.report())
+            print(self.speech_queue.report())
+            print(self.duplex.report())
+            if self.audio_cache:
+                print(self.audio_cache.report())
     
     def clear_text(self):
         """清空文本区域"""
-        self.chinese_text.delete(1.0, tk.END)
-        self.english_text.delete(1.0, tk.END)
+        self.chinese_transcript.clear()
+        for transcript in self.translation_transcripts.values():
+            transcript.clear()
         self.update_status("准备就绪", "#000000")
         # 清除最后的翻译
         if hasattr(self, 'last_translation'):
@@ -353,6 +545,18 @@ class VoiceTranslateTTSApp:
         """关闭窗口时的操作"""
         if self.is_recognizing:
             self.stop_recognition()
+        if self.speculative:
+            self.speculative.close()
+            # 推测翻译使用的共享异步客户端
+            close_async_translator()
+        self.speech_queue.close()
+        self.ui.stop()
+        self.audio_input.close()
+        if self.session_store:
+            self.session.end()
+            self.session_store.close()
+        self.translator_client.close()
+        self.synthesizer_pool.close()
         self.root.destroy()
 
 if __name__ == "__main__":